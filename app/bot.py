@@ -2,9 +2,13 @@ from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 from .config import settings
+from .middlewares.telegram_metrics import TelegramErrorMetrics
 
 def build_bot() -> Bot:
-    return Bot(token=settings.BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    bot = Bot(token=settings.BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    # every Bot API failure (RetryAfter, BadRequest, network, ...) → u2s_telegram_errors_total
+    bot.session.middleware(TelegramErrorMetrics())
+    return bot
 
 def build_dispatcher() -> Dispatcher:
     return Dispatcher()
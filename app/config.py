@@ -17,8 +17,10 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "change-me"
 
     # storage
-    DATABASE_URL: str = "sqlite:///./data/users.db"
+    DATABASE_URL: str = "sqlite:///./data/users.db"   # job queue backend: sqlite:///… | postgresql://… (multi-node) | memory:// (tests)
     LOCAL_STORAGE_DIR: str = "./data/shots"
+    SPOOL_THRESHOLD_BYTES: int = 1_000_000   # bigger artifacts are uploaded from a temp file under LOCAL_STORAGE_DIR/spool (0 → off)
+    DB_EXECUTOR_THREADS: int = 2             # dedicated threads (each with a persistent sqlite connection)
 
     # network/webhook
     USE_WEBHOOK: bool = False
@@ -31,29 +33,45 @@ class Settings(BaseSettings):
     DEFAULT_VIEWPORT_HEIGHT: int = 844
     DEFAULT_DEVICE: str = "mobile"            # desktop|mobile
     DEFAULT_COLOR_SCHEME: str = "light"       # light|dark
-    DEFAULT_DELAY_MS: int = 4000
+    DEFAULT_DELAY_MS: int = 4000             # upper bound for the readiness wait (--delay / --slow override it)
+    READINESS_QUIET_MS: int = 500            # network + DOM + images + fonts quiet this long → ready
+    READINESS_STUCK_REQUEST_MS: int = 5000   # older in-flight requests (long-poll, beacons) are ignored
     NAVIGATION_TIMEOUT_MS: int = 25000
-    OVERALL_TIMEOUT_MS: int = 40000
+    OVERALL_TIMEOUT_MS: int = 40000          # per-job capture budget shared by all stages (0 = no deadline)
     FULLPAGE_MAX_HEIGHT_PX: int = 15000
-    SLICE_WINDOW_HEIGHT_PX: int = 5000
+    SLICE_WINDOW_HEIGHT_PX: int = 5000       # max CSS px rendered per clipped tile when slicing
     SLICE_OVERLAP_PX: int = 80
     MAX_SCREENS_PER_JOB: int = 10
     MAX_IMAGE_BYTES: int = 9_500_000
-    DEFAULT_IMAGE_FORMAT: str = "png"         # png|jpeg
-    JPEG_QUALITY: int = 80
+    RENDER_MAX_PIXELS: int = 100_000_000     # device px rasterized per job (≥ 10 desktop slices at 2x); dsf / slices are planned to fit
+    DEFAULT_IMAGE_FORMAT: str = "png"         # png|jpeg|webp
+    JPEG_QUALITY: int = 80                   # also used for webp
     RESIZE_IF_TOO_LARGE: bool = True
     BLOCK_PRIVATE_NETWORK: bool = True
     MAX_REDIRECTS: int = 10
     BLOCK_RESOURCE_TYPES: str = "media,font"
+    BLOCK_ADS_AND_TRACKERS: bool = True
+    BLOCKLIST_DIR: str = ""                   # *.txt domain/pattern lists; empty → bundled sharekit/blocklists
     DISABLE_WINDOW_OPEN: bool = True
     AUTO_DISMISS_DIALOGS: bool = True
     COOKIE_BANNER_CLICK_ATTEMPTS: int = 3
     COOKIE_BANNER_RETRY_MS: int = 800
     HIDE_COMMON_OVERLAYS: bool = True
+    HIDE_FIXED_OVERLAYS: bool = False
+    FORCE_EAGER_LOADING: bool = True          # init script: loading=lazy → eager, IntersectionObserver fires at once
+    LAZY_IO_TRIGGER_BUDGET: int = 300         # max synthetic IntersectionObserver hits per page (infinite scroll guard)
+    PRE_SCROLL_MODE: str = "auto"             # auto|always|never — auto: only if the page listens to scroll (always without FORCE_EAGER_LOADING)
 
     # playwright / browser
     HEADLESS: bool = True
     SLOW_MODE: bool = False  # اگر خواستی حالت کند را globally فعال کنی
+    BROWSER_POOL_SIZE: int = 2               # warm Chromium instances shared by all workers
+    BROWSER_HEALTHCHECK_SEC: int = 30        # also how often browser RSS is checked
+    BROWSER_MAX_PAGES: int = 300             # recycle a browser after this many contexts (0 = never)
+    BROWSER_MAX_RSS_MB: int = 1500           # recycle past this RSS, browser + renderers (0 = never)
+    BROWSER_DRAIN_TIMEOUT_SEC: int = 90      # a recycled browser is closed after this even if jobs still run on it
+    CONTEXT_POOL_SIZE: int = 2               # warm contexts per device profile (mobile/desktop)
+    IMAGE_POOL_WORKERS: int = 2              # processes for cropping/encoding images
 
     # alerts
     ADMIN_ALERTS_ENABLED: bool = True
@@ -63,14 +81,36 @@ class Settings(BaseSettings):
     ADMIN_ALERTS_DESTINATION: str = "dm"      # dm|group
     ADMIN_ALERTS_GROUP_ID: Optional[str] = None
     MASK_URLS_IN_ALERTS: bool = True
-    TRACE_ID_LENGTH: int = 8
-    QUEUE_WARN_DEPTH: int = 50
-    QUEUE_WARN_AGE_SEC: int = 60
-    DOMAIN_CIRCUIT_BREAK_THRESHOLD: int = 5
-    DOMAIN_CIRCUIT_BREAK_WINDOW_SEC: int = 300
+    TRACE_ID_LENGTH: int = 8                  # tracking code shown to the user and put in alerts/span logs
+    TRACE_LOG_PATH: str = "./data/logs/spans.jsonl"  # one JSON line per pipeline stage ("" → off)
+    QUEUE_WARN_DEPTH: int = 50                # send_warn when unfinished jobs reach this (0 → off)
+    QUEUE_WARN_AGE_SEC: int = 60              # send_warn when the oldest queued job waits this long (0 → off)
+
+    # metrics
+    METRICS_PORT: int = 0                     # Prometheus GET /metrics (0 → off); capture processes use PORT+1+index
+    METRICS_HOST: str = "127.0.0.1"
+    METRICS_QUEUE_POLL_SEC: int = 15          # queue depth/age refresh + threshold checks
+    DOMAIN_CIRCUIT_BREAK_THRESHOLD: int = 5   # failed captures of one domain within the window → fail fast (0 → off)
+    DOMAIN_CIRCUIT_BREAK_WINDOW_SEC: int = 300 # failure window, and how long the circuit stays open
+    DOMAIN_MAX_CONCURRENCY: int = 2           # parallel captures per domain per process (0 → no cap)
+    DOMAIN_DEFER_SEC: int = 15                # jobs over the cap go back to the queue for this long
 
     # workers
-    WORKER_COUNT: int = 5
+    WORKER_COUNT: int = 5                    # job_worker coroutines (per capture process when WORKER_PROCESSES > 0)
+    WORKER_PROCESSES: int = 0                # >0 → supervisor mode: N capture processes, this one only polls Telegram
+    JOB_POLL_FALLBACK_SEC: int = 30          # workers are woken on enqueue; polling is only a fallback
+    JOB_WAKEUP_SOCKET_DIR: str = ""          # e.g. ./data/wakeup → cross-process wakeup via unix sockets
+    JOB_CLAIM_BATCH: int = 4                 # max jobs claimed per DB transaction
+    JOB_LEASE_SEC: int = 120                 # claimed jobs return to the queue if not heartbeated in time
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_REAPER_INTERVAL_SEC: int = 30
+    COALESCE_MAX_FOLLOWERS: int = 50         # identical queued jobs served by one capture (0 → off)
+    SEND_RETRY_MAX: int = 3                  # resends of one document after Telegram's RetryAfter
+    SEND_RETRY_MAX_WAIT_SEC: int = 60        # a longer RetryAfter is not waited out; that user's send fails
+
+    # result cache (Telegram file_id reuse for repeated URLs)
+    RESULT_CACHE_TTL_SEC: int = 600          # 0 → disabled
+    RESULT_CACHE_MAX_ENTRIES: int = 1000
 
     DEFAULT_LANG: str = "fa"
 
@@ -0,0 +1,14 @@
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramAPIError
+from app.services.metrics import TELEGRAM_ERRORS
+
+
+class TelegramErrorMetrics(BaseRequestMiddleware):
+    """Counts failed Bot API calls by method and error type (u2s_telegram_errors_total)."""
+
+    async def __call__(self, make_request, bot, method):
+        try:
+            return await make_request(bot, method)
+        except TelegramAPIError as e:
+            TELEGRAM_ERRORS.inc(method=type(method).__name__, error=type(e).__name__)
+            raise
@@ -0,0 +1,31 @@
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.types import Message
+from app.config import settings
+from app.services.result_cache import result_cache
+from app.services.domains import domain_guard
+from app.services.sharekit.pool import browser_pool_stats
+
+router = Router(name="admin")
+
+
+@router.message(Command("stats"))
+async def cmd_stats(message: Message):
+    """آمار داخلی بات — فقط برای ادمین‌ها"""
+    if message.from_user.id not in settings.admin_ids:
+        return
+    c = result_cache.stats()
+    d = domain_guard.stats()
+    # مرورگرها در supervisor mode داخل پروسه‌های worker هستند و اینجا دیده نمی‌شوند
+    browsers = "".join(
+        f"\nbrowser #{b['id']}: pages={b['pages']} inflight={b['inflight']} rss={b['rss_mb']}MB "
+        f"age={b['age_sec']}s" + (" (draining)" if b["draining"] else "")
+        for b in browser_pool_stats()
+    )
+    await message.answer(
+        "📊 آمار\n"
+        f"cache: hits={c['hits']} misses={c['misses']} ratio={c['hit_ratio']} "
+        f"entries={c['entries']} evictions={c['evictions']}\n"
+        f"domains: active={d['domains_active']} open={d['domains_open']} trips={d['circuit_trips']}"
+        + browsers
+    )
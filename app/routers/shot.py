@@ -6,8 +6,11 @@ from aiogram import Router, F
 from aiogram.types import Message, ForceReply
 from aiogram.filters import Command
 
-from app.services.db import enqueue_job, get_queue_position, get_queue_depth
-from app.services.parse import parse_shot_args
+from app.services.db import enqueue_job_with_position
+from app.services.parse import parse_shot_args, capture_options
+from app.services.result_cache import capture_key
+from app.services.notify import notify_job_enqueued
+from app.services.tracing import new_trace_id
 
 router = Router()
 
@@ -28,6 +31,18 @@ def force_pdf_flag(params_json: str) -> str:
     return json.dumps(data, ensure_ascii=False)
 
 
+async def enqueue_and_reply(message: Message, the_url: str, params_json: str, pdf: bool = False):
+    """ثبت job، بیدار کردن Workerها و اعلام جایگاه صف (همه در یک رفت‌وبرگشت DB)"""
+    trace_id = new_trace_id()
+    job_id, pos, depth = await enqueue_job_with_position(
+        user_id=message.from_user.id, url=the_url, params_json=params_json,
+        capture_key=capture_key(the_url, capture_options(params_json)), trace_id=trace_id,
+    )
+    notify_job_enqueued()
+    what = "درخواست PDF شما" if pdf else "درخواست شما"
+    await message.answer(f"✅ {what} ثبت شد.\nجایگاه شما در صف: {pos} از {depth}\nکد پیگیری: {trace_id}")
+
+
 @router.message(Command("help"))
 async def cmd_help(message: Message):
     await message.answer("دستور العمل کار با بات")
@@ -51,11 +66,7 @@ async def cmd_shot_image(message: Message):
         return
 
     params_json = parse_shot_args(message.text or "")
-    job_id = enqueue_job(user_id=message.from_user.id, url=the_url, params_json=params_json)
-
-    pos = get_queue_position(job_id)
-    depth = get_queue_depth()
-    await message.answer(f"✅ درخواست شما ثبت شد.\nجایگاه شما در صف: {pos} از {depth}")
+    await enqueue_and_reply(message, the_url, params_json)
 
 
 # --- NEW: /getshotpdf behaves like /getshotimage but forces pdf flag ---
@@ -78,11 +89,7 @@ async def cmd_shot_pdf(message: Message):
 
     params_json = parse_shot_args(message.text or "")
     params_json = force_pdf_flag(params_json)  # enforce pdf
-    job_id = enqueue_job(user_id=message.from_user.id, url=the_url, params_json=params_json)
-
-    pos = get_queue_position(job_id)
-    depth = get_queue_depth()
-    await message.answer(f"✅ درخواست PDF شما ثبت شد.\nجایگاه شما در صف: {pos} از {depth}")
+    await enqueue_and_reply(message, the_url, params_json, pdf=True)
 
 
 @router.message(F.reply_to_message, F.reply_to_message.text.contains(PROMPT_IMAGE))
@@ -96,11 +103,7 @@ async def handle_force_reply_image(message: Message):
         return
 
     params_json = parse_shot_args(message.text or "")
-    job_id = enqueue_job(user_id=message.from_user.id, url=the_url, params_json=params_json)
-
-    pos = get_queue_position(job_id)
-    depth = get_queue_depth()
-    await message.answer(f"✅ درخواست شما ثبت شد.\nجایگاه شما در صف: {pos} از {depth}")
+    await enqueue_and_reply(message, the_url, params_json)
 
 
 # --- NEW: separate reply handler for the PDF prompt so we can force pdf flag ---
@@ -116,11 +119,7 @@ async def handle_force_reply_pdf(message: Message):
 
     params_json = parse_shot_args(message.text or "")
     params_json = force_pdf_flag(params_json)  # enforce pdf
-    job_id = enqueue_job(user_id=message.from_user.id, url=the_url, params_json=params_json)
-
-    pos = get_queue_position(job_id)
-    depth = get_queue_depth()
-    await message.answer(f"✅ درخواست PDF شما ثبت شد.\nجایگاه شما در صف: {pos} از {depth}")
+    await enqueue_and_reply(message, the_url, params_json, pdf=True)
 
 
 @router.message(F.text.regexp(URL_REGEX))
@@ -136,8 +135,4 @@ async def handle_raw_url(message: Message):
         return
 
     params_json = parse_shot_args(message.text or "")
-    job_id = enqueue_job(user_id=message.from_user.id, url=the_url, params_json=params_json)
-
-    pos = get_queue_position(job_id)
-    depth = get_queue_depth()
-    await message.answer(f"✅ درخواست شما ثبت شد.\nجایگاه شما در صف: {pos} از {depth}")
+    await enqueue_and_reply(message, the_url, params_json)
@@ -66,7 +66,7 @@ async def cmd_start(message: Message, bot: Bot):
         f"{message.from_user.id}.jpg",
     )
 
-    upsert_user(user.model_dump(), is_mem)
+    await upsert_user(user.model_dump(), is_mem)
 
     if not is_mem:
         join_url = (
@@ -91,7 +91,7 @@ async def cmd_start(message: Message, bot: Bot):
 @router.callback_query(F.data == "check_membership")
 async def cb_check_membership(cb: CallbackQuery, bot: Bot):
     is_mem = await _is_member(bot, cb.from_user.id)
-    upsert_user(cb.from_user.model_dump(), is_mem)
+    await upsert_user(cb.from_user.model_dump(), is_mem)
     if is_mem:
         suffix = " (DEV)" if settings.SKIP_CHANNEL_CHECK else ""
         await cb.message.edit_text("عضویت تأیید شد. حالا می‌توانید از دستور /shot استفاده کنید." + suffix)
@@ -60,7 +60,7 @@ class AdminAlerter:
         msg = f"🚨 بحرانی | {name}\n{summary}\n{extra}"
         await self._send_to_admins(msg)
 
-    async def send_warn(self, name: str, summary: str, url: Optional[str]=None):
+    async def send_warn(self, name: str, summary: str, url: Optional[str]=None, trace_id: Optional[str]=None):
         if not self.cfg.ADMIN_ALERTS_ENABLED: return
         allowed = self.cfg.ADMIN_ALERTS_LEVEL in ("warn","info") or self.cfg.ADMIN_ALERTS_LEVEL=="critical" or self.cfg.ADMIN_ALERTS_LEVEL=="error"
         # We only send warn if level is warn or info; for simplicity, require level to be 'warn' or 'info'
@@ -70,6 +70,8 @@ class AdminAlerter:
         if not self._should_send(key):
             return
         msg = f"⚠️ هشدار | {name}\n{summary}\n{self._mask_url(url) if url else ''}"
+        if trace_id:
+            msg += f"\ntrace: {trace_id}"
         await self._send_to_admins(msg)
 
     async def _send_to_admins(self, text: str):
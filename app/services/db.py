@@ -1,185 +1,141 @@
-import sqlite3, os, time
-from typing import Dict, Optional
+import asyncio, json
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+from app.config import settings
+from app.services.queue import EnqueueResult, QueueBackend, create_backend
+
+# backend انتخاب‌شده در init_db (sqlite / memory / postgres)؛ بقیهٔ برنامه فقط با این ماژول کار دارد
+_backend: Optional[QueueBackend] = None
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        workers = max(1, int(getattr(settings, "DB_EXECUTOR_THREADS", 2)))
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db")
+    return _executor
+
+
+def _db() -> QueueBackend:
+    if _backend is None:
+        raise RuntimeError("init_db() has not been called")
+    return _backend
+
+
+async def _run(fn, *args, **kwargs):
+    """اجرای کوئری روی executor اختصاصی تا event loop بلاک نشود"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), partial(fn, *args, **kwargs))
+
+
+def close_db():
+    global _executor
+    if _backend is not None:
+        _backend.unlisten()
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+    if _backend is not None:
+        _backend.close()
 
-DB_PATH = None
 
 def init_db(database_url: str):
-    global DB_PATH
-    assert database_url.startswith("sqlite:///"), "Only sqlite supported in MVP"
-    DB_PATH = database_url.replace("sqlite:///", "")
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
-    # جدول کاربران
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-          user_id INTEGER PRIMARY KEY,
-          username TEXT,
-          first_name TEXT,
-          last_name TEXT,
-          language_code TEXT,
-          is_premium INTEGER DEFAULT 0,
-          joined_at INTEGER,
-          channel_member_at INTEGER
-        );
-    """)
-    # جدول درخواست‌ها (jobs)
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS jobs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            url TEXT NOT NULL,
-            status TEXT NOT NULL DEFAULT 'queued',   -- queued | running | done | failed
-            created_at INTEGER NOT NULL,
-            started_at INTEGER,
-            finished_at INTEGER,
-            error TEXT,
-            params_json TEXT,                        -- اختیاری: پارامترهای هر job به صورت JSON
-            FOREIGN KEY (user_id) REFERENCES users(user_id)
-        );
-    """)
-    # مهاجرت ایمن: اگر ستون params_json قبلاً وجود نداشت، اضافه شود
-    cur.execute("PRAGMA table_info(jobs)")
-    jcols = {row[1] for row in cur.fetchall()}
-    if "params_json" not in jcols:
-        try:
-            cur.execute("ALTER TABLE jobs ADD COLUMN params_json TEXT")
-        except Exception:
-            pass
-
-    con.commit()
-    con.close()
-
-
-def upsert_user(u: Dict, channel_member: bool):
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
-    cur.execute("""
-      INSERT INTO users(user_id, username, first_name, last_name, language_code, is_premium, joined_at, channel_member_at)
-      VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-      ON CONFLICT(user_id) DO UPDATE SET
-        username=excluded.username,
-        first_name=excluded.first_name,
-        last_name=excluded.last_name,
-        language_code=excluded.language_code,
-        is_premium=excluded.is_premium,
-        channel_member_at=CASE WHEN excluded.channel_member_at IS NOT NULL THEN excluded.channel_member_at ELSE channel_member_at END
-    """, (
-        u["id"], u.get("username"), u.get("first_name"), u.get("last_name"),
-        u.get("language_code"), int(u.get("is_premium") or 0),
-        int(time.time()),
-        int(time.time()) if channel_member else None
-    ))
-    con.commit()
-    con.close()
+    """backend را از روی scheme آدرس انتخاب و جدول‌ها را ساخته/مهاجرت می‌کند"""
+    global _backend
+    _backend = create_backend(database_url)
+    _backend.init()
+    print(f"[db] queue backend: {_backend.name}")
+
+
+def listen_jobs(on_enqueued: Callable[[int], None]):
+    """
+    بیدارباش از خود دیتابیس (LISTEN/NOTIFY در postgres، بین چند سرور)؛
+    برای sqlite/memory کاری نمی‌کند. باید داخل event loop صدا زده شود.
+    """
+    _db().listen(asyncio.get_running_loop(), on_enqueued)
+
+
+def unlisten_jobs():
+    if _backend is not None:
+        _backend.unlisten()
+
+
+async def upsert_user(u: Dict, channel_member: bool):
+    await _run(_db().upsert_user, u, channel_member)
 
 
 # -------------------------------
 # توابع مدیریت صف jobs
 # -------------------------------
 
-def enqueue_job(user_id: int, url: str, params_json: Optional[str] = None) -> int:
+async def enqueue_job(user_id: int, url: str, params_json: Optional[str] = None,
+                      trace_id: Optional[str] = None) -> int:
     """ثبت یک job جدید در صف و برگرداندن id آن"""
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
-    cur.execute(
-        "INSERT INTO jobs (user_id, url, status, created_at, params_json) VALUES (?, ?, 'queued', ?, ?)",
-        (user_id, url, int(time.time()), params_json)
-    )
-    job_id = cur.lastrowid
-    con.commit()
-    con.close()
-    return job_id
-
-
-def get_queue_depth() -> int:
+    res = await _run(_db().enqueue, user_id, url, params_json, None, trace_id)
+    return res.job_id
+
+
+async def enqueue_job_with_position(user_id: int, url: str, params_json: Optional[str] = None,
+                                    capture_key: Optional[str] = None, trace_id: Optional[str] = None) -> EnqueueResult:
+    """ثبت job و برگرداندن (id، جایگاه، عمق صف) در یک تراکنش؛ trace_id کد پیگیری همین درخواست است"""
+    return await _run(_db().enqueue, user_id, url, params_json, capture_key, trace_id)
+
+
+async def get_queue_depth() -> int:
     """تعداد کل کارهای ناتمام (queued + running)"""
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
-    cur.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued','running')")
-    (cnt,) = cur.fetchone()
-    con.close()
-    return int(cnt)
+    return await _run(_db().queue_depth)
+
 
+async def get_oldest_queued_at() -> Optional[int]:
+    """زمان ثبت قدیمی‌ترین job در انتظار (unix)، یا None اگر صف خالی است"""
+    return await _run(_db().oldest_queued_at)
 
-def get_queue_position(job_id: int) -> int:
+
+async def get_queue_position(job_id: int) -> int:
     """
-    جایگاه job در بین کارهای ناتمام (queued+running) بر اساس created_at (و در تساوی id).
-    اگر job پیدا نشود، 0.
+    جایگاه job در بین کارهای ناتمام (queued+running) به ترتیب ثبت (id).
+    اگر job پیدا نشود یا تمام شده باشد، 0.
     """
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
-    cur.execute("SELECT created_at FROM jobs WHERE id=?", (job_id,))
-    row = cur.fetchone()
-    if not row:
-        con.close()
-        return 0
-    (created_at,) = row
-
-    # همه‌ی کارهای ناتمامِ جلوتر یا برابر (با tie-break روی id) را بشمار
-    cur.execute("""
-        SELECT COUNT(*) FROM jobs
-        WHERE status IN ('queued','running')
-          AND (created_at < ?
-               OR (created_at = ? AND id <= ?))
-    """, (created_at, created_at, job_id))
-    (pos,) = cur.fetchone()
-    con.close()
-    return int(pos)
-
-
-def next_queued_job() -> dict | None:
+    return await _run(_db().queue_position, job_id)
+
+
+async def claim_jobs(worker_id: str, limit: int = 1, lease_sec: int = 120, max_followers: int = 0) -> List[dict]:
+    """
+    تا limit job قدیمی را در یک تراکنش برمی‌دارد و برای worker_id به مدت lease_sec lease می‌کند.
+    worker باید تا پایان کار heartbeat_jobs را صدا بزند، وگرنه reaper آن‌ها را به صف برمی‌گرداند.
+    با max_followers > 0، jobهای صف‌شده با همان capture_key (تا این تعداد) در job["followers"] می‌آیند.
+    """
+    return await _run(_db().claim, worker_id, limit, lease_sec, max_followers)
+
+
+async def next_queued_job(worker_id: str = "default", lease_sec: int = 120) -> dict | None:
     """
     قدیمی‌ترین job در صف را به‌صورت اتمیک انتخاب می‌کند و به حالت running می‌برد.
     از race condition بین چند Worker جلوگیری می‌کند.
     """
-    con = sqlite3.connect(DB_PATH)
-    con.row_factory = sqlite3.Row
-    # کنترل تراکنش دستی
-    con.isolation_level = None
-    cur = con.cursor()
-    try:
-        cur.execute("BEGIN IMMEDIATE")
-        cur.execute("""
-            SELECT * FROM jobs
-            WHERE status='queued'
-            ORDER BY created_at ASC, id ASC
-            LIMIT 1
-        """)
-        row = cur.fetchone()
-        if not row:
-            cur.execute("COMMIT")
-            con.close()
-            return None
-
-        job_id = row["id"]
-        cur.execute(
-            "UPDATE jobs SET status='running', started_at=? WHERE id=? AND status='queued'",
-            (int(time.time()), job_id)
-        )
-        cur.execute("COMMIT")
-        result = dict(row)
-        con.close()
-        return result
-    except Exception:
-        cur.execute("ROLLBACK")
-        con.close()
-        raise
-
-
-def complete_job(job_id: int, ok: bool, error: str = None):
-    """وضعیت job را به done/failed تغییر می‌دهد"""
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
-    if ok:
-        cur.execute(
-            "UPDATE jobs SET status='done', finished_at=? WHERE id=?",
-            (int(time.time()), job_id)
-        )
-    else:
-        cur.execute(
-            "UPDATE jobs SET status='failed', finished_at=?, error=? WHERE id=?",
-            (int(time.time()), error, job_id)
-        )
-    con.commit()
-    con.close()
+    jobs = await claim_jobs(worker_id, 1, lease_sec)
+    return jobs[0] if jobs else None
+
+
+async def heartbeat_jobs(worker_id: str, job_ids: List[int], lease_sec: int = 120) -> int:
+    """تمدید lease کارهایی که هنوز دست این worker است؛ تعداد تمدیدشده‌ها را برمی‌گرداند"""
+    return await _run(_db().heartbeat, worker_id, list(job_ids), lease_sec)
+
+
+async def defer_jobs(worker_id: str, job_ids: List[int], delay_sec: int) -> int:
+    """jobها را بدون مصرف attempts به صف برمی‌گرداند؛ تا delay_sec ثانیه برداشته نمی‌شوند"""
+    return await _run(_db().defer, worker_id, list(job_ids), delay_sec)
+
+
+async def requeue_expired_jobs(max_attempts: int = 3) -> Tuple[int, int]:
+    """کارهای دارای lease منقضی را دوباره در صف می‌گذارد؛ (requeued, failed) برمی‌گرداند"""
+    return await _run(_db().requeue_expired, max_attempts)
+
+
+async def complete_job(job_id: int, ok: bool, error: str = None, worker_id: Optional[str] = None,
+                       metrics: Optional[dict] = None) -> bool:
+    """وضعیت job را به done/failed تغییر می‌دهد؛ metrics (اختیاری) به‌صورت JSON ذخیره می‌شود"""
+    metrics_json = json.dumps(metrics, ensure_ascii=False, default=str) if metrics else None
+    return await _run(_db().complete, job_id, ok, error, worker_id, metrics_json)
@@ -0,0 +1,103 @@
+import time
+from collections import deque
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+from app.config import settings
+
+OK, BUSY, OPEN = "ok", "busy", "open"
+
+
+def domain_of(url: str) -> str:
+    try:
+        host = (urlsplit((url or "").strip()).hostname or "").lower()
+    except ValueError:
+        host = ""
+    return host[4:] if host.startswith("www.") else host
+
+
+class _DomainState:
+    __slots__ = ("active", "failures", "opened_at", "probing")
+
+    def __init__(self):
+        self.active = 0
+        self.failures: deque = deque()
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+
+class DomainGuard:
+    """
+    Per-domain admission for captures in this process.
+
+    - at most `max_concurrency` captures of one domain at a time (0 → no cap);
+      extra jobs are deferred back to the queue instead of holding a worker
+    - circuit breaker: `threshold` failures within `window_sec` open the circuit
+      for `window_sec`; jobs for an open domain fail fast. After the cooldown a
+      single probe capture is let through: success closes the circuit, failure
+      opens it again. threshold 0 → breaker off.
+    """
+
+    def __init__(self, max_concurrency: int = 2, threshold: int = 5, window_sec: int = 300):
+        self.max_concurrency = max(0, max_concurrency)
+        self.threshold = max(0, threshold)
+        self.window_sec = max(1, window_sec)
+        self._domains: Dict[str, _DomainState] = {}
+        self._trips = 0
+
+    def try_acquire(self, domain: str) -> str:
+        """OK (slot taken, call release() later), BUSY (defer the job) or OPEN (fail fast)."""
+        st = self._domains.setdefault(domain, _DomainState())
+        if st.opened_at is not None:
+            if time.monotonic() < st.opened_at + self.window_sec:
+                return OPEN
+            if st.probing:
+                # half-open: one probe at a time, the rest wait for its verdict
+                return BUSY
+            st.probing = True
+        elif self.max_concurrency and st.active >= self.max_concurrency:
+            return BUSY
+        st.active += 1
+        return OK
+
+    def release(self, domain: str, ok: Optional[bool]) -> bool:
+        """
+        Give the slot back with the capture outcome (None → aborted, not the site's fault).
+        Returns True if this failure opened the circuit.
+        """
+        st = self._domains.get(domain)
+        if st is None:
+            return False
+        st.active = max(0, st.active - 1)
+        tripped = False
+        now = time.monotonic()
+        if ok:
+            st.failures.clear()
+            st.opened_at = None
+        elif ok is False and self.threshold:
+            st.failures.append(now)
+            while st.failures and st.failures[0] < now - self.window_sec:
+                st.failures.popleft()
+            if st.probing or len(st.failures) >= self.threshold:
+                tripped = st.opened_at is None or st.probing
+                st.opened_at = now
+                self._trips += tripped
+        st.probing = False
+        if not st.active and not st.failures and st.opened_at is None:
+            del self._domains[domain]
+        return tripped
+
+    def stats(self) -> Dict[str, int]:
+        now = time.monotonic()
+        return {
+            "domains_active": sum(1 for st in self._domains.values() if st.active),
+            "domains_open": sum(1 for st in self._domains.values()
+                                if st.opened_at is not None and now < st.opened_at + self.window_sec),
+            "circuit_trips": self._trips,
+        }
+
+
+domain_guard = DomainGuard(
+    max_concurrency=int(getattr(settings, "DOMAIN_MAX_CONCURRENCY", 2)),
+    threshold=int(getattr(settings, "DOMAIN_CIRCUIT_BREAK_THRESHOLD", 5)),
+    window_sec=int(getattr(settings, "DOMAIN_CIRCUIT_BREAK_WINDOW_SEC", 300)),
+)
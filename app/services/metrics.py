@@ -0,0 +1,232 @@
+import asyncio, math, threading, time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from aiohttp import web
+from app.config import settings
+from app.services.db import get_queue_depth, get_oldest_queued_at
+from app.services.sharekit.pool import browser_pool_recycles, browser_pool_stats
+
+# -------------------------------
+# رجیستری کوچک با خروجی Prometheus text (بدون وابستگی اضافه؛ aiohttp همراه aiogram نصب است)
+# -------------------------------
+
+LabelKey = Tuple[str, ...]
+
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        return "\n".join([f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.samples()])
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, k)} {_fmt(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class CallbackGauge(_Metric):
+    """مقدارها هنگام scrape از fn خوانده می‌شوند: [(labels dict, value), ...]"""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str], fn: Callable[[], List[Tuple[Dict[str, str], float]]],
+                 kind: str = "gauge"):
+        super().__init__(name, help, labels)
+        self.fn, self.kind = fn, kind
+
+    def samples(self):
+        try:
+            rows = self.fn()
+        except Exception:
+            rows = []
+        return [f"{self.name}{_labels(self.label_names, self._key(l))} {_fmt(v)}" for l, v in rows]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = ()):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._values: Dict[LabelKey, List[float]] = {}   # counts per bucket + [sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    row[i] += 1
+                    break
+            row[-2] += value
+            row[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        out = []
+        for key, row in items:
+            acc = 0.0
+            for i, b in enumerate(self.buckets):
+                acc += row[i]
+                le = 'le="%s"' % _fmt(b)
+                out.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {_fmt(acc)}")
+            out.append(f"{self.name}_sum{_labels(self.label_names, key)} {_fmt(row[-2])}")
+            out.append(f"{self.name}_count{_labels(self.label_names, key)} {_fmt(row[-1])}")
+        return out
+
+
+REGISTRY: List[_Metric] = []
+
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 45, 60, 90, 120, 300)
+WAIT_BUCKETS = (1, 2, 5, 10, 20, 30, 60, 120, 300, 600, 1800)
+
+# ---------- queue (در پروسهٔ بات از DB خوانده می‌شود) ----------
+QUEUE_DEPTH = Gauge("u2s_queue_depth", "Unfinished jobs (queued + running).")
+QUEUE_OLDEST_AGE = Gauge("u2s_queue_oldest_age_seconds", "Age of the oldest job still waiting to be claimed.")
+
+# ---------- workers ----------
+JOB_PICKUP = Histogram("u2s_job_pickup_seconds", "Time from enqueue to claim by a worker.", buckets=WAIT_BUCKETS)
+CAPTURE_LATENCY = Histogram("u2s_capture_seconds", "Browser capture time (excluding upload waits).",
+                            ["device", "mode"], LATENCY_BUCKETS)
+DELIVERY_LATENCY = Histogram("u2s_delivery_seconds", "Time spent uploading/sending results to one user.",
+                             ["device", "mode"], LATENCY_BUCKETS)
+JOB_LATENCY = Histogram("u2s_job_seconds", "Enqueue to completion, per job.", ["outcome"], LATENCY_BUCKETS + (600, 1800))
+JOBS = Counter("u2s_jobs_total", "Finished jobs by outcome.", ["outcome"])
+WORKERS = Gauge("u2s_workers", "job_worker coroutines running in this process.")
+WORKERS_BUSY = Gauge("u2s_workers_busy", "Workers currently handling a job.")
+
+# ---------- Telegram ----------
+TELEGRAM_ERRORS = Counter("u2s_telegram_errors_total", "Failed Bot API calls.", ["method", "error"])
+
+
+def _browser_rows(field: str):
+    return [({"browser": str(b["id"]), "draining": str(b["draining"]).lower()}, b[field]) for b in browser_pool_stats()]
+
+
+BROWSER_RSS = CallbackGauge("u2s_browser_rss_bytes", "RSS of each pooled browser and its renderers.",
+                            ["browser", "draining"], lambda: [(l, v * 1024 * 1024) for l, v in _browser_rows("rss_mb")])
+BROWSER_PAGES = CallbackGauge("u2s_browser_pages", "Contexts opened on each pooled browser since launch.",
+                              ["browser", "draining"], lambda: _browser_rows("pages"))
+BROWSER_INFLIGHT = CallbackGauge("u2s_browser_inflight", "Contexts currently open on each pooled browser.",
+                                 ["browser", "draining"], lambda: _browser_rows("inflight"))
+BROWSER_RECYCLES = CallbackGauge("u2s_browser_recycles_total", "Browser recycles by reason.", ["reason"],
+                                 lambda: [({"reason": r}, n) for r, n in browser_pool_recycles().items()],
+                                 kind="counter")
+
+
+def render_metrics() -> str:
+    return "\n".join(m.render() for m in REGISTRY) + "\n"
+
+
+# -------------------------------
+# HTTP endpoint
+# -------------------------------
+
+async def _handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=render_metrics(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+async def start_metrics_server(port: Optional[int] = None) -> Optional[web.AppRunner]:
+    """
+    GET /metrics روی METRICS_HOST:METRICS_PORT (0 → خاموش).
+    در supervisor mode هر پروسهٔ capture پورت خودش را دارد (METRICS_PORT + 1 + index).
+    """
+    port = int(getattr(settings, "METRICS_PORT", 0)) if port is None else port
+    if port <= 0:
+        return None
+    app = web.Application()
+    app.router.add_get("/metrics", _handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    host = str(getattr(settings, "METRICS_HOST", "127.0.0.1"))
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        print(f"[metrics] cannot listen on {host}:{port}: {e!r}")
+        await runner.cleanup()
+        return None
+    print(f"[metrics] serving http://{host}:{port}/metrics")
+    return runner
+
+
+# -------------------------------
+# پایش صف + هشدار
+# -------------------------------
+
+async def queue_monitor(alerter=None):
+    """
+    عمق صف و سن قدیمی‌ترین job را هر METRICS_QUEUE_POLL_SEC به‌روز می‌کند و
+    با عبور از QUEUE_WARN_DEPTH / QUEUE_WARN_AGE_SEC هشدار می‌دهد (debounce با خود AdminAlerter).
+    """
+    interval = max(1, int(getattr(settings, "METRICS_QUEUE_POLL_SEC", 15)))
+    warn_depth = int(getattr(settings, "QUEUE_WARN_DEPTH", 50))
+    warn_age = int(getattr(settings, "QUEUE_WARN_AGE_SEC", 60))
+    while True:
+        try:
+            depth = await get_queue_depth()
+            oldest = await get_oldest_queued_at()
+            age = max(0, int(time.time()) - oldest) if oldest else 0
+            QUEUE_DEPTH.set(depth)
+            QUEUE_OLDEST_AGE.set(age)
+            if alerter is not None:
+                if warn_depth > 0 and depth >= warn_depth:
+                    await alerter.send_warn("QueueDepth", f"{depth} unfinished job(s) (threshold {warn_depth})")
+                if warn_age > 0 and age >= warn_age:
+                    await alerter.send_warn("QueueAge", f"oldest queued job waits {age}s (threshold {warn_age}s)")
+        except Exception as e:
+            print(f"[metrics] queue monitor failed: {e!r}")
+        await asyncio.sleep(interval)
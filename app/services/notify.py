@@ -0,0 +1,138 @@
+import asyncio, os, socket
+from collections import deque
+from typing import Optional
+from app.config import settings
+from app.services.db import listen_jobs, unlisten_jobs
+
+
+class JobNotifier:
+    """
+    Wakes idle workers as soon as a job is enqueued.
+
+    In-process: a capped wakeup counter + waiter futures, so a notify that
+    happens while a worker is still busy checking the DB is not lost.
+    Cross-process (optional): every listening process binds a unix datagram
+    socket under JOB_WAKEUP_SOCKET_DIR; notify() pings all of them.
+    Cross-host: the queue backend's own channel (Postgres LISTEN/NOTIFY), if any.
+    """
+
+    def __init__(self, socket_dir: str = "", max_pending: int = 64):
+        self.socket_dir = socket_dir
+        self.max_pending = max_pending
+        self._pending = 0
+        self._waiters: deque = deque()
+        self._sock: Optional[socket.socket] = None
+        self._sock_path: Optional[str] = None
+
+    # ---------- in-process ----------
+    def _wake_local(self, n: int = 1):
+        for _ in range(n):
+            while self._waiters:
+                fut = self._waiters.popleft()
+                if not fut.done():
+                    fut.set_result(True)
+                    break
+            else:
+                self._pending = min(self._pending + 1, self.max_pending)
+
+    async def wait(self, timeout: float) -> bool:
+        """True if woken by a notify, False on fallback timeout."""
+        if self._pending:
+            self._pending -= 1
+            return True
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            try:
+                self._waiters.remove(fut)
+            except ValueError:
+                pass
+
+    def notify(self, n: int = 1):
+        self._wake_local(n)
+        if self.socket_dir:
+            self._broadcast()
+
+    # ---------- cross-process ----------
+    def listen(self):
+        """Start receiving wakeups from other processes/hosts (no-op if disabled)."""
+        listen_jobs(self._wake_local)
+        if not self.socket_dir or self._sock is not None:
+            return
+        os.makedirs(self.socket_dir, exist_ok=True)
+        path = os.path.join(self.socket_dir, f"{os.getpid()}.sock")
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(path)
+        sock.setblocking(False)
+        asyncio.get_running_loop().add_reader(sock.fileno(), self._on_datagram)
+        self._sock, self._sock_path = sock, path
+
+    def _on_datagram(self):
+        n = 0
+        while True:
+            try:
+                self._sock.recv(16)
+                n += 1
+            except (BlockingIOError, InterruptedError):
+                break
+        if n:
+            self._wake_local(n)
+
+    def _broadcast(self):
+        try:
+            names = os.listdir(self.socket_dir)
+        except FileNotFoundError:
+            return
+        out = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        out.setblocking(False)
+        try:
+            for name in names:
+                path = os.path.join(self.socket_dir, name)
+                if not name.endswith(".sock") or path == self._sock_path:
+                    continue
+                try:
+                    out.sendto(b"1", path)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # stale socket of a dead process
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+                except OSError:
+                    # receiver buffer full → it is already awake
+                    pass
+        finally:
+            out.close()
+
+    def close(self):
+        unlisten_jobs()
+        if self._sock is None:
+            return
+        try:
+            asyncio.get_running_loop().remove_reader(self._sock.fileno())
+        except Exception:
+            pass
+        self._sock.close()
+        try:
+            os.unlink(self._sock_path)
+        except OSError:
+            pass
+        self._sock = self._sock_path = None
+
+
+job_notifier = JobNotifier(
+    socket_dir=str(getattr(settings, "JOB_WAKEUP_SOCKET_DIR", "") or ""),
+    max_pending=max(1, int(getattr(settings, "WORKER_COUNT", 5))),
+)
+
+
+def notify_job_enqueued(n: int = 1):
+    job_notifier.notify(n)
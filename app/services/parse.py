@@ -31,3 +31,24 @@ def parse_shot_args(text: str) -> str:
         flags["mobile"] = True
 
     return json.dumps(flags, ensure_ascii=False)
+
+
+def capture_options(params) -> dict:
+    """
+    params_json (str یا dict) → آرگومان‌های ShareKit.capture
+    {device, force_slice, full_page, pdf, delay_ms}
+    """
+    if isinstance(params, dict):
+        opts = params
+    else:
+        try:
+            opts = json.loads(params or "{}")
+        except Exception:
+            opts = {}
+    return {
+        "device": "desktop" if opts.get("desktop") else "mobile",
+        "force_slice": bool(opts.get("slice", False)),
+        "full_page": bool(opts.get("full", False)),
+        "pdf": bool(opts.get("pdf", False)),
+        "delay_ms": int(opts.get("delay_ms")) if str(opts.get("delay_ms", "")).isdigit() else None,
+    }
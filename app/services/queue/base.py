@@ -0,0 +1,91 @@
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+
+class EnqueueResult(NamedTuple):
+    job_id: int
+    position: int
+    depth: int
+
+
+class QueueBackend:
+    """
+    Storage behind app.services.db (users + job queue with leases).
+    Methods are blocking; db.py runs them on its executor so the event loop
+    never waits on the database.
+    """
+
+    name = "base"
+
+    def init(self):
+        """Create/migrate tables. Called once per process from init_db()."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    # ---------- users ----------
+    def upsert_user(self, u: Dict, channel_member: bool):
+        raise NotImplementedError
+
+    # ---------- queue ----------
+    def enqueue(self, user_id: int, url: str, params_json: Optional[str] = None,
+                capture_key: Optional[str] = None, trace_id: Optional[str] = None) -> EnqueueResult:
+        raise NotImplementedError
+
+    def queue_depth(self) -> int:
+        raise NotImplementedError
+
+    def queue_position(self, job_id: int) -> int:
+        raise NotImplementedError
+
+    def oldest_queued_at(self) -> Optional[int]:
+        """created_at of the oldest job still waiting to be claimed (None if none)."""
+        raise NotImplementedError
+
+    def claim(self, worker_id: str, limit: int, lease_sec: int, max_followers: int = 0) -> List[dict]:
+        raise NotImplementedError
+
+    def heartbeat(self, worker_id: str, job_ids: List[int], lease_sec: int) -> int:
+        raise NotImplementedError
+
+    def defer(self, worker_id: str, job_ids: List[int], delay_sec: int) -> int:
+        """Put running jobs back as queued, not claimable for delay_sec; attempts are not spent."""
+        raise NotImplementedError
+
+    def requeue_expired(self, max_attempts: int) -> Tuple[int, int]:
+        raise NotImplementedError
+
+    def complete(self, job_id: int, ok: bool, error: Optional[str] = None, worker_id: Optional[str] = None,
+                 metrics_json: Optional[str] = None) -> bool:
+        raise NotImplementedError
+
+    # ---------- wakeups ----------
+    def listen(self, loop, on_enqueued: Callable[[int], None]):
+        """Call on_enqueued(n) on `loop` when another process/node enqueues (no-op if unsupported)."""
+
+    def unlisten(self):
+        pass
+
+
+def group_followers(rows: List[dict], max_followers: int) -> Tuple[List[dict], Dict[str, dict], List[int]]:
+    """
+    Coalescing shared by the backends: within the claimed rows, a job with the
+    capture_key of an earlier row becomes that row's follower.
+    Returns (leaders, leader by key, claimed ids).
+    """
+    leaders: List[dict] = []
+    by_key: Dict[str, dict] = {}
+    claimed_ids: List[int] = []
+    for job in rows:
+        key = job.get("capture_key")
+        if key and key in by_key:
+            if len(by_key[key]["followers"]) < max_followers:
+                by_key[key]["followers"].append(job)
+                claimed_ids.append(job["id"])
+            continue
+        job["followers"] = []
+        leaders.append(job)
+        claimed_ids.append(job["id"])
+        if key:
+            by_key[key] = job
+    return leaders, by_key, claimed_ids
@@ -0,0 +1,151 @@
+import threading, time
+from typing import Dict, List, Optional, Tuple
+from app.services.queue.base import EnqueueResult, QueueBackend, group_followers
+
+PENDING = ("queued", "running")
+
+
+class MemoryBackend(QueueBackend):
+    """
+    Process-local queue with the same semantics as the SQL backends
+    (ordering, leases, coalescing, owner-guarded completion).
+    For tests and local experiments: nothing survives a restart and other
+    processes cannot see it (supervisor mode needs sqlite/postgres).
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users: Dict[int, dict] = {}
+        self._jobs: Dict[int, dict] = {}
+        self._next_id = 1
+
+    def init(self):
+        pass
+
+    # ---------- users ----------
+    def upsert_user(self, u: Dict, channel_member: bool):
+        now = int(time.time())
+        with self._lock:
+            row = self._users.get(u["id"])
+            if row is None:
+                row = self._users[u["id"]] = {"user_id": u["id"], "joined_at": now, "channel_member_at": None}
+            row.update(
+                username=u.get("username"), first_name=u.get("first_name"), last_name=u.get("last_name"),
+                language_code=u.get("language_code"), is_premium=int(u.get("is_premium") or 0),
+            )
+            if channel_member:
+                row["channel_member_at"] = now
+
+    # ---------- queue ----------
+    def _pending(self) -> List[dict]:
+        return [j for j in self._jobs.values() if j["status"] in PENDING]
+
+    def enqueue(self, user_id: int, url: str, params_json: Optional[str] = None,
+                capture_key: Optional[str] = None, trace_id: Optional[str] = None) -> EnqueueResult:
+        with self._lock:
+            job_id = self._next_id
+            self._next_id += 1
+            self._jobs[job_id] = {
+                "id": job_id, "user_id": user_id, "url": url, "status": "queued",
+                "created_at": int(time.time()), "started_at": None, "finished_at": None, "error": None,
+                "params_json": params_json, "worker_id": None, "lease_expires_at": None, "attempts": 0,
+                "capture_key": capture_key, "metrics_json": None, "available_at": None, "trace_id": trace_id,
+            }
+            depth = len(self._pending())
+        return EnqueueResult(job_id, depth, depth)
+
+    def queue_depth(self) -> int:
+        with self._lock:
+            return len(self._pending())
+
+    def oldest_queued_at(self) -> Optional[int]:
+        with self._lock:
+            return min((j["created_at"] for j in self._jobs.values() if j["status"] == "queued"), default=None)
+
+    def queue_position(self, job_id: int) -> int:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job["status"] not in PENDING:
+                return 0
+            return sum(1 for j in self._pending() if j["id"] <= job_id)
+
+    def claim(self, worker_id: str, limit: int, lease_sec: int, max_followers: int = 0) -> List[dict]:
+        now = int(time.time())
+        with self._lock:
+            queued = sorted((j for j in self._jobs.values()
+                             if j["status"] == "queued" and (j["available_at"] or 0) <= now),
+                            key=lambda j: (j["created_at"], j["id"]))
+            rows = [dict(j) for j in queued[:max(1, int(limit))]]
+            if not rows:
+                return []
+            leaders, by_key, claimed_ids = group_followers(rows, max_followers)
+            if max_followers > 0:
+                taken = set(claimed_ids)
+                for key, lead in by_key.items():
+                    for j in queued:
+                        if len(lead["followers"]) >= max_followers:
+                            break
+                        if j["capture_key"] == key and j["id"] not in taken:
+                            lead["followers"].append(dict(j))
+                            claimed_ids.append(j["id"])
+                            taken.add(j["id"])
+            lease = dict(status="running", started_at=now, worker_id=worker_id, lease_expires_at=now + int(lease_sec))
+            for job_id in claimed_ids:
+                self._jobs[job_id].update(lease)
+        for job in leaders:
+            for j in [job, *job["followers"]]:
+                j.update(lease)
+        return leaders
+
+    def heartbeat(self, worker_id: str, job_ids: List[int], lease_sec: int) -> int:
+        until = int(time.time()) + int(lease_sec)
+        n = 0
+        with self._lock:
+            for job_id in job_ids:
+                job = self._jobs.get(job_id)
+                if job and job["status"] == "running" and job["worker_id"] == worker_id:
+                    job["lease_expires_at"] = until
+                    n += 1
+        return n
+
+    def defer(self, worker_id: str, job_ids: List[int], delay_sec: int) -> int:
+        until = int(time.time()) + int(delay_sec)
+        n = 0
+        with self._lock:
+            for job_id in job_ids:
+                job = self._jobs.get(job_id)
+                if job and job["status"] == "running" and job["worker_id"] == worker_id:
+                    job.update(status="queued", worker_id=None, lease_expires_at=None, started_at=None,
+                               available_at=until)
+                    n += 1
+        return n
+
+    def requeue_expired(self, max_attempts: int) -> Tuple[int, int]:
+        now = int(time.time())
+        requeued = failed = 0
+        with self._lock:
+            for job in self._jobs.values():
+                if job["status"] != "running" or (job["lease_expires_at"] or 0) >= now:
+                    continue
+                job.update(worker_id=None, lease_expires_at=None, attempts=job["attempts"] + 1)
+                if job["attempts"] < int(max_attempts):
+                    job.update(status="queued", started_at=None)
+                    requeued += 1
+                else:
+                    job.update(status="failed", finished_at=now, error="lease expired too many times")
+                    failed += 1
+        return requeued, failed
+
+    def complete(self, job_id: int, ok: bool, error: Optional[str] = None, worker_id: Optional[str] = None,
+                 metrics_json: Optional[str] = None) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job["status"] != "running" or (worker_id is not None and job["worker_id"] != worker_id):
+                return False
+            job.update(status="done" if ok else "failed", finished_at=int(time.time()),
+                       lease_expires_at=None, metrics_json=metrics_json)
+            if not ok:
+                job["error"] = error
+            return True
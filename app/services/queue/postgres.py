@@ -0,0 +1,327 @@
+import threading, time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor
+
+from app.services.queue.base import EnqueueResult, QueueBackend, group_followers
+
+CHANNEL = "shot_jobs_queued"
+
+
+class PostgresBackend(QueueBackend):
+    """
+    Multi-node queue. Workers on any host claim with FOR UPDATE SKIP LOCKED, so
+    concurrent claims never block on or double-take the same rows. Every enqueue
+    sends NOTIFY in its transaction, and each process LISTENs to wake its idle
+    workers (the unix-socket wakeup only reaches processes on the same host).
+
+    The tables are shot_users/shot_jobs because app/handlers/database.py
+    already owns `users`/`jobs` in the same database.
+    """
+
+    name = "postgres"
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self._local = threading.local()
+        self._conns: List = []          # every executor thread's connection, closed together in close()
+        self._conns_lock = threading.Lock()
+        self._listen_con = None
+        self._listen_loop = None
+
+    def _connect(self):
+        return psycopg2.connect(self.dsn, cursor_factory=RealDictCursor)
+
+    def _conn(self):
+        con = getattr(self._local, "con", None)
+        if con is None or con.closed:
+            con = self._local.con = self._connect()
+            with self._conns_lock:
+                self._conns = [c for c in self._conns if not c.closed]
+                self._conns.append(con)
+        return con
+
+    def _tx(self, fn):
+        """Run fn(cur) in one transaction on this thread's connection."""
+        con = self._conn()
+        try:
+            with con.cursor() as cur:
+                out = fn(cur)
+            con.commit()
+            return out
+        except psycopg2.OperationalError:
+            # dropped connection: reconnect next time
+            try:
+                con.close()
+            except Exception:
+                pass
+            raise
+        except Exception:
+            con.rollback()
+            raise
+
+    def init(self):
+        def ddl(cur):
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS shot_users (
+                  user_id BIGINT PRIMARY KEY,
+                  username TEXT,
+                  first_name TEXT,
+                  last_name TEXT,
+                  language_code TEXT,
+                  is_premium INTEGER DEFAULT 0,
+                  joined_at BIGINT,
+                  channel_member_at BIGINT
+                )
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS shot_jobs (
+                    id BIGSERIAL PRIMARY KEY,
+                    user_id BIGINT NOT NULL,
+                    url TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    created_at BIGINT NOT NULL,
+                    started_at BIGINT,
+                    finished_at BIGINT,
+                    error TEXT,
+                    params_json TEXT,
+                    worker_id TEXT,
+                    lease_expires_at BIGINT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    capture_key TEXT,
+                    metrics_json TEXT,
+                    available_at BIGINT,
+                    trace_id TEXT
+                )
+            """)
+            cur.execute("ALTER TABLE shot_jobs ADD COLUMN IF NOT EXISTS available_at BIGINT")
+            cur.execute("ALTER TABLE shot_jobs ADD COLUMN IF NOT EXISTS trace_id TEXT")
+            # like the sqlite queue, jobs do not require a shot_users row (users who never sent /start)
+            cur.execute("ALTER TABLE shot_jobs DROP CONSTRAINT IF EXISTS shot_jobs_user_id_fkey")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_shot_jobs_queued ON shot_jobs(created_at, id) WHERE status='queued'")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_shot_jobs_pending ON shot_jobs(id) WHERE status IN ('queued','running')")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_shot_jobs_queued_key ON shot_jobs(capture_key, id) WHERE status='queued'")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_shot_jobs_lease ON shot_jobs(lease_expires_at) WHERE status='running'")
+        self._tx(ddl)
+
+    def close(self):
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+        for con in conns:
+            try:
+                if not con.closed:
+                    con.close()
+            except Exception:
+                pass
+        self._local = threading.local()
+
+    # ---------- users ----------
+    def upsert_user(self, u: Dict, channel_member: bool):
+        now = int(time.time())
+        self._tx(lambda cur: cur.execute("""
+            INSERT INTO shot_users(user_id, username, first_name, last_name, language_code, is_premium, joined_at, channel_member_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT(user_id) DO UPDATE SET
+              username=excluded.username,
+              first_name=excluded.first_name,
+              last_name=excluded.last_name,
+              language_code=excluded.language_code,
+              is_premium=excluded.is_premium,
+              channel_member_at=COALESCE(excluded.channel_member_at, shot_users.channel_member_at)
+        """, (
+            u["id"], u.get("username"), u.get("first_name"), u.get("last_name"),
+            u.get("language_code"), int(u.get("is_premium") or 0), now, now if channel_member else None,
+        )))
+
+    # ---------- queue ----------
+    def enqueue(self, user_id: int, url: str, params_json: Optional[str] = None,
+                capture_key: Optional[str] = None, trace_id: Optional[str] = None) -> EnqueueResult:
+        def fn(cur):
+            cur.execute(
+                "INSERT INTO shot_jobs (user_id, url, status, created_at, params_json, capture_key, trace_id) "
+                "VALUES (%s, %s, 'queued', %s, %s, %s, %s) RETURNING id",
+                (user_id, url, int(time.time()), params_json, capture_key, trace_id)
+            )
+            job_id = cur.fetchone()["id"]
+            cur.execute("SELECT COUNT(*) AS n FROM shot_jobs WHERE status IN ('queued','running') AND id <= %s", (job_id,))
+            position = cur.fetchone()["n"]
+            # delivered to every LISTENing process when this transaction commits
+            cur.execute(f"NOTIFY {CHANNEL}")
+            return job_id, position
+        job_id, position = self._tx(fn)
+        # ids from concurrent transactions may commit out of order, so position is counted, not assumed
+        return EnqueueResult(int(job_id), int(position), int(position))
+
+    def queue_depth(self) -> int:
+        def fn(cur):
+            cur.execute("SELECT COUNT(*) AS n FROM shot_jobs WHERE status IN ('queued','running')")
+            return int(cur.fetchone()["n"])
+        return self._tx(fn)
+
+    def oldest_queued_at(self) -> Optional[int]:
+        def fn(cur):
+            cur.execute("SELECT MIN(created_at) AS t FROM shot_jobs WHERE status='queued'")
+            t = cur.fetchone()["t"]
+            return int(t) if t is not None else None
+        return self._tx(fn)
+
+    def queue_position(self, job_id: int) -> int:
+        def fn(cur):
+            cur.execute("SELECT status FROM shot_jobs WHERE id=%s", (job_id,))
+            row = cur.fetchone()
+            if not row or row["status"] not in ("queued", "running"):
+                return 0
+            cur.execute("SELECT COUNT(*) AS n FROM shot_jobs WHERE status IN ('queued','running') AND id <= %s", (job_id,))
+            return int(cur.fetchone()["n"])
+        return self._tx(fn)
+
+    def claim(self, worker_id: str, limit: int, lease_sec: int, max_followers: int = 0) -> List[dict]:
+        now = int(time.time())
+
+        def fn(cur):
+            # rows locked by another claimer are skipped instead of waited on
+            cur.execute("""
+                SELECT * FROM shot_jobs
+                WHERE status='queued' AND COALESCE(available_at, 0) <= %s
+                ORDER BY created_at ASC, id ASC
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (now, max(1, int(limit))))
+            rows = [dict(r) for r in cur.fetchall()]
+            if not rows:
+                return []
+            leaders, by_key, claimed_ids = group_followers(rows, max_followers)
+            if max_followers > 0:
+                for key, lead in by_key.items():
+                    room = max_followers - len(lead["followers"])
+                    if room <= 0:
+                        continue
+                    cur.execute("""
+                        SELECT * FROM shot_jobs
+                        WHERE status='queued' AND capture_key=%s AND COALESCE(available_at, 0) <= %s
+                          AND NOT (id = ANY(%s))
+                        ORDER BY id ASC
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    """, (key, now, claimed_ids, room))
+                    for r in cur.fetchall():
+                        lead["followers"].append(dict(r))
+                        claimed_ids.append(r["id"])
+            cur.execute("""
+                UPDATE shot_jobs SET status='running', started_at=%s, worker_id=%s, lease_expires_at=%s
+                WHERE id = ANY(%s)
+            """, (now, worker_id, now + int(lease_sec), claimed_ids))
+            return leaders
+
+        leaders = self._tx(fn)
+        for job in leaders:
+            for j in [job, *job["followers"]]:
+                j.update(status="running", started_at=now, worker_id=worker_id, lease_expires_at=now + int(lease_sec))
+        return leaders
+
+    def heartbeat(self, worker_id: str, job_ids: List[int], lease_sec: int) -> int:
+        if not job_ids:
+            return 0
+
+        def fn(cur):
+            cur.execute("""
+                UPDATE shot_jobs SET lease_expires_at=%s
+                WHERE status='running' AND worker_id=%s AND id = ANY(%s)
+            """, (int(time.time()) + int(lease_sec), worker_id, list(job_ids)))
+            return cur.rowcount
+        return self._tx(fn)
+
+    def defer(self, worker_id: str, job_ids: List[int], delay_sec: int) -> int:
+        if not job_ids:
+            return 0
+
+        def fn(cur):
+            cur.execute("""
+                UPDATE shot_jobs
+                SET status='queued', worker_id=NULL, lease_expires_at=NULL, started_at=NULL, available_at=%s
+                WHERE status='running' AND worker_id=%s AND id = ANY(%s)
+            """, (int(time.time()) + int(delay_sec), worker_id, list(job_ids)))
+            return cur.rowcount
+        return self._tx(fn)
+
+    def requeue_expired(self, max_attempts: int) -> Tuple[int, int]:
+        now = int(time.time())
+
+        def fn(cur):
+            cur.execute("""
+                UPDATE shot_jobs
+                SET status='queued', worker_id=NULL, lease_expires_at=NULL, started_at=NULL,
+                    attempts=attempts + 1
+                WHERE status='running' AND COALESCE(lease_expires_at, 0) < %s AND attempts + 1 < %s
+            """, (now, int(max_attempts)))
+            requeued = cur.rowcount
+            cur.execute("""
+                UPDATE shot_jobs
+                SET status='failed', finished_at=%s, worker_id=NULL, lease_expires_at=NULL,
+                    attempts=attempts + 1, error='lease expired too many times'
+                WHERE status='running' AND COALESCE(lease_expires_at, 0) < %s
+            """, (now, now))
+            failed = cur.rowcount
+            if requeued:
+                cur.execute(f"NOTIFY {CHANNEL}")
+            return requeued, failed
+        return self._tx(fn)
+
+    def complete(self, job_id: int, ok: bool, error: Optional[str] = None, worker_id: Optional[str] = None,
+                 metrics_json: Optional[str] = None) -> bool:
+        owner_sql = " AND worker_id=%s" if worker_id is not None else ""
+        owner_args = (worker_id,) if worker_id is not None else ()
+
+        def fn(cur):
+            if ok:
+                cur.execute(
+                    "UPDATE shot_jobs SET status='done', finished_at=%s, lease_expires_at=NULL, metrics_json=%s WHERE id=%s AND status='running'" + owner_sql,
+                    (int(time.time()), metrics_json, job_id, *owner_args)
+                )
+            else:
+                cur.execute(
+                    "UPDATE shot_jobs SET status='failed', finished_at=%s, error=%s, lease_expires_at=NULL, metrics_json=%s WHERE id=%s AND status='running'" + owner_sql,
+                    (int(time.time()), error, metrics_json, job_id, *owner_args)
+                )
+            return cur.rowcount > 0
+        return self._tx(fn)
+
+    # ---------- wakeups ----------
+    def listen(self, loop, on_enqueued: Callable[[int], None]):
+        if self._listen_con is not None:
+            return
+        con = psycopg2.connect(self.dsn)
+        con.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with con.cursor() as cur:
+            cur.execute(f"LISTEN {CHANNEL}")
+
+        def _on_readable():
+            try:
+                con.poll()
+            except Exception as e:
+                print(f"[queue:postgres] LISTEN connection lost: {e!r}")
+                self.unlisten()
+                return
+            n = len(con.notifies)
+            con.notifies.clear()
+            if n:
+                on_enqueued(n)
+
+        loop.add_reader(con.fileno(), _on_readable)
+        self._listen_con, self._listen_loop = con, loop
+
+    def unlisten(self):
+        con, loop = self._listen_con, self._listen_loop
+        self._listen_con = self._listen_loop = None
+        if con is None:
+            return
+        try:
+            loop.remove_reader(con.fileno())
+        except Exception:
+            pass
+        try:
+            con.close()
+        except Exception:
+            pass
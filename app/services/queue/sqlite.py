@@ -0,0 +1,344 @@
+import os, sqlite3, threading, time
+from typing import Dict, List, Optional, Tuple
+from app.services.queue.base import EnqueueResult, QueueBackend, group_followers
+
+
+class SQLiteBackend(QueueBackend):
+    """
+    Single-host queue in a SQLite file (WAL). Each executor thread keeps its
+    own persistent connection, since sqlite3 connections are not thread-safe.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._conns: List[sqlite3.Connection] = []   # اتصال همهٔ threadها، برای بستن در close()
+        self._conns_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # check_same_thread=False فقط برای اینکه close() بتواند از thread دیگری ببندد؛ هر اتصال مال یک thread است
+        con = sqlite3.connect(self.path, timeout=30, cached_statements=256, check_same_thread=False)
+        con.row_factory = sqlite3.Row
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute("PRAGMA busy_timeout=30000")
+        con.execute("PRAGMA temp_store=MEMORY")
+        con.execute("PRAGMA cache_size=-8000")
+        return con
+
+    def _conn(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = self._local.con = self._connect()
+            with self._conns_lock:
+                self._conns.append(con)
+        return con
+
+    def close(self):
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+        for con in conns:
+            try:
+                con.close()
+            except Exception:
+                pass
+        self._local = threading.local()
+
+    def init(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        con = self._connect()
+        cur = con.cursor()
+        # جدول کاربران
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+              user_id INTEGER PRIMARY KEY,
+              username TEXT,
+              first_name TEXT,
+              last_name TEXT,
+              language_code TEXT,
+              is_premium INTEGER DEFAULT 0,
+              joined_at INTEGER,
+              channel_member_at INTEGER
+            );
+        """)
+        # جدول درخواست‌ها (jobs)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                url TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',   -- queued | running | done | failed
+                created_at INTEGER NOT NULL,
+                started_at INTEGER,
+                finished_at INTEGER,
+                error TEXT,
+                params_json TEXT,                        -- اختیاری: پارامترهای هر job به صورت JSON
+                FOREIGN KEY (user_id) REFERENCES users(user_id)
+            );
+        """)
+        # مهاجرت ایمن: ستون‌هایی که در دیتابیس‌های قدیمی نیستند اضافه شوند
+        cur.execute("PRAGMA table_info(jobs)")
+        jcols = {row[1] for row in cur.fetchall()}
+        for col, ddl in (
+            ("params_json", "params_json TEXT"),
+            ("worker_id", "worker_id TEXT"),                    # صاحب lease
+            ("lease_expires_at", "lease_expires_at INTEGER"),   # بعد از این زمان reaper آن را برمی‌گرداند
+            ("attempts", "attempts INTEGER NOT NULL DEFAULT 0"),
+            ("capture_key", "capture_key TEXT"),                # jobs هم‌کلید یک‌بار capture می‌شوند
+            ("metrics_json", "metrics_json TEXT"),              # آمار رندر هر job (dsf، پیکسل‌ها، ...)
+            ("available_at", "available_at INTEGER"),           # job عقب‌افتاده (defer) تا این زمان برداشته نمی‌شود
+            ("trace_id", "trace_id TEXT"),                      # کد پیگیری که به کاربر نشان داده می‌شود
+        ):
+            if col not in jcols:
+                try:
+                    cur.execute(f"ALTER TABLE jobs ADD COLUMN {ddl}")
+                except Exception:
+                    pass
+
+        # ایندکس‌ها: برداشتن job بعدی + شمارش فقط روی کارهای ناتمام (نه کل تاریخچه)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs(status, created_at, id)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_jobs_pending ON jobs(id) WHERE status IN ('queued','running')")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queued_key ON jobs(capture_key, id) WHERE status='queued'")
+
+        # شمارندهٔ کارهای ناتمام؛ با trigger به‌روز می‌ماند → depth بدون COUNT(*)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS queue_stats (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                pending INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+        cur.executescript("""
+            CREATE TRIGGER IF NOT EXISTS trg_jobs_pending_ins AFTER INSERT ON jobs
+            WHEN NEW.status IN ('queued','running')
+            BEGIN UPDATE queue_stats SET pending = pending + 1 WHERE id = 1; END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_jobs_pending_upd AFTER UPDATE OF status ON jobs
+            WHEN (OLD.status IN ('queued','running')) != (NEW.status IN ('queued','running'))
+            BEGIN
+                UPDATE queue_stats
+                SET pending = pending + CASE WHEN NEW.status IN ('queued','running') THEN 1 ELSE -1 END
+                WHERE id = 1;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_jobs_pending_del AFTER DELETE ON jobs
+            WHEN OLD.status IN ('queued','running')
+            BEGIN UPDATE queue_stats SET pending = pending - 1 WHERE id = 1; END;
+        """)
+        # یک‌بار موقع بوت از روی ایندکس partial بازشماری می‌شود (برای دیتابیس‌های قدیمی)
+        cur.execute("""
+            INSERT INTO queue_stats(id, pending)
+            VALUES (1, (SELECT COUNT(*) FROM jobs WHERE status IN ('queued','running')))
+            ON CONFLICT(id) DO UPDATE SET pending = excluded.pending
+        """)
+
+        con.commit()
+        con.close()
+
+    # ---------- users ----------
+    def upsert_user(self, u: Dict, channel_member: bool):
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute("""
+          INSERT INTO users(user_id, username, first_name, last_name, language_code, is_premium, joined_at, channel_member_at)
+          VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+          ON CONFLICT(user_id) DO UPDATE SET
+            username=excluded.username,
+            first_name=excluded.first_name,
+            last_name=excluded.last_name,
+            language_code=excluded.language_code,
+            is_premium=excluded.is_premium,
+            channel_member_at=CASE WHEN excluded.channel_member_at IS NOT NULL THEN excluded.channel_member_at ELSE channel_member_at END
+        """, (
+            u["id"], u.get("username"), u.get("first_name"), u.get("last_name"),
+            u.get("language_code"), int(u.get("is_premium") or 0),
+            int(time.time()),
+            int(time.time()) if channel_member else None
+        ))
+        con.commit()
+
+    # ---------- queue ----------
+    def enqueue(self, user_id: int, url: str, params_json: Optional[str] = None,
+                capture_key: Optional[str] = None, trace_id: Optional[str] = None) -> EnqueueResult:
+        con = self._conn()
+        cur = con.cursor()
+        try:
+            cur.execute("BEGIN IMMEDIATE")
+            cur.execute(
+                "INSERT INTO jobs (user_id, url, status, created_at, params_json, capture_key, trace_id) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (user_id, url, int(time.time()), params_json, capture_key, trace_id)
+            )
+            job_id = cur.lastrowid
+            cur.execute("SELECT pending FROM queue_stats WHERE id = 1")
+            (depth,) = cur.fetchone()
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+        # job تازه بزرگ‌ترین id را دارد → آخر صف است، پس جایگاهش همان depth است
+        return EnqueueResult(job_id, int(depth), int(depth))
+
+    def queue_depth(self) -> int:
+        cur = self._conn().cursor()
+        cur.execute("SELECT pending FROM queue_stats WHERE id = 1")
+        row = cur.fetchone()
+        return int(row[0]) if row else 0
+
+    def oldest_queued_at(self) -> Optional[int]:
+        cur = self._conn().cursor()
+        # idx_jobs_status_created → یک seek، نه اسکن
+        cur.execute("SELECT MIN(created_at) FROM jobs WHERE status='queued'")
+        row = cur.fetchone()
+        return int(row[0]) if row and row[0] is not None else None
+
+    def queue_position(self, job_id: int) -> int:
+        cur = self._conn().cursor()
+        cur.execute("SELECT status FROM jobs WHERE id=?", (job_id,))
+        row = cur.fetchone()
+        if not row or row[0] not in ("queued", "running"):
+            return 0
+
+        # idها به ترتیب ثبت هستند؛ شمارش فقط روی ایندکس partial کارهای ناتمام انجام می‌شود
+        cur.execute("""
+            SELECT COUNT(*) FROM jobs
+            WHERE status IN ('queued','running') AND id <= ?
+        """, (job_id,))
+        (pos,) = cur.fetchone()
+        return int(pos)
+
+    def claim(self, worker_id: str, limit: int, lease_sec: int, max_followers: int = 0) -> List[dict]:
+        con = self._conn()
+        cur = con.cursor()
+        now = int(time.time())
+        try:
+            # BEGIN IMMEDIATE → قفل نوشتن از همان ابتدا، تا دو Worker یک job را برندارند
+            cur.execute("BEGIN IMMEDIATE")
+            cur.execute("""
+                SELECT * FROM jobs
+                WHERE status='queued' AND COALESCE(available_at, 0) <= ?
+                ORDER BY created_at ASC, id ASC
+                LIMIT ?
+            """, (now, max(1, int(limit))))
+            rows = cur.fetchall()
+            if not rows:
+                con.commit()
+                return []
+
+            # coalescing: jobهای صف‌شده با همان capture_key به job اول همان کلید می‌چسبند
+            leaders, by_key, claimed_ids = group_followers([dict(row) for row in rows], max_followers)
+            if max_followers > 0 and by_key:
+                for key, lead in by_key.items():
+                    room = max_followers - len(lead["followers"])
+                    if room <= 0:
+                        continue
+                    cur.execute(
+                        f"""
+                        SELECT * FROM jobs
+                        WHERE status='queued' AND capture_key=? AND COALESCE(available_at, 0) <= ?
+                          AND id NOT IN ({",".join("?" * len(claimed_ids))})
+                        ORDER BY id ASC
+                        LIMIT ?
+                        """,
+                        (key, now, *claimed_ids, room)
+                    )
+                    for row in cur.fetchall():
+                        lead["followers"].append(dict(row))
+                        claimed_ids.append(row["id"])
+
+            cur.execute(
+                f"""
+                UPDATE jobs SET status='running', started_at=?, worker_id=?, lease_expires_at=?
+                WHERE status='queued' AND id IN ({",".join("?" * len(claimed_ids))})
+                """,
+                (now, worker_id, now + int(lease_sec), *claimed_ids)
+            )
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+        for job in leaders:
+            for j in [job, *job["followers"]]:
+                j.update(status="running", started_at=now, worker_id=worker_id, lease_expires_at=now + int(lease_sec))
+        return leaders
+
+    def heartbeat(self, worker_id: str, job_ids: List[int], lease_sec: int) -> int:
+        if not job_ids:
+            return 0
+        con = self._conn()
+        cur = con.cursor()
+        cur.execute(
+            f"""
+            UPDATE jobs SET lease_expires_at=?
+            WHERE status='running' AND worker_id=? AND id IN ({",".join("?" * len(job_ids))})
+            """,
+            (int(time.time()) + int(lease_sec), worker_id, *job_ids)
+        )
+        con.commit()
+        return cur.rowcount
+
+    def defer(self, worker_id: str, job_ids: List[int], delay_sec: int) -> int:
+        if not job_ids:
+            return 0
+        con = self._conn()
+        cur = con.cursor()
+        # برگشت به صف بدون مصرف attempts؛ تا available_at برداشته نمی‌شود
+        cur.execute(
+            f"""
+            UPDATE jobs SET status='queued', worker_id=NULL, lease_expires_at=NULL, started_at=NULL, available_at=?
+            WHERE status='running' AND worker_id=? AND id IN ({",".join("?" * len(job_ids))})
+            """,
+            (int(time.time()) + int(delay_sec), worker_id, *job_ids)
+        )
+        con.commit()
+        return cur.rowcount
+
+    def requeue_expired(self, max_attempts: int) -> Tuple[int, int]:
+        con = self._conn()
+        cur = con.cursor()
+        now = int(time.time())
+        try:
+            cur.execute("BEGIN IMMEDIATE")
+            # lease تمام‌شده (یا jobهای running قدیمیِ بدون lease بعد از crash) → برگشت به صف
+            cur.execute("""
+                UPDATE jobs
+                SET status='queued', worker_id=NULL, lease_expires_at=NULL, started_at=NULL,
+                    attempts=attempts + 1
+                WHERE status='running' AND COALESCE(lease_expires_at, 0) < ? AND attempts + 1 < ?
+            """, (now, int(max_attempts)))
+            requeued = cur.rowcount
+            # بیش از حد مجاز تلاش شده → failed
+            cur.execute("""
+                UPDATE jobs
+                SET status='failed', finished_at=?, worker_id=NULL, lease_expires_at=NULL,
+                    attempts=attempts + 1, error='lease expired too many times'
+                WHERE status='running' AND COALESCE(lease_expires_at, 0) < ?
+            """, (now, now))
+            failed = cur.rowcount
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+        return requeued, failed
+
+    def complete(self, job_id: int, ok: bool, error: Optional[str] = None, worker_id: Optional[str] = None,
+                 metrics_json: Optional[str] = None) -> bool:
+        con = self._conn()
+        cur = con.cursor()
+        # فقط job در حال اجرا بسته می‌شود (done/failed دوباره تغییر نمی‌کند)؛
+        # اگر worker_id داده شود فقط صاحب فعلی lease می‌تواند job را ببندد
+        owner_sql = " AND worker_id=?" if worker_id is not None else ""
+        owner_args = (worker_id,) if worker_id is not None else ()
+        if ok:
+            cur.execute(
+                "UPDATE jobs SET status='done', finished_at=?, lease_expires_at=NULL, metrics_json=? WHERE id=? AND status='running'" + owner_sql,
+                (int(time.time()), metrics_json, job_id, *owner_args)
+            )
+        else:
+            cur.execute(
+                "UPDATE jobs SET status='failed', finished_at=?, error=?, lease_expires_at=NULL, metrics_json=? WHERE id=? AND status='running'" + owner_sql,
+                (int(time.time()), error, metrics_json, job_id, *owner_args)
+            )
+        con.commit()
+        return cur.rowcount > 0
@@ -0,0 +1,94 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit, urlunsplit
+from app.config import settings
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    """
+    Canonical form for cache keys: lower-case scheme/host, no default port,
+    no fragment, empty path → "/". Query string is kept as-is.
+    """
+    try:
+        p = urlsplit((url or "").strip())
+        scheme = p.scheme.lower()
+        host = (p.hostname or "").lower()
+        if p.port and p.port != DEFAULT_PORTS.get(scheme):
+            host = f"{host}:{p.port}"
+        return urlunsplit((scheme, host, p.path or "/", p.query, ""))
+    except Exception:
+        return (url or "").strip()
+
+
+def capture_key(url: str, opts: Dict[str, Any]) -> str:
+    """Key = normalized URL + every option that changes the rendered output."""
+    return "|".join([
+        normalize_url(url),
+        str(opts.get("device") or "mobile"),
+        "full" if opts.get("full_page") else "-",
+        "slice" if opts.get("force_slice") else "-",
+        "pdf" if opts.get("pdf") else "-",
+        str(opts.get("delay_ms") or 0),
+    ])
+
+
+class ResultCache:
+    """
+    In-memory TTL + LRU cache of delivered results.
+    Values are the Telegram file_ids of the sent documents, so a hit is
+    re-sent without any browser work or re-upload.
+    """
+
+    def __init__(self, ttl_sec: int = 600, max_entries: int = 1000):
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_sec > 0 and self.max_entries > 0
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        if not self.enabled:
+            return None
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.time():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: str, parts: List[Dict[str, Any]]):
+        """parts: [{"file_id": ..., "file_name": ..., "caption": ...}, ...]"""
+        if not self.enabled or not parts:
+            return
+        self._data[key] = (time.time() + self.ttl_sec, parts)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+            "entries": len(self._data),
+            "evictions": self.evictions,
+        }
+
+
+result_cache = ResultCache(
+    ttl_sec=int(getattr(settings, "RESULT_CACHE_TTL_SEC", 600)),
+    max_entries=int(getattr(settings, "RESULT_CACHE_MAX_ENTRIES", 1000)),
+)
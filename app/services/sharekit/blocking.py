@@ -0,0 +1,146 @@
+import glob
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Set
+from urllib.parse import urlsplit
+from app.services.sharekit.utils import _norm_bool
+
+LISTS_DIR = os.path.join(os.path.dirname(__file__), "blocklists")
+
+# resource types that can be recognised from the URL alone, so the match runs
+# inside the Playwright driver instead of a Python round trip per request
+TYPE_EXTENSIONS: Dict[str, List[str]] = {
+    "font": ["woff2?", "ttf", "otf", "eot"],
+    "media": ["mp4", "webm", "ogg", "ogv", "mp3", "m4a", "m4v", "wav", "flac", "m3u8"],
+    "image": ["png", "jpe?g", "gif", "webp", "avif", "bmp", "ico", "svg"],
+    "stylesheet": ["css"],
+    "script": ["m?js"],
+}
+
+
+def _glob_to_regex(pat: str) -> str:
+    return ".*".join(re.escape(part) for part in pat.split("*"))
+
+
+class BlockRules:
+    """
+    Precompiled request-blocking rules: domain suffixes, URL patterns and
+    resource types. `url_regex` is handed to context.route() so non-matching
+    requests never leave the driver; `exact_types` are types that cannot be
+    told from the URL and still need a per-request check.
+    """
+
+    def __init__(self, domains: Iterable[str] = (), patterns: Iterable[str] = (), resource_types: Iterable[str] = ()):
+        self.domains: Set[str] = {d.strip().lower().strip(".") for d in domains if d.strip()}
+        self.patterns: List[str] = [p for p in patterns if p]
+        self.resource_types: Set[str] = {t.strip() for t in resource_types if t.strip()}
+        self.exact_types: Set[str] = self.resource_types - set(TYPE_EXTENSIONS)
+
+        parts = []
+        if self.domains:
+            doms = "|".join(re.escape(d) for d in sorted(self.domains, key=len, reverse=True))
+            parts.append(r"^[a-z][a-z0-9+.\-]*://([^/?#@]*@)?([^/?#:]*\.)?(" + doms + r")(:\d+)?([/?#]|$)")
+        parts.extend(self.patterns)
+        exts = [e for t in sorted(self.resource_types) for e in TYPE_EXTENSIONS.get(t, [])]
+        if exts:
+            parts.append(r"\.(" + "|".join(exts) + r")([?#]|$)")
+        self.url_regex: Optional[re.Pattern] = re.compile("|".join(f"(?:{p})" for p in parts), re.I) if parts else None
+        self._pattern_re = re.compile("|".join(f"(?:{p})" for p in self.patterns), re.I) if self.patterns else None
+
+    @property
+    def empty(self) -> bool:
+        return self.url_regex is None and not self.exact_types
+
+    def _domain_hit(self, host: str) -> bool:
+        labels = host.lower().strip(".").split(".")
+        return any(".".join(labels[i:]) in self.domains for i in range(len(labels) - 1))
+
+    def match(self, url: str, resource_type: Optional[str] = None) -> Optional[str]:
+        """Reason ("type" | "domain" | "pattern") if the request should be blocked, else None."""
+        if resource_type and resource_type in self.resource_types:
+            return "type"
+        try:
+            host = urlsplit(url).hostname or ""
+        except ValueError:
+            host = ""
+        if host and self.domains and self._domain_hit(host):
+            return "domain"
+        if self._pattern_re is not None and self._pattern_re.search(url):
+            return "pattern"
+        if self.url_regex is not None and self.url_regex.search(url):
+            return "type"
+        return None
+
+    @classmethod
+    def from_files(cls, paths: Iterable[str], resource_types: Iterable[str] = ()) -> "BlockRules":
+        domains: List[str] = []
+        patterns: List[str] = []
+        for path in paths:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    lines = f.read().splitlines()
+            except OSError as e:
+                print(f"[blocking] cannot read {path}: {e!r}")
+                continue
+            for line in lines:
+                line = line.strip()
+                if not line or line.startswith(("#", "!")):
+                    continue
+                if line.startswith("||") and line.endswith("^"):
+                    domains.append(line[2:-1])
+                elif len(line) > 2 and line.startswith("/") and line.endswith("/"):
+                    patterns.append(line[1:-1])
+                elif "/" in line or "*" in line:
+                    patterns.append(_glob_to_regex(line))
+                else:
+                    domains.append(line)
+        return cls(domains, patterns, resource_types)
+
+    @classmethod
+    def from_settings(cls, settings) -> "BlockRules":
+        types = str(getattr(settings, "BLOCK_RESOURCE_TYPES", "media,font,websocket")).split(",")
+        paths: List[str] = []
+        if _norm_bool(getattr(settings, "BLOCK_ADS_AND_TRACKERS", True), True):
+            lists_dir = str(getattr(settings, "BLOCKLIST_DIR", "") or "") or LISTS_DIR
+            paths = sorted(glob.glob(os.path.join(lists_dir, "*.txt")))
+        return cls.from_files(paths, types)
+
+
+def new_block_stats() -> Dict[str, int]:
+    return {"blocked": 0, "blocked_domain": 0, "blocked_pattern": 0, "blocked_type": 0,
+            "requests": 0, "bytes_loaded": 0}
+
+
+async def install_blocking(context, rules: BlockRules, stats: Dict[str, int]):
+    """
+    Register the rules on a context. Nothing is intercepted when there are no
+    rules; URL-decidable rules are matched in the driver; only exact resource
+    types (e.g. "xhr") fall back to a catch-all route.
+    """
+    async def _abort(route, request):
+        if request.is_navigation_request():
+            # never block the page itself, only what it loads
+            await route.fallback()
+            return
+        reason = rules.match(request.url, request.resource_type) or "pattern"
+        stats["blocked"] += 1
+        stats[f"blocked_{reason}"] = stats.get(f"blocked_{reason}", 0) + 1
+        try:
+            await route.abort()
+        except Exception:
+            pass
+
+    if rules.url_regex is not None:
+        await context.route(rules.url_regex, _abort)
+
+    if rules.exact_types:
+        async def _by_type(route, request):
+            try:
+                if request.resource_type in rules.exact_types:
+                    await _abort(route, request)
+                    return
+            except Exception:
+                pass
+            await route.fallback()
+
+        await context.route("**/*", _by_type)
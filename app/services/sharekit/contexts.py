@@ -0,0 +1,196 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Set
+from app.services.sharekit.pool import BrowserPool, get_browser_pool
+from app.services.sharekit.blocking import BlockRules, install_blocking, new_block_stats
+from app.services.sharekit.readiness import NetworkTracker
+from app.services.sharekit.init_script import build_init_script
+
+# -------- device profiles --------
+DEVICE_PROFILES: Dict[str, Dict] = {
+    "desktop": {
+        "viewport": {"width": 1920, "height": 1080},   # wide for better readability
+        "device_scale_factor": 2,                      # 2x desktop → 3840 px wide effective
+        "is_mobile": False,
+        "has_touch": False,
+        "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36",
+    },
+    "mobile": {
+        "viewport": {"width": 430, "height": 844},     # real smartphone width
+        "device_scale_factor": 4,                      # ← DPI بالا برای موبایل (شارپ‌تر)
+        "is_mobile": True,
+        "has_touch": True,
+        "user_agent": "Mozilla/5.0 (iPhone; CPU iPhone OS 16_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.0 Mobile/15E148 Safari/604.1",
+    },
+}
+
+COMMON_CONTEXT_OPTS = {
+    "locale": "fa-IR",
+    "timezone_id": "Asia/Tehran",
+    "accept_downloads": True,
+}
+
+
+def profile_name(device: Optional[str]) -> str:
+    return "desktop" if (device or "mobile").lower() == "desktop" else "mobile"
+
+
+class PooledContext:
+    """A ready-to-use context: profile applied, init script + routes installed, blank page open."""
+
+    def __init__(self, device: str, pb, context, page, stats: Dict[str, int], net: NetworkTracker):
+        self.device = device
+        self.profile = DEVICE_PROFILES[device]
+        self.pb = pb
+        self.context = context
+        self.page = page
+        self.stats = stats      # blocked requests / bytes for the job using this context
+        self.net = net          # in-flight requests, for the readiness check
+
+
+class ContextPool:
+    """
+    Keeps CONTEXT_POOL_SIZE warm contexts per device profile.
+    A leased context is never reused: it is closed after the job and a fresh
+    one is prepared in the background, so no cookies/storage leak between jobs.
+    """
+
+    def __init__(self, settings, browsers: Optional[BrowserPool] = None):
+        self.s = settings
+        self.browsers = browsers or get_browser_pool(settings)
+        self.size = max(0, int(getattr(settings, "CONTEXT_POOL_SIZE", 2)))
+        self.rules = BlockRules.from_settings(settings)
+        self.init_script = build_init_script(settings)
+        self._ready: Dict[str, asyncio.Queue] = {d: asyncio.Queue() for d in DEVICE_PROFILES}
+        self._warming: Dict[str, int] = {d: 0 for d in DEVICE_PROFILES}
+        self._refills: Set[asyncio.Task] = set()
+        self._closed = False
+        # warm contexts on a browser being recycled would keep it alive until they are leased
+        self.browsers.on_recycle(self._evict_draining)
+
+    async def start(self):
+        await self.browsers.start()
+        self._closed = False
+        await asyncio.gather(*(self._refill(d) for d in DEVICE_PROFILES))
+        print(f"[context-pool] {self.size} warm context(s) per profile ready.")
+
+    async def _prepare(self, device: str) -> PooledContext:
+        profile = DEVICE_PROFILES[device]
+        pb, context = await self.browsers.open_context(**profile, **COMMON_CONTEXT_OPTS)
+        stats = new_block_stats()
+        net = NetworkTracker(int(getattr(self.s, "READINESS_STUCK_REQUEST_MS", 5000)))
+        try:
+            net.attach(context)
+            # eager loading, overlay CSS, window.open/dialog handling — before any page script runs
+            await context.add_init_script(script=self.init_script)
+            await install_blocking(context, self.rules, stats)
+
+            def _on_response(response):
+                stats["requests"] += 1
+                try:
+                    stats["bytes_loaded"] += int(response.headers.get("content-length") or 0)
+                except Exception:
+                    pass
+
+            context.on("response", _on_response)
+            page = await context.new_page()
+        except Exception:
+            await self.browsers.release(pb, context)
+            raise
+        return PooledContext(device, pb, context, page, stats, net)
+
+    async def _refill(self, device: str):
+        q = self._ready[device]
+        while not self._closed and q.qsize() + self._warming[device] < self.size:
+            self._warming[device] += 1
+            try:
+                pc = await self._prepare(device)
+            except Exception as e:
+                print(f"[context-pool] warmup failed for {device}: {e!r}")
+                return
+            finally:
+                self._warming[device] -= 1
+            if self._closed:
+                await self.browsers.release(pc.pb, pc.context)
+                return
+            q.put_nowait(pc)
+
+    def _schedule_refill(self, device: str):
+        if self._closed or self.size == 0:
+            return
+        self._schedule(self._refill(device))
+
+    async def _take(self, device: str) -> PooledContext:
+        q = self._ready[device]
+        while not q.empty():
+            pc = q.get_nowait()
+            if pc.pb.usable:
+                return pc
+            # its browser died/is being recycled → drop it
+            await self.browsers.release(pc.pb, pc.context)
+        return await self._prepare(device)
+
+    def _evict_draining(self):
+        """Close warm contexts on draining browsers and warm up replacements on the new one."""
+        stale = []
+        for device, q in self._ready.items():
+            keep = []
+            while not q.empty():
+                pc = q.get_nowait()
+                (keep if pc.pb.usable else stale).append(pc)
+            for pc in keep:
+                q.put_nowait(pc)
+        if not stale:
+            return
+
+        async def drop():
+            for pc in stale:
+                await self.browsers.release(pc.pb, pc.context)
+            for device in {pc.device for pc in stale}:
+                await self._refill(device)
+
+        self._schedule(drop())
+
+    def _schedule(self, coro):
+        task = asyncio.create_task(coro)
+        self._refills.add(task)
+        task.add_done_callback(self._refills.discard)
+
+    @asynccontextmanager
+    async def lease(self, device: str):
+        if self._closed:
+            raise RuntimeError("context pool is closed")
+        device = profile_name(device)
+        pc = await self._take(device)
+        self._schedule_refill(device)
+        try:
+            yield pc
+        finally:
+            await self.browsers.release(pc.pb, pc.context)
+
+    async def close(self):
+        self._closed = True
+        for task in list(self._refills):
+            task.cancel()
+        for q in self._ready.values():
+            while not q.empty():
+                pc = q.get_nowait()
+                await self.browsers.release(pc.pb, pc.context)
+
+
+_contexts: Optional[ContextPool] = None
+
+
+def get_context_pool(settings) -> ContextPool:
+    """The shared context pool for this process (created lazily)."""
+    global _contexts
+    if _contexts is None:
+        _contexts = ContextPool(settings)
+    return _contexts
+
+
+async def shutdown_context_pool():
+    global _contexts
+    if _contexts is not None:
+        await _contexts.close()
+        _contexts = None
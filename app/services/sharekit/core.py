@@ -1,107 +1,126 @@
 import asyncio
 import re
-from typing import List, Dict, Any, Optional
-from playwright.async_api import async_playwright
-
-def _norm_bool(v, default=False):
-    if v is None: 
-        return default
-    if isinstance(v, bool): 
-        return v
-    if isinstance(v, str): 
-        return v.strip().lower() in {"1","true","yes","y","on"}
-    return bool(v)
+import time
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from typing import AsyncIterator, List, Dict, Any, Optional
+from app.services.sharekit.contexts import ContextPool, get_context_pool
+from app.services.sharekit.imaging import FORMATS, crop_slices, normalize_format, run_in_image_pool, transcode
+from app.services.sharekit.utils import _norm_bool
+from app.services.sharekit.readiness import wait_until_ready
+from app.services.sharekit.planner import MAX_TILE_DEVICE_PX, plan_render
+from app.services.sharekit.spool import spool_item
+from app.services.sharekit.deadline import Deadline, DeadlineExceeded
+from app.services.sharekit.spans import Trace
+
+# share of OVERALL_TIMEOUT_MS held back from navigation/readiness so rendering always gets a turn
+RENDER_RESERVE = 0.3
+
+
+def plan_slice_tiles(total_h: int, vh: int, overlap: int, max_parts: int, tile_h: int, lead_alone: bool = False):
+    """
+    Same slices the old scroll+screenshot loop produced (window vh = planned slice
+    height, step vh-overlap, last window clamped to the page bottom like
+    window.scrollTo does), grouped
+    into as few clipped tiles of at most tile_h CSS px as possible.
+    With lead_alone the first slice gets a tile of its own so it can be delivered
+    before the rest of the page is rendered.
+    Returns [(tile_top, tile_height, [(top, bottom), ...relative to tile]), ...].
+    """
+    step = max(1, vh - overlap)
+    slices = []
+    y = 0
+    while y < total_h and len(slices) < max_parts:
+        top = min(y, max(0, total_h - vh))
+        slices.append((top, top + min(vh, total_h)))
+        y += step
+
+    tiles = []
+    for top, bottom in slices:
+        if tiles and not (lead_alone and len(tiles) == 1) and bottom - tiles[-1][0] <= max(tile_h, vh):
+            tiles[-1][1] = bottom - tiles[-1][0]
+            tiles[-1][2].append((top, bottom))
+        else:
+            tiles.append([top, bottom - top, [(top, bottom)]])
+    return [(t, h, [(a - t, b - t) for a, b in parts]) for t, h, parts in tiles]
+
 
 class ShareKit:
-    def __init__(self, settings):
+    def __init__(self, settings, contexts: Optional[ContextPool] = None):
         self.s = settings
+        # shared, process-wide warm contexts (on top of the shared browsers)
+        self.contexts = contexts or get_context_pool(settings)
 
-    async def _inject_hide_css(self, page):
+    async def _needs_pre_scroll(self, page) -> bool:
         """
-        Hide only common cookie/consent/ad overlays.
-        Do NOT hide every fixed element by default, to avoid blank pages.
+        The init script already makes lazy images eager and fires IntersectionObserver
+        callbacks; only pages that lazy-load from scroll listeners still need scrolling.
         """
+        mode = str(getattr(self.s, "PRE_SCROLL_MODE", "auto")).lower()
+        if mode in ("always", "never"):
+            return mode == "always"
+        if not _norm_bool(getattr(self.s, "FORCE_EAGER_LOADING", True), True):
+            # nothing forced lazy content to load, so scroll as before
+            return True
         try:
-            base_css = """
-            /* keep scrolling snappy */
-            html, body { scroll-behavior: auto !important; }
-
-            /* cookie / consent banners */
-            [id*="cookie" i], [class*="cookie" i],
-            [id*="consent" i], [class*="consent" i],
-            #consent, .fc-consent-root, .qc-cmp2-container, .osano-cm-dialog,
-            .sp_choice_type_11, .cc-window, .cc-banner,
-
-            /* lightweight ad labels */
-            .ad-banner, .ads-banner, .advert, .advertisement, .ad-container
-            {
-                opacity: .0001 !important;
-                pointer-events: none !important;
-            }
-            """
-            await page.add_style_tag(content=base_css)
+            return bool(await page.evaluate("() => (window.__u2sScrollListeners || 0) > 0"))
         except:
-            pass
+            return True
 
-        # Optional: hide ALL fixed overlays only if explicitly enabled
+    async def _pre_scroll(self, page, step: int = 1200, max_px: int = 60000):
+        # Trigger lazy-load: scroll the whole page inside the browser, one frame
+        # per step, in a single round trip (no Python-side sleeps)
         try:
-            hide_fixed = _norm_bool(getattr(self.s, "HIDE_FIXED_OVERLAYS", False), False)
-            if hide_fixed:
-                await page.add_style_tag(content="""
-                *[style*="position:fixed" i] {
-                    opacity: .0001 !important;
-                    pointer-events: none !important;
-                }
-                """)
-        except:
+            await page.evaluate(
+                """async ([step, maxPx]) => {
+                    const frame = () => new Promise(r => {
+                        requestAnimationFrame(() => r()); setTimeout(r, 50);
+                    });
+                    const total = Math.min(document.documentElement.scrollHeight, maxPx);
+                    for (let y = 0; y < total; y += step) { window.scrollTo(0, y); await frame(); }
+                    window.scrollTo(0, 0);
+                    await frame();
+                }""",
+                [step, max_px],
+            )
+        except Exception:
+            # never swallow CancelledError: Deadline.run cancels this on timeout
             pass
 
-
-    async def _pre_scroll(self, page):
-        # Trigger lazy-load
+    async def _apply_scale(self, pc, dsf: float):
+        """Re-rasterize the leased page at a different device scale factor (layout is unchanged)."""
+        if dsf == pc.profile["device_scale_factor"]:
+            return
+        viewport = pc.profile["viewport"]
+        cdp = await pc.context.new_cdp_session(pc.page)
         try:
-            total = await page.evaluate("() => document.documentElement.scrollHeight")
-            step = 1200
-            y = 0
-            while y < total:
-                await page.evaluate(f"window.scrollTo(0, {y});")
-                await asyncio.sleep(0.05)
-                y += step
-            await asyncio.sleep(0.1)
-            await page.evaluate("window.scrollTo(0, 0);")
-            await asyncio.sleep(0.05)
-        except:
-            pass
-
-    async def launch_browser(self, viewport, dsf, is_mobile, has_touch, ua, headless=True):
-        # Start Playwright without a context manager so it stays alive
-        pw = await async_playwright().start()
-
-        chromium_args = [
-            "--no-sandbox",
-            "--disable-setuid-sandbox",
-            "--disable-dev-shm-usage",
-            "--disable-gpu",
-        ]
+            await cdp.send("Emulation.setDeviceMetricsOverride", {
+                "width": viewport["width"], "height": viewport["height"],
+                "deviceScaleFactor": dsf, "mobile": pc.profile["is_mobile"],
+            })
+        finally:
+            await cdp.detach()
 
+    async def _goto(self, pc, url: str, deadline: Deadline, nav_timeout: int, reserve: int):
+        """
+        Navigate within the job's budget. A page that timed out but already has
+        a body is kept (stats["nav_timeout"]) so the user still gets what loaded.
+        """
+        budget = deadline.budget(nav_timeout, reserve)
+        if budget <= 0:
+            raise DeadlineExceeded("navigation")
         try:
-            browser = await pw.chromium.launch(headless=headless, args=chromium_args)
-            context = await browser.new_context(
-                viewport=viewport,
-                device_scale_factor=dsf,
-                is_mobile=is_mobile,
-                has_touch=has_touch,
-                user_agent=ua,
-                locale="fa-IR",
-                timezone_id="Asia/Tehran",
-                accept_downloads=True,
-            )
-            return pw, browser, context
-        except Exception:
-            # If launch fails, make sure we don’t leak the Playwright driver
-            await pw.stop()
-            raise
-        
+            await pc.page.goto(url, wait_until="domcontentloaded", timeout=budget)
+        except PlaywrightTimeoutError:
+            try:
+                has_body = await deadline.run(
+                    pc.page.evaluate("() => !!(document.body && document.body.childElementCount)"), "navigation"
+                )
+            except Exception:
+                has_body = False
+            if not has_body:
+                raise DeadlineExceeded("navigation") from None
+            pc.stats["nav_timeout"] = True
+
     async def capture(
         self, 
         url: str, 
@@ -110,101 +129,216 @@ class ShareKit:
         full_page: Optional[bool] = None,
         force_slice: bool = False,
         pdf: bool = False,
-        delay_ms: Optional[int] = None
+        delay_ms: Optional[int] = None,
+        stats: Optional[Dict[str, Any]] = None,
+        timeout_ms: Optional[int] = None,
+        trace: Optional[Trace] = None,
     ) -> List[Dict[str, Any]]:
         """
         Returns a list like:
-        [ { "data": bytes, "file_name": "screenshot_01.png", "mime": "image/png" }, ... ]
-        or a single PDF item if pdf=True.
+        [ { "data": bytes, "file_name": "screenshot_01.png", "mime": "image/png", "part": 1, "total": 3 }, ... ]
+        or a single PDF item if pdf=True. Items over SPOOL_THRESHOLD_BYTES carry "path"
+        (a temp file, see spool.discard_item) instead of "data".
+        If `stats` is given it is filled with per-job counters (blocked requests, bytes loaded, ...).
+        timeout_ms (default OVERALL_TIMEOUT_MS, 0 = none) bounds the whole capture; see capture_iter.
         """
-        headless = _norm_bool(getattr(self.s, "HEADLESS", True), True)
-        nav_timeout = int(getattr(self.s, "NAVIGATION_TIMEOUT_MS", 60000))
-        block_types = set(str(getattr(self.s, "BLOCK_RESOURCE_TYPES", "media,font,websocket")).split(","))
-        hide_overlays = _norm_bool(getattr(self.s, "HIDE_COMMON_OVERLAYS", True), True)
-
-        # -------- device profiles --------
-        if (device or "mobile").lower() == "desktop":
-            viewport = {"width": 1920, "height": 1080}   # wide for better readability
-            dsf = 2                                      # 2x desktop → 3840 px wide effective
-            is_mobile = False; has_touch = False
-            ua = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36"
-        else:
-            viewport = {"width": 430, "height": 844}     # real smartphone width
-            dsf = 4                                      # ← DPI بالا برای موبایل (شارپ‌تر)
-            is_mobile = True; has_touch = True
-            ua = "Mozilla/5.0 (iPhone; CPU iPhone OS 16_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.0 Mobile/15E148 Safari/604.1"
+        return [item async for item in self.capture_iter(
+            url, device=device, full_page=full_page, force_slice=force_slice, pdf=pdf, delay_ms=delay_ms,
+            stats=stats, timeout_ms=timeout_ms, trace=trace,
+        )]
 
-        FULLPAGE_MAX = int(getattr(self.s, "FULLPAGE_MAX_HEIGHT_PX", 9000))
-        OVERLAP = int(getattr(self.s, "SLICE_OVERLAP_PX", 80))
-        MAX_PARTS = int(getattr(self.s, "MAX_SCREENS_PER_JOB", 10))
+    async def capture_iter(
+        self,
+        url: str,
+        *,
+        device: str = "mobile",
+        full_page: Optional[bool] = None,
+        force_slice: bool = False,
+        pdf: bool = False,
+        delay_ms: Optional[int] = None,
+        stats: Optional[Dict[str, Any]] = None,
+        timeout_ms: Optional[int] = None,
+        trace: Optional[Trace] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Same items as capture(), yielded one by one as soon as each is encoded,
+        so the caller can deliver part 1 while the rest of the page renders.
 
-        async with async_playwright() as pw:
-            pw, browser, context = await self.launch_browser(viewport, dsf, is_mobile, has_touch, ua, headless)
+        The capture runs against one deadline split across its stages. When it
+        runs out, slices not rendered yet are dropped (stats["partial"]) if at
+        least one part went out, otherwise DeadlineExceeded is raised.
 
-            # Block heavy resource types
-            async def _router(route, request):
-                try:
-                    if request.resource_type in block_types:
-                        await route.abort()
-                        return
-                except:
-                    pass
-                await route.continue_()
+        Every stage is timed as a span on `trace` (a private one if not given);
+        the summed durations end up in stats["stages_ms"].
+        """
+        if timeout_ms is None:
+            timeout_ms = int(getattr(self.s, "OVERALL_TIMEOUT_MS", 40000))
+        deadline = Deadline(timeout_ms)
+        trace = trace or Trace()
+        t0 = time.monotonic()
+        # context comes from the pool with viewport/UA/locale and blocking routes in place
+        async with self.contexts.lease(device) as pc:
+            trace.add("lease", (time.monotonic() - t0) * 1000, browser=pc.pb.id)
+            try:
+                async for item in self._iter_on(
+                    pc, url, deadline, trace, full_page=full_page, force_slice=force_slice, pdf=pdf, delay_ms=delay_ms
+                ):
+                    # big artifacts go to disk before they are handed out
+                    with trace.span("spool", part=item.get("part")):
+                        item = await spool_item(item, self.s)
+                    # the consumer's upload time is not charged to the capture
+                    with deadline.paused():
+                        yield item
+            except DeadlineExceeded as e:
+                pc.stats["deadline_stage"] = e.stage
+                raise
+            finally:
+                pc.stats["elapsed_ms"] = deadline.elapsed_ms()
+                pc.stats["stages_ms"] = trace.stage_ms()
+                if stats is not None:
+                    stats.update(pc.stats)
 
-            await context.route("**/*", _router)
+    async def _iter_on(self, pc, url, deadline: Deadline, trace: Trace, *,
+                       full_page, force_slice, pdf, delay_ms) -> AsyncIterator[Dict[str, Any]]:
+        nav_timeout = int(getattr(self.s, "NAVIGATION_TIMEOUT_MS", 60000))
+        OVERLAP = int(getattr(self.s, "SLICE_OVERLAP_PX", 80))
+        TILE_H = int(getattr(self.s, "SLICE_WINDOW_HEIGHT_PX", 5000))
+        IMAGE_WORKERS = int(getattr(self.s, "IMAGE_POOL_WORKERS", 2))
+        DEFAULT_DELAY = int(getattr(self.s, "DEFAULT_DELAY_MS", 4000))
+        FMT = normalize_format(str(getattr(self.s, "DEFAULT_IMAGE_FORMAT", "png")))
+        QUALITY = int(getattr(self.s, "JPEG_QUALITY", 80))
+        MAX_BYTES = int(getattr(self.s, "MAX_IMAGE_BYTES", 0))
+        RESIZE = _norm_bool(getattr(self.s, "RESIZE_IF_TOO_LARGE", True), True)
+        ext, mime = FORMATS[FMT]
+        encode_opts = {"fmt": FMT, "quality": QUALITY, "max_bytes": MAX_BYTES, "allow_resize": RESIZE}
+        QUIET_MS = int(getattr(self.s, "READINESS_QUIET_MS", 500))
 
-            page = await context.new_page()
-            await page.goto(url, wait_until="domcontentloaded", timeout=nav_timeout)
-            try:
-                await page.wait_for_load_state("networkidle", timeout=3000)
-            except:
-                pass
+        page = pc.page
+        viewport = pc.profile["viewport"]
+        reserve = int(deadline.total_ms * RENDER_RESERVE)
 
-            if hide_overlays:
-                await self._inject_hide_css(page)
+        # navigation, pre-scroll and readiness only get what is left after the render reserve
+        with trace.span("goto"):
+            await self._goto(pc, url, deadline, nav_timeout, reserve)
 
-            await self._pre_scroll(page)
+        with trace.span("pre_scroll") as sp:
+            sp["scrolled"] = await self._needs_pre_scroll(page)
+            if sp["scrolled"]:
+                try:
+                    await deadline.run(self._pre_scroll(page), "pre_scroll", reserve_ms=reserve)
+                    pc.stats["pre_scrolled"] = True
+                except DeadlineExceeded:
+                    # lazy content below the fold may be missing; still worth rendering
+                    pc.stats["pre_scroll_cut"] = True
 
-            if delay_ms and int(delay_ms) > 0:
-                await asyncio.sleep(int(delay_ms) / 1000)
+        # wait until the page is actually stable; delay_ms is only the upper bound
+        max_wait = int(delay_ms) if delay_ms and int(delay_ms) > 0 else DEFAULT_DELAY
+        with trace.span("readiness", max_ms=max_wait) as sp:
+            ready = await wait_until_ready(page, pc.net, deadline.budget(max_wait, reserve), quiet_ms=QUIET_MS)
+            sp["timed_out"] = ready["ready_timeout"]
+        pc.stats.update(ready)
 
-            # PDF path (when explicitly requested)
-            if pdf:
-                pdf_bytes = await page.pdf(
+        # PDF path (when explicitly requested)
+        if pdf:
+            with trace.span("pdf"):
+                pdf_bytes = await deadline.run(page.pdf(
                     format="A4", print_background=True, 
                     margin={"top":"0","right":"0","bottom":"0","left":"0"}
-                )
-                await context.close(); await browser.close(); await pw.stop()
-                return [{"data": pdf_bytes, "file_name": "page.pdf", "mime": "application/pdf"}]
-
-            # measure total height
-            total_h = await page.evaluate("() => document.documentElement.scrollHeight")
-            want_full = bool(full_page)
-            if force_slice:
-                want_full = False
-            elif full_page is None:
-                # default behavior: try full if short, else slice
-                want_full = total_h <= FULLPAGE_MAX
-
-            results: List[Dict[str, Any]] = []
-
-            if want_full:
-                png = await page.screenshot(full_page=True, type="png")   # ← اجبار PNG
-                results.append({"data": png, "file_name": "screenshot.png", "mime": "image/png"})
-            else:
-                # viewport slicing (crisp, no scaling)
-                vh = viewport["height"]
-                y = 0
-                i = 1
-                while y < total_h and i <= MAX_PARTS:
-                    await page.evaluate(f"window.scrollTo(0, {max(0, y)});")
-                    await asyncio.sleep(0.12)
-                    png = await page.screenshot(type="png")              # ← اجبار PNG
-                    results.append({"data": png, "file_name": f"screenshot_{i:02d}.png", "mime": "image/png"})
-                    y += (vh - OVERLAP)
-                    i += 1
-
-            await context.close()
-            await browser.close()
-            await pw.stop()
-            return results
+                ), "pdf")
+            yield {"data": pdf_bytes, "file_name": "page.pdf", "mime": "application/pdf", "part": 1, "total": 1}
+            return
+
+        # measure total height, then plan scale factor / mode / slices to fit the budgets
+        with trace.span("plan") as sp:
+            total_h = await deadline.run(page.evaluate("() => document.documentElement.scrollHeight"), "measure")
+            plan = plan_render(
+                total_h, viewport, pc.profile["device_scale_factor"], self.s,
+                full_page=full_page, force_slice=force_slice, fmt=FMT,
+            )
+            sp.update(height=total_h, parts=plan.parts, dsf=plan.dsf)
+        pc.stats.update(plan.as_metrics())
+        if plan.dsf != pc.profile["device_scale_factor"]:
+            with trace.span("rescale", dsf=plan.dsf):
+                await deadline.run(self._apply_scale(pc, plan.dsf), "render")
+                # srcset images may swap to another resolution; short settle, not a full wait
+                await wait_until_ready(page, pc.net, deadline.budget(min(max_wait, 1000), reserve // 2),
+                                       quiet_ms=min(QUIET_MS, 200))
+
+        if plan.full_page:
+            # JPEG is encoded by the browser; WebP and over-budget images are re-encoded in the image pool
+            deadline.check("render")
+            try:
+                with trace.span("screenshot", full_page=True):
+                    if FMT == "jpeg":
+                        data = await page.screenshot(full_page=True, type="jpeg", quality=QUALITY,
+                                                     timeout=max(1, deadline.budget()))
+                    else:
+                        data = await page.screenshot(full_page=True, type="png", timeout=max(1, deadline.budget()))
+            except PlaywrightTimeoutError:
+                raise DeadlineExceeded("render") from None
+            if FMT == "webp" or (MAX_BYTES and len(data) > MAX_BYTES):
+                with trace.span("encode"):
+                    data = await deadline.run(
+                        run_in_image_pool(transcode, data, workers=IMAGE_WORKERS, **encode_opts), "encode"
+                    )
+            yield {"data": data, "file_name": f"screenshot.{ext}", "mime": mime, "part": 1, "total": 1}
+        else:
+            # planned slices, rendered once per large tile and cut in the image pool
+            tile_h = max(plan.slice_h, min(TILE_H, int(MAX_TILE_DEVICE_PX // plan.dsf)))
+            tiles = plan_slice_tiles(total_h, plan.slice_h, OVERLAP, plan.parts, tile_h, lead_alone=True)
+            total = sum(len(boxes) for _, _, boxes in tiles)
+            names = iter(range(1, total + 1))
+
+            def _item(data: bytes) -> Dict[str, Any]:
+                i = next(names)
+                return {"data": data, "file_name": f"screenshot_{i:02d}.{ext}", "mime": mime, "part": i, "total": total}
+
+            pending = None
+            try:
+                for n, (tile_top, tile_height, boxes) in enumerate(tiles):
+                    if n:
+                        # part 1 is already out: when time is up, deliver what is rendered instead of failing
+                        if deadline.expired:
+                            pc.stats["partial"] = True
+                            break
+                    else:
+                        deadline.check("render")
+                    try:
+                        with trace.span("screenshot", tile=n + 1):
+                            png = await page.screenshot(
+                                type="png", full_page=True,
+                                clip={"x": 0, "y": tile_top, "width": viewport["width"], "height": tile_height},
+                                timeout=max(1, deadline.budget()),
+                            )
+                    except PlaywrightTimeoutError:
+                        if not n:
+                            raise DeadlineExceeded("render") from None
+                        pc.stats["partial"] = True
+                        break
+                    crop = asyncio.ensure_future(run_in_image_pool(
+                        crop_slices, png, boxes, css_width=viewport["width"], workers=IMAGE_WORKERS, **encode_opts
+                    ))
+                    del png
+                    if pending is not None:
+                        # previous tile was cropped while this one rendered
+                        with trace.span("encode", tile=n):
+                            parts = await pending
+                        for part in parts:
+                            yield _item(part)
+                    pending = crop
+                    if n == 0:
+                        # first tile is a single slice: hand it out right away
+                        pending = None
+                        with trace.span("encode", tile=1):
+                            parts = await crop
+                        for part in parts:
+                            yield _item(part)
+                if pending is not None:
+                    with trace.span("encode", tile=len(tiles)):
+                        parts = await pending
+                    for part in parts:
+                        yield _item(part)
+            finally:
+                # consumer stopped early / capture failed: drop the crop still in flight
+                if pending is not None and not pending.done():
+                    pending.cancel()
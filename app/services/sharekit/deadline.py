@@ -0,0 +1,78 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(Exception):
+    """The job's time budget ran out during `stage` before anything could be delivered."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"deadline exceeded during {stage}")
+        self.stage = stage
+
+
+class Deadline:
+    """
+    Wall-clock budget of one capture (OVERALL_TIMEOUT_MS), shared by its stages.
+    Each stage asks for budget(cap, reserve): at most its own cap, and never the
+    time reserved for the stages after it. Time spent paused (capture_iter
+    waiting for its consumer to upload a part) is not counted.
+    total_ms <= 0 means no deadline.
+    """
+
+    def __init__(self, total_ms: int):
+        self.total_ms = int(total_ms or 0)
+        self._t0 = time.monotonic()
+        self._paused_at: Optional[float] = None
+        self._paused = 0.0
+
+    def elapsed_ms(self) -> int:
+        now = self._paused_at if self._paused_at is not None else time.monotonic()
+        return int((now - self._t0 - self._paused) * 1000)
+
+    def remaining_ms(self) -> int:
+        if self.total_ms <= 0:
+            return 1 << 30
+        return max(0, self.total_ms - self.elapsed_ms())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining_ms() <= 0
+
+    def budget(self, cap_ms: Optional[int] = None, reserve_ms: int = 0) -> int:
+        """Milliseconds a stage may use: min(cap_ms, remaining - reserve_ms), never negative."""
+        left = self.remaining_ms() - max(0, int(reserve_ms))
+        if cap_ms is not None:
+            left = min(left, int(cap_ms))
+        return max(0, left)
+
+    def check(self, stage: str):
+        if self.expired:
+            raise DeadlineExceeded(stage)
+
+    @contextmanager
+    def paused(self):
+        if self._paused_at is not None:
+            yield
+            return
+        self._paused_at = time.monotonic()
+        try:
+            yield
+        finally:
+            self._paused += time.monotonic() - self._paused_at
+            self._paused_at = None
+
+    async def run(self, aw: Awaitable[T], stage: str, cap_ms: Optional[int] = None, reserve_ms: int = 0) -> T:
+        """Await `aw` within budget(cap_ms, reserve_ms); cancel it and raise DeadlineExceeded when it runs out."""
+        budget = self.budget(cap_ms, reserve_ms)
+        if budget <= 0:
+            if asyncio.iscoroutine(aw):
+                aw.close()
+            raise DeadlineExceeded(stage)
+        try:
+            return await asyncio.wait_for(aw, budget / 1000)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(stage) from None
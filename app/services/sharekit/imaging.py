@@ -0,0 +1,119 @@
+"""
+CPU-bound image work for ShareKit, run in a process pool so it never blocks
+the event loop. Everything submitted to the pool is a top-level function
+taking/returning plain bytes so it pickles cheaply.
+"""
+import asyncio
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_image_pool(workers: int = 2) -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: the parent runs asyncio + Playwright threads, forking it is unsafe
+        _pool = ProcessPoolExecutor(max_workers=max(1, workers), mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_image_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def run_in_image_pool(fn, *args, workers: int = 2, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_image_pool(workers), partial(fn, *args, **kwargs))
+
+
+# format → (file extension, mime)
+FORMATS = {
+    "png": ("png", "image/png"),
+    "jpeg": ("jpg", "image/jpeg"),
+    "webp": ("webp", "image/webp"),
+}
+
+
+def normalize_format(fmt: str) -> str:
+    fmt = (fmt or "png").strip().lower()
+    if fmt == "jpg":
+        fmt = "jpeg"
+    return fmt if fmt in FORMATS else "png"
+
+
+def encode(img: Image.Image, fmt: str = "png", quality: int = 80) -> bytes:
+    buf = io.BytesIO()
+    if fmt == "png":
+        img.save(buf, format="PNG", compress_level=3)
+    else:
+        if img.mode not in ("RGB", "L"):
+            # no alpha in JPEG; flatten onto white like the page background
+            bg = Image.new("RGB", img.size, (255, 255, 255))
+            bg.paste(img, mask=img.getchannel("A") if "A" in img.getbands() else None)
+            img = bg
+        if fmt == "jpeg":
+            img.save(buf, format="JPEG", quality=int(quality), optimize=True, progressive=True)
+        else:
+            img.save(buf, format="WEBP", quality=int(quality), method=4)
+    return buf.getvalue()
+
+
+def fit_budget(img: Image.Image, fmt: str, quality: int, max_bytes: int, allow_resize: bool = True) -> bytes:
+    """
+    Encode and, if the result is over max_bytes, step quality down (lossy
+    formats) and then downscale (if allowed) until it fits.
+    """
+    data = encode(img, fmt, quality)
+    if not max_bytes or len(data) <= max_bytes:
+        return data
+    if fmt != "png":
+        for q in (70, 60, 50, 40):
+            if q >= quality:
+                continue
+            data = encode(img, fmt, q)
+            if len(data) <= max_bytes:
+                return data
+        quality = min(quality, 40)
+    if not allow_resize:
+        return data
+    while len(data) > max_bytes and min(img.size) > 64:
+        scale = max(0.5, min(0.95, (max_bytes / len(data)) ** 0.5 * 0.95))
+        img = img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))), Image.LANCZOS)
+        data = encode(img, fmt, quality)
+    return data
+
+
+def transcode(data: bytes, fmt: str = "png", quality: int = 80, max_bytes: int = 0, allow_resize: bool = True) -> bytes:
+    """Re-encode one captured image to the target format / byte budget."""
+    with Image.open(io.BytesIO(data)) as img:
+        img.load()
+        return fit_budget(img, fmt, quality, max_bytes, allow_resize)
+
+
+def crop_slices(png: bytes, boxes: Sequence[Tuple[int, int]], fmt: str = "png", quality: int = 80,
+                max_bytes: int = 0, allow_resize: bool = True, css_width: int = 0) -> List[bytes]:
+    """
+    Cut horizontal bands out of one rendered tile and encode each one.
+    boxes: [(top, bottom), ...] relative to the tile; in CSS px when css_width is
+    given (scaled by the tile's real width, whatever scale factor it rendered at),
+    otherwise in device pixels.
+    """
+    with Image.open(io.BytesIO(png)) as tile:
+        tile.load()
+        width, height = tile.size
+        scale = width / css_width if css_width else 1
+        out = []
+        for top, bottom in boxes:
+            top = max(0, min(int(round(top * scale)), height))
+            bottom = max(top + 1, min(int(round(bottom * scale)), height))
+            out.append(fit_budget(tile.crop((0, top, width, bottom)), fmt, quality, max_bytes, allow_resize))
+        return out
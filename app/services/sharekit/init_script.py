@@ -0,0 +1,149 @@
+import json
+from app.services.sharekit.utils import _norm_bool
+
+# Hide only common cookie/consent/ad overlays.
+# Do NOT hide every fixed element by default, to avoid blank pages.
+HIDE_OVERLAYS_CSS = """
+/* keep scrolling snappy */
+html, body { scroll-behavior: auto !important; }
+
+/* cookie / consent banners */
+[id*="cookie" i], [class*="cookie" i],
+[id*="consent" i], [class*="consent" i],
+#consent, .fc-consent-root, .qc-cmp2-container, .osano-cm-dialog,
+.sp_choice_type_11, .cc-window, .cc-banner,
+
+/* lightweight ad labels */
+.ad-banner, .ads-banner, .advert, .advertisement, .ad-container
+{
+    opacity: .0001 !important;
+    pointer-events: none !important;
+}
+"""
+
+HIDE_FIXED_CSS = """
+*[style*="position:fixed" i] {
+    opacity: .0001 !important;
+    pointer-events: none !important;
+}
+"""
+
+# Runs in every frame before any page script. `__CFG__` is replaced with JSON.
+INIT_SCRIPT_TEMPLATE = r"""
+(() => {
+  const cfg = __CFG__;
+  const w = window;
+  if (w.__u2sInit) return;
+  w.__u2sInit = true;
+
+  // ---- overlay CSS before first paint ----
+  if (cfg.css) {
+    const style = document.createElement("style");
+    style.setAttribute("data-u2s", "1");
+    style.textContent = cfg.css;
+    const attach = () => {
+      const root = document.head || document.documentElement;
+      if (!root) return false;
+      root.appendChild(style);
+      return true;
+    };
+    if (!attach()) {
+      new MutationObserver((_, obs) => { if (attach()) obs.disconnect(); })
+        .observe(document, { childList: true, subtree: true });
+    }
+  }
+
+  // ---- popups / dialogs ----
+  if (cfg.disableWindowOpen) {
+    w.open = () => null;
+  }
+  if (cfg.dismissDialogs) {
+    w.alert = () => undefined;
+    w.confirm = () => false;
+    w.prompt = () => null;
+    w.onbeforeunload = null;
+  }
+
+  // ---- count scroll listeners: lazy loaders that only react to scrolling ----
+  // (installed even without eager loading; PRE_SCROLL_MODE=auto reads it)
+  w.__u2sScrollListeners = 0;
+  const addEL = EventTarget.prototype.addEventListener;
+  EventTarget.prototype.addEventListener = function (type, listener, opts) {
+    if (type === "scroll" && (this === w || this === document)) w.__u2sScrollListeners++;
+    return addEL.call(this, type, listener, opts);
+  };
+
+  if (!cfg.eager) return;
+
+  // ---- loading=lazy → eager, data-src → src ----
+  const LAZY_ATTRS = [["data-src", "src"], ["data-lazy-src", "src"], ["data-original", "src"],
+                      ["data-srcset", "srcset"], ["data-lazy-srcset", "srcset"]];
+  const eager = (el) => {
+    if (el.nodeType !== 1) return;
+    const tag = el.tagName;
+    if (tag === "IMG" || tag === "IFRAME" || tag === "SOURCE") {
+      if (el.getAttribute("loading") === "lazy") el.setAttribute("loading", "eager");
+      for (const [from, to] of LAZY_ATTRS) {
+        const v = el.getAttribute(from);
+        if (v && el.getAttribute(to) !== v) el.setAttribute(to, v);
+      }
+    }
+  };
+  const sweep = (root) => {
+    eager(root);
+    if (root.querySelectorAll) root.querySelectorAll("img,iframe,source").forEach(eager);
+  };
+  new MutationObserver((muts) => {
+    for (const m of muts) {
+      if (m.type === "attributes") eager(m.target);
+      else m.addedNodes.forEach(sweep);
+    }
+  }).observe(document, { childList: true, subtree: true, attributes: true,
+                         attributeFilter: ["loading", "data-src", "data-srcset", "data-lazy-src"] });
+  document.addEventListener("DOMContentLoaded", () => sweep(document.documentElement));
+
+  // ---- IntersectionObserver: report every observed target as visible once ----
+  const NativeIO = w.IntersectionObserver;
+  if (NativeIO) {
+    let budget = cfg.ioBudget;
+    const seen = new WeakSet();
+    w.IntersectionObserver = class extends NativeIO {
+      constructor(cb, options) {
+        super(cb, options);
+        this.__cb = cb;
+      }
+      observe(target) {
+        super.observe(target);
+        if (seen.has(target) || budget <= 0) return;
+        seen.add(target);
+        budget--;
+        setTimeout(() => {
+          const r = target.getBoundingClientRect();
+          try {
+            this.__cb([{ target, isIntersecting: true, intersectionRatio: 1, time: performance.now(),
+                         boundingClientRect: r, intersectionRect: r, rootBounds: null }], this);
+          } catch (e) {}
+        }, 0);
+      }
+    };
+  }
+})();
+"""
+
+
+def build_init_script(settings) -> str:
+    """One script per context: overlay CSS, eager loading, popup/dialog handling."""
+    css = ""
+    if _norm_bool(getattr(settings, "HIDE_COMMON_OVERLAYS", True), True):
+        css += HIDE_OVERLAYS_CSS
+    # Optional: hide ALL fixed overlays only if explicitly enabled
+    if _norm_bool(getattr(settings, "HIDE_FIXED_OVERLAYS", False), False):
+        css += HIDE_FIXED_CSS
+    cfg = {
+        "css": css,
+        "disableWindowOpen": _norm_bool(getattr(settings, "DISABLE_WINDOW_OPEN", True), True),
+        "dismissDialogs": _norm_bool(getattr(settings, "AUTO_DISMISS_DIALOGS", True), True),
+        "eager": _norm_bool(getattr(settings, "FORCE_EAGER_LOADING", True), True),
+        "ioBudget": int(getattr(settings, "LAZY_IO_TRIGGER_BUDGET", 300)),
+    }
+    return INIT_SCRIPT_TEMPLATE.replace("__CFG__", json.dumps(cfg))
@@ -0,0 +1,109 @@
+import math
+from typing import Any, Dict, NamedTuple, Optional
+
+# Chromium cannot rasterize a single capture taller than its max texture size
+MAX_TILE_DEVICE_PX = 16000
+
+# rough encoded size of a typical web page screenshot, bytes per device pixel
+EST_BYTES_PER_PX = {"png": 0.6, "jpeg": 0.12, "webp": 0.09}
+
+DSF_STEPS = (4, 3, 2, 1.5, 1)
+
+
+class RenderPlan(NamedTuple):
+    dsf: float
+    full_page: bool
+    slice_h: int            # CSS px per slice (slice mode)
+    parts: int
+    pixels: int             # device pixels that will be rasterized
+    baseline_pixels: int    # what the fixed profile (old behaviour) would have rasterized
+
+    def as_metrics(self) -> Dict[str, Any]:
+        return {
+            "dsf": self.dsf,
+            "mode": "full" if self.full_page else "slice",
+            "slice_h": self.slice_h,
+            "parts": self.parts,
+            "raster_px": self.pixels,
+            "raster_px_saved": max(0, self.baseline_pixels - self.pixels),
+        }
+
+
+def _slice_count(total_h: int, slice_h: int, overlap: int) -> int:
+    step = max(1, slice_h - overlap)
+    return max(1, math.ceil(max(0, total_h - overlap) / step))
+
+
+def plan_render(total_h: int, viewport: Dict[str, int], base_dsf: float, settings, *,
+                full_page: Optional[bool], force_slice: bool, fmt: str = "png") -> RenderPlan:
+    """
+    Pick device scale factor, full-page vs slice mode and slice height so the
+    output fits the pixel (RENDER_MAX_PIXELS), byte (MAX_IMAGE_BYTES per image)
+    and part (MAX_SCREENS_PER_JOB) budgets. Sharpness is only reduced when a
+    budget would otherwise be exceeded.
+    """
+    w, vh = int(viewport["width"]), int(viewport["height"])
+    total_h = max(1, int(total_h))
+    fullpage_max = int(getattr(settings, "FULLPAGE_MAX_HEIGHT_PX", 9000))
+    overlap = int(getattr(settings, "SLICE_OVERLAP_PX", 80))
+    max_parts = max(1, int(getattr(settings, "MAX_SCREENS_PER_JOB", 10)))
+    max_pixels = int(getattr(settings, "RENDER_MAX_PIXELS", 100_000_000))
+    max_bytes = int(getattr(settings, "MAX_IMAGE_BYTES", 0))
+    bpp = EST_BYTES_PER_PX.get(fmt, EST_BYTES_PER_PX["png"])
+
+    if force_slice:
+        want_full = False
+    elif full_page is None:
+        # default behavior: try full if short, else slice
+        want_full = total_h <= fullpage_max
+    else:
+        want_full = bool(full_page)
+
+    # what the fixed profile used to do: full page at base dsf, or viewport slices up to max_parts
+    if want_full:
+        baseline = int(w * total_h * base_dsf ** 2)
+    else:
+        baseline = int(min(_slice_count(total_h, vh, overlap), max_parts) * w * vh * base_dsf ** 2)
+
+    steps = [d for d in DSF_STEPS if d <= base_dsf] or [base_dsf]
+    if base_dsf not in steps:
+        steps.insert(0, base_dsf)
+
+    def fits(pixels_total: int, pixels_per_image: int, height_device: float) -> bool:
+        if max_pixels and pixels_total > max_pixels:
+            return False
+        if max_bytes and pixels_per_image * bpp > max_bytes:
+            return False
+        return height_device <= MAX_TILE_DEVICE_PX
+
+    if want_full:
+        # in auto mode a long page is better sliced sharp than shrunk into one blurry image
+        floor = steps[-1] if full_page else max(1, base_dsf / 2)
+        for dsf in steps:
+            if dsf < floor:
+                break
+            px = int(w * total_h * dsf ** 2)
+            if fits(px, px, total_h * dsf):
+                return RenderPlan(dsf, True, total_h, 1, px, baseline)
+        dsf = steps[-1]
+        px = int(w * total_h * dsf ** 2)
+        if full_page and not (max_pixels and px > max_pixels):
+            # explicitly asked for one image: lowest dsf, the encoder shrinks the rest
+            return RenderPlan(dsf, True, total_h, 1, px, baseline)
+        # too big for one image (or for the pixel budget even at the lowest dsf) → slice instead
+
+    # slice mode: grow slices beyond the viewport so the page fits in max_parts
+    need_h = math.ceil(max(0, total_h - overlap) / max_parts) + overlap
+    for dsf in steps:
+        slice_h = max(vh, min(need_h, int(MAX_TILE_DEVICE_PX // dsf)))
+        parts = min(_slice_count(total_h, slice_h, overlap), max_parts)
+        per_image = int(w * slice_h * dsf ** 2)
+        if fits(parts * per_image, per_image, slice_h * dsf):
+            return RenderPlan(dsf, False, slice_h, parts, parts * per_image, baseline)
+    dsf = steps[-1]
+    slice_h = max(vh, min(need_h, int(MAX_TILE_DEVICE_PX // dsf)))
+    parts = min(_slice_count(total_h, slice_h, overlap), max_parts)
+    if max_pixels and parts * w * slice_h * dsf ** 2 > max_pixels:
+        # the pixel budget is a hard cap: shorter slices, so only the top of a very long page is rendered
+        slice_h = max(overlap + 1, int(max_pixels // (parts * w * dsf ** 2)))
+    return RenderPlan(dsf, False, slice_h, parts, int(parts * w * slice_h * dsf ** 2), baseline)
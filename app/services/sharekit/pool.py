@@ -0,0 +1,310 @@
+import asyncio
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional, Set
+from playwright.async_api import async_playwright, Browser
+from app.services.sharekit.utils import _norm_bool
+from app.services.sharekit.procmem import chromium_roots, tree_rss_bytes
+
+CHROMIUM_ARGS = [
+    "--no-sandbox",
+    "--disable-setuid-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+]
+
+_ids = itertools.count(1)
+
+
+class _PooledBrowser:
+    def __init__(self, browser: Browser, pid: Optional[int] = None):
+        self.id = next(_ids)
+        self.browser = browser
+        self.pid = pid                  # Chromium browser process (None if it could not be identified)
+        self.inflight = 0
+        self.pages = 0                  # contexts opened over its lifetime
+        self.launched_at = time.monotonic()
+        self.draining = False           # retired: no new contexts, closed once inflight reaches 0
+        self.drain_since = 0.0
+        self.recycle_pending = False
+
+    @property
+    def usable(self) -> bool:
+        return not self.draining and self.alive
+
+    def rss_bytes(self) -> int:
+        return tree_rss_bytes(self.pid) if self.pid else 0
+
+    @property
+    def alive(self) -> bool:
+        try:
+            return self.browser.is_connected()
+        except Exception:
+            return False
+
+
+class BrowserPool:
+    """
+    Process-wide pool of warm Chromium instances.
+    One Playwright driver per process, BROWSER_POOL_SIZE browsers,
+    and a fresh BrowserContext for every job.
+
+    Browsers are recycled after BROWSER_MAX_PAGES contexts, past
+    BROWSER_MAX_RSS_MB (browser + renderer processes, from /proc) or when they
+    crash. A recycled browser is replaced right away and drains: contexts
+    already open on it finish, then it is closed (forcibly after
+    BROWSER_DRAIN_TIMEOUT_SEC).
+    """
+
+    def __init__(self, settings):
+        self.s = settings
+        self.size = max(1, int(getattr(settings, "BROWSER_POOL_SIZE", 2)))
+        self.health_interval = int(getattr(settings, "BROWSER_HEALTHCHECK_SEC", 30))
+        self.max_pages = max(0, int(getattr(settings, "BROWSER_MAX_PAGES", 300)))
+        self.max_rss = max(0, int(getattr(settings, "BROWSER_MAX_RSS_MB", 1500))) * 1024 * 1024
+        self.drain_timeout = max(1, int(getattr(settings, "BROWSER_DRAIN_TIMEOUT_SEC", 90)))
+        self._pw = None
+        self._browsers: List[_PooledBrowser] = []
+        self._draining: List[_PooledBrowser] = []
+        self._recycle_tasks: Set[asyncio.Task] = set()
+        self._recycle_listeners: List[Callable[[], None]] = []
+        self.recycles: Dict[str, int] = {"pages": 0, "rss": 0, "crash": 0}
+        self._lock = asyncio.Lock()
+        self._health_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    async def start(self):
+        async with self._lock:
+            if self._pw is not None:
+                return
+            self._closed = False
+            self._pw = await async_playwright().start()
+            try:
+                for _ in range(self.size):
+                    self._browsers.append(await self._launch())
+            except Exception:
+                await self._close_all()
+                raise
+        if self.health_interval > 0:
+            self._health_task = asyncio.create_task(self._health_loop())
+        print(f"[browser-pool] started {len(self._browsers)} browser(s).")
+
+    async def _launch(self) -> _PooledBrowser:
+        headless = _norm_bool(getattr(self.s, "HEADLESS", True), True)
+        # launches are serialized by self._lock, so the new Chromium is the only new child process
+        before = chromium_roots()
+        browser = await self._pw.chromium.launch(headless=headless, args=CHROMIUM_ARGS)
+        new = chromium_roots() - before
+        return _PooledBrowser(browser, pid=new.pop() if len(new) == 1 else None)
+
+    def on_recycle(self, callback: Callable[[], None]):
+        """Call `callback()` whenever a browser starts draining (e.g. to drop warm contexts on it)."""
+        self._recycle_listeners.append(callback)
+
+    async def _replace(self, pb: _PooledBrowser):
+        """Swap a dead browser for a fresh one; contexts on it are gone anyway."""
+        try:
+            idx = self._browsers.index(pb)
+        except ValueError:
+            return
+        print(f"[browser-pool] replacing crashed browser #{pb.id} after {pb.pages} page(s)")
+        self.recycles["crash"] += 1
+        pb.draining = True
+        try:
+            await pb.browser.close()
+        except Exception:
+            pass
+        self._browsers[idx] = await self._launch()
+        self._notify_recycle()
+
+    async def _retire(self, pb: _PooledBrowser, reason: str):
+        """Put a fresh browser in pb's slot and let pb drain. Caller holds self._lock."""
+        try:
+            idx = self._browsers.index(pb)
+        except ValueError:
+            return
+        print(
+            f"[browser-pool] recycling browser #{pb.id} ({reason}: {pb.pages} page(s), "
+            f"{pb.rss_bytes() // (1024 * 1024)} MiB, {pb.inflight} in flight)"
+        )
+        self.recycles[reason] += 1
+        self._browsers[idx] = await self._launch()
+        pb.draining = True
+        pb.drain_since = time.monotonic()
+        self._draining.append(pb)
+        self._notify_recycle()
+        if pb.inflight <= 0:
+            await self._close_drained(pb)
+
+    async def _close_drained(self, pb: _PooledBrowser):
+        if pb not in self._draining:
+            return
+        self._draining.remove(pb)
+        try:
+            await pb.browser.close()
+        except Exception:
+            pass
+        print(f"[browser-pool] browser #{pb.id} drained and closed")
+
+    def _notify_recycle(self):
+        for cb in self._recycle_listeners:
+            try:
+                cb()
+            except Exception as e:
+                print(f"[browser-pool] recycle listener failed: {e!r}")
+
+    def _schedule_recycle(self, pb: _PooledBrowser, reason: str):
+        if pb.recycle_pending or pb.draining or self._closed:
+            return
+        pb.recycle_pending = True
+
+        async def run():
+            try:
+                async with self._lock:
+                    if not pb.draining and not self._closed:
+                        await self._retire(pb, reason)
+            except Exception as e:
+                # replacement failed to launch: keep serving from pb and retry on a later release
+                print(f"[browser-pool] recycling browser #{pb.id} failed: {e!r}")
+                pb.recycle_pending = False
+
+        task = asyncio.create_task(run())
+        self._recycle_tasks.add(task)
+        task.add_done_callback(self._recycle_tasks.discard)
+
+    async def _pick(self) -> _PooledBrowser:
+        if self._pw is None:
+            await self.start()
+        async with self._lock:
+            for pb in list(self._browsers):
+                if not pb.alive:
+                    await self._replace(pb)
+            # least-loaded browser wins; one due for recycling only if there is nothing else
+            return min(self._browsers, key=lambda b: (b.recycle_pending, b.inflight))
+
+    async def open_context(self, **context_kwargs):
+        """Open a BrowserContext on the least-loaded browser; pair with release()."""
+        if self._closed:
+            raise RuntimeError("browser pool is closed")
+        pb = await self._pick()
+        pb.inflight += 1
+        pb.pages += 1
+        try:
+            context = await pb.browser.new_context(**context_kwargs)
+        except Exception:
+            pb.inflight -= 1
+            raise
+        return pb, context
+
+    async def release(self, pb: _PooledBrowser, context):
+        pb.inflight -= 1
+        try:
+            await context.close()
+        except Exception:
+            pass
+        if pb.draining:
+            if pb.inflight <= 0:
+                await self._close_drained(pb)
+        elif self.max_pages and pb.pages >= self.max_pages:
+            self._schedule_recycle(pb, "pages")
+
+    @asynccontextmanager
+    async def new_context(self, **context_kwargs):
+        """Yield a fresh BrowserContext on a warm browser; always closed on exit."""
+        pb, context = await self.open_context(**context_kwargs)
+        try:
+            yield context
+        finally:
+            await self.release(pb, context)
+
+    async def _health_loop(self):
+        while not self._closed:
+            await asyncio.sleep(self.health_interval)
+            try:
+                async with self._lock:
+                    for pb in list(self._browsers):
+                        if not pb.alive:
+                            await self._replace(pb)
+                        elif self.max_rss and pb.rss_bytes() > self.max_rss:
+                            await self._retire(pb, "rss")
+                    now = time.monotonic()
+                    for pb in list(self._draining):
+                        if pb.alive and now - pb.drain_since < self.drain_timeout:
+                            continue
+                        if pb.inflight > 0:
+                            print(f"[browser-pool] browser #{pb.id} still has {pb.inflight} context(s) "
+                                  f"after {self.drain_timeout}s of draining; closing it anyway")
+                        await self._close_drained(pb)
+            except Exception as e:
+                print(f"[browser-pool] health check failed: {e!r}")
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Live per-browser state (RSS is read from /proc on every call)."""
+        now = time.monotonic()
+        return [
+            {
+                "id": pb.id,
+                "pid": pb.pid,
+                "pages": pb.pages,
+                "inflight": pb.inflight,
+                "rss_mb": round(pb.rss_bytes() / (1024 * 1024), 1),
+                "age_sec": int(now - pb.launched_at),
+                "draining": pb.draining,
+            }
+            for pb in [*self._browsers, *self._draining]
+        ]
+
+    async def _close_all(self):
+        for task in list(self._recycle_tasks):
+            task.cancel()
+        for pb in [*self._browsers, *self._draining]:
+            try:
+                await pb.browser.close()
+            except Exception:
+                pass
+        self._browsers = []
+        self._draining = []
+        if self._pw is not None:
+            try:
+                await self._pw.stop()
+            except Exception:
+                pass
+            self._pw = None
+
+    async def close(self):
+        self._closed = True
+        if self._health_task:
+            self._health_task.cancel()
+            self._health_task = None
+        async with self._lock:
+            await self._close_all()
+        print("[browser-pool] closed.")
+
+
+_pool: Optional[BrowserPool] = None
+
+
+def get_browser_pool(settings) -> BrowserPool:
+    """The shared pool for this process (created lazily)."""
+    global _pool
+    if _pool is None:
+        _pool = BrowserPool(settings)
+    return _pool
+
+
+def browser_pool_stats() -> List[Dict[str, Any]]:
+    """Per-browser stats of this process's pool ([] if it was never started, e.g. in supervisor mode)."""
+    return _pool.stats() if _pool is not None else []
+
+
+def browser_pool_recycles() -> Dict[str, int]:
+    """Recycle counts by reason (pages/rss/crash) of this process's pool."""
+    return dict(_pool.recycles) if _pool is not None else {}
+
+
+async def shutdown_browser_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
@@ -0,0 +1,76 @@
+import os
+from typing import Dict, List, Set
+
+# Linux-only: on other platforms every helper returns empty/0 and RSS-based recycling is simply off.
+PROC = "/proc"
+_PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _ppids() -> Dict[int, int]:
+    """pid → parent pid for every visible process."""
+    out: Dict[int, int] = {}
+    try:
+        names = os.listdir(PROC)
+    except OSError:
+        return out
+    for name in names:
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"{PROC}/{name}/stat", "rb") as f:
+                stat = f.read()
+            # comm may contain spaces/parens: fields after the last ")" are fixed
+            out[int(name)] = int(stat[stat.rfind(b")") + 2:].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+    return out
+
+
+def _descendants(root: int, ppids: Dict[int, int]) -> List[int]:
+    children: Dict[int, List[int]] = {}
+    for pid, ppid in ppids.items():
+        children.setdefault(ppid, []).append(pid)
+    out, stack = [], [root]
+    while stack:
+        pid = stack.pop()
+        out.append(pid)
+        stack.extend(children.get(pid, ()))
+    return out
+
+
+def _cmdline(pid: int) -> bytes:
+    try:
+        with open(f"{PROC}/{pid}/cmdline", "rb") as f:
+            return f.read()
+    except OSError:
+        return b""
+
+
+def chromium_roots(owner: int = 0) -> Set[int]:
+    """
+    Pids of Chromium browser processes launched (through the Playwright driver)
+    by `owner` (default: this process). Renderer/GPU helpers carry --type= and
+    are left out; they are counted in tree_rss_bytes() of their browser.
+    """
+    ppids = _ppids()
+    roots = set()
+    for pid in _descendants(owner or os.getpid(), ppids)[1:]:
+        cmd = _cmdline(pid)
+        if b"--remote-debugging-pipe" in cmd and b"--type=" not in cmd:
+            roots.add(pid)
+    return roots
+
+
+def _rss(pid: int) -> int:
+    try:
+        with open(f"{PROC}/{pid}/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def tree_rss_bytes(pid: int) -> int:
+    """Resident memory of `pid` and all its children (browser + renderers + GPU/utility processes)."""
+    if not pid:
+        return 0
+    return sum(_rss(p) for p in _descendants(pid, _ppids()))
@@ -0,0 +1,109 @@
+import asyncio
+import time
+from typing import Any, Dict
+
+# Installs (once per document) a MutationObserver and reports what is still
+# settling: DOM mutations, images not yet loaded/decoded, web fonts.
+READINESS_PROBE_JS = """
+() => {
+  const w = window;
+  if (!w.__u2sReady) {
+    const st = w.__u2sReady = { lastMutation: performance.now(), decoding: 0 };
+    try {
+      new MutationObserver(() => { st.lastMutation = performance.now(); })
+        .observe(document.documentElement || document, {
+          subtree: true, childList: true, characterData: true,
+          attributes: true, attributeFilter: ["src", "srcset"],
+        });
+    } catch (e) {}
+  }
+  const st = w.__u2sReady;
+  let pendingImages = 0;
+  for (const img of Array.from(document.images)) {
+    if (!img.currentSrc && !img.src) continue;
+    if (!img.complete) {
+      if (img.loading !== "lazy") pendingImages++;
+    } else if (img.naturalWidth && img.decode && !img.__u2sDecoded) {
+      img.__u2sDecoded = true;
+      st.decoding++;
+      img.decode().catch(() => {}).finally(() => { st.decoding--; });
+    }
+  }
+  return {
+    domQuietMs: performance.now() - st.lastMutation,
+    pendingImages: pendingImages,
+    decoding: st.decoding,
+    fontsReady: document.fonts ? document.fonts.status === "loaded" : true,
+    readyState: document.readyState,
+  };
+}
+"""
+
+
+class NetworkTracker:
+    """
+    Counts in-flight requests of a context from the moment it is created.
+    Requests older than `stuck_ms` (long-polls, beacons, streams) are ignored
+    so they cannot keep the page "busy" forever.
+    """
+
+    def __init__(self, stuck_ms: int = 5000):
+        self.stuck_ms = stuck_ms
+        self._inflight: Dict[Any, float] = {}
+        self.last_activity = time.monotonic()
+
+    def attach(self, context):
+        context.on("request", self._on_start)
+        context.on("requestfinished", self._on_end)
+        context.on("requestfailed", self._on_end)
+
+    def _on_start(self, request):
+        self._inflight[request] = time.monotonic()
+        self.last_activity = time.monotonic()
+
+    def _on_end(self, request):
+        self._inflight.pop(request, None)
+        self.last_activity = time.monotonic()
+
+    def busy(self) -> int:
+        cutoff = time.monotonic() - self.stuck_ms / 1000
+        return sum(1 for started in self._inflight.values() if started >= cutoff)
+
+    def quiet_for_ms(self) -> float:
+        if self.busy():
+            return 0.0
+        return (time.monotonic() - self.last_activity) * 1000
+
+
+async def wait_until_ready(page, net: NetworkTracker, max_ms: int, quiet_ms: int = 500,
+                           poll_ms: int = 100) -> Dict[str, Any]:
+    """
+    Return as soon as network, DOM, images and fonts have all been quiet for
+    `quiet_ms`; `max_ms` is only an upper bound.
+    """
+    t0 = time.monotonic()
+    deadline = t0 + max(0, max_ms) / 1000
+    state: Dict[str, Any] = {}
+    while True:
+        try:
+            state = await page.evaluate(READINESS_PROBE_JS) or {}
+        except Exception:
+            # navigation in progress / context destroyed → try again
+            state = {}
+        stable = (
+            state.get("readyState") in ("interactive", "complete")
+            and state.get("fontsReady", True)
+            and not state.get("pendingImages")
+            and not state.get("decoding")
+            and state.get("domQuietMs", 0) >= quiet_ms
+            and net.quiet_for_ms() >= quiet_ms
+        )
+        now = time.monotonic()
+        if stable or now >= deadline:
+            return {
+                "ready_ms": int((now - t0) * 1000),
+                "ready_timeout": not stable,
+                "pending_images": state.get("pendingImages", 0),
+                "inflight_requests": net.busy(),
+            }
+        await asyncio.sleep(min(poll_ms / 1000, max(0.0, deadline - now)))
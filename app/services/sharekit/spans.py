@@ -0,0 +1,57 @@
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+Sink = Callable[[Dict[str, Any]], None]
+
+
+class Trace:
+    """
+    Stage timings of one job. span(name) measures a block; repeated spans with
+    the same name (one per tile, one per sent part) add up in stage_ms().
+    Every finished span is also handed to `sink` as a flat dict, if given.
+    """
+
+    def __init__(self, trace_id: Optional[str] = None, sink: Optional[Sink] = None, **tags):
+        self.trace_id = trace_id
+        self.sink = sink
+        self.tags = tags
+        self._t0 = time.monotonic()
+        self._ms: Dict[str, float] = {}
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """Time the block; the yielded dict can be filled with attributes for the span record."""
+        start = time.time()
+        t0 = time.monotonic()
+        error = None
+        try:
+            yield attrs
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self._record(name, (time.monotonic() - t0) * 1000, start, error, attrs)
+
+    def add(self, name: str, ms: float, **attrs):
+        """Record a stage measured elsewhere (queue wait, lease acquisition, ...)."""
+        self._record(name, ms, time.time() - ms / 1000, None, attrs)
+
+    def _record(self, name: str, ms: float, start: float, error: Optional[str], attrs: Dict[str, Any]):
+        self._ms[name] = self._ms.get(name, 0.0) + ms
+        if self.sink is None:
+            return
+        event = {"ts": round(start, 3), "trace_id": self.trace_id, "span": name, "ms": round(ms, 1),
+                 "ok": error is None, **self.tags, **attrs}
+        if error:
+            event["error"] = error
+        try:
+            self.sink(event)
+        except Exception:
+            pass
+
+    def elapsed_ms(self) -> int:
+        return int((time.monotonic() - self._t0) * 1000)
+
+    def stage_ms(self) -> Dict[str, int]:
+        return {name: int(ms) for name, ms in self._ms.items()}
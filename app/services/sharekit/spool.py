@@ -0,0 +1,82 @@
+"""
+Large capture artifacts (PDFs, full-page images) are written to temp files
+under LOCAL_STORAGE_DIR and uploaded from disk, so finished parts do not pile
+up in memory while the rest of the job renders and uploads.
+
+This does not bound peak memory: Playwright returns each screenshot/PDF as
+bytes and Pillow encodes every part in memory before it reaches spool_item(),
+so one part (and, while slicing, the full-page PNG it is cut from) is still
+fully resident at that point.
+
+A spooled item has "path" (and "size") instead of "data"; whoever consumes it
+calls discard_item() once it is no longer needed.
+"""
+import asyncio
+import os
+import tempfile
+import time
+from typing import Any, Dict
+
+PREFIX = "u2s-"
+
+
+def spool_dir(settings) -> str:
+    path = os.path.join(str(getattr(settings, "LOCAL_STORAGE_DIR", "./data/shots") or "./data/shots"), "spool")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _write(directory: str, data: bytes, suffix: str) -> str:
+    fd, path = tempfile.mkstemp(prefix=f"{PREFIX}{os.getpid()}-", suffix=suffix, dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+    except BaseException:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        raise
+    return path
+
+
+async def spool_item(item: Dict[str, Any], settings) -> Dict[str, Any]:
+    """Move item["data"] to a temp file if it is over SPOOL_THRESHOLD_BYTES (0 → keep everything in memory)."""
+    threshold = int(getattr(settings, "SPOOL_THRESHOLD_BYTES", 1_000_000))
+    data = item.get("data")
+    if not threshold or data is None or len(data) <= threshold:
+        return item
+    suffix = os.path.splitext(item.get("file_name") or "")[1]
+    path = await asyncio.to_thread(_write, spool_dir(settings), data, suffix)
+    out = {k: v for k, v in item.items() if k != "data"}
+    out.update(path=path, size=len(data))
+    return out
+
+
+def discard_item(item: Dict[str, Any]):
+    path = item.get("path")
+    if path:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"[spool] cannot remove {path}: {e!r}")
+
+
+def purge_spool(settings, max_age_sec: int = 3600) -> int:
+    """Remove spool files left behind by a crashed process."""
+    directory = spool_dir(settings)
+    cutoff = time.time() - max_age_sec
+    removed = 0
+    for name in os.listdir(directory):
+        if not name.startswith(PREFIX):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.unlink(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
@@ -0,0 +1,8 @@
+def _norm_bool(v, default=False):
+    if v is None: 
+        return default
+    if isinstance(v, bool): 
+        return v
+    if isinstance(v, str): 
+        return v.strip().lower() in {"1","true","yes","y","on"}
+    return bool(v)
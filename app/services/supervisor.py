@@ -0,0 +1,130 @@
+import asyncio, os, signal, time
+import multiprocessing
+from typing import Dict, List, Optional
+from app.config import settings
+from app.bot import build_bot
+from app.services.db import init_db, close_db
+from app.services.notify import job_notifier
+from app.services.worker import job_worker, get_job_feed, shutdown_job_feed
+from app.services.sharekit.contexts import get_context_pool, shutdown_context_pool
+from app.services.sharekit.pool import shutdown_browser_pool
+from app.services.sharekit.imaging import shutdown_image_pool
+from app.services.metrics import start_metrics_server
+
+
+def capture_process_main(index: int, db_url: str):
+    """Entry point of one capture process (spawned, so nothing is inherited but env/args)."""
+    # Ctrl+C reaches the whole process group; the supervisor decides when we stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_capture_process(index, db_url))
+
+
+async def _capture_process(index: int, db_url: str):
+    init_db(db_url)
+    bot = build_bot()
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+
+    worker_count = int(getattr(settings, "WORKER_COUNT", 5))
+    tasks: List[asyncio.Task] = []
+    metrics_runner = None
+    try:
+        # each process owns its browsers/contexts; jobs are shared through the DB queue
+        await get_context_pool(settings).start()
+        job_notifier.listen()
+        feed = get_job_feed()
+        for i in range(worker_count):
+            tasks.append(asyncio.create_task(job_worker(index * worker_count + i, bot, feed)))
+        # latency/worker/browser metrics live in this process; the bot process only has the queue
+        base_port = int(getattr(settings, "METRICS_PORT", 0))
+        if base_port > 0:
+            metrics_runner = await start_metrics_server(base_port + 1 + index)
+        print(f"[capture:{index}] pid {os.getpid()} running {worker_count} worker(s).")
+        await stop.wait()
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await shutdown_job_feed()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        job_notifier.close()
+        await shutdown_context_pool()
+        await shutdown_browser_pool()
+        shutdown_image_pool()
+        await bot.session.close()
+        close_db()
+        print(f"[capture:{index}] stopped.")
+
+
+class WorkerSupervisor:
+    """
+    Runs WORKER_PROCESSES capture processes next to the (lightweight) polling
+    process. Each has its own event loop, browser/context pool and Bot session
+    and claims jobs from the shared queue; enqueue wakeups reach them through
+    the unix sockets in JOB_WAKEUP_SOCKET_DIR. Crashed processes are restarted;
+    their leased jobs go back to the queue through the lease reaper.
+    """
+
+    def __init__(self, processes: int, db_url: str):
+        if db_url.startswith("memory://"):
+            raise ValueError("WORKER_PROCESSES needs a shared queue (sqlite or postgres), not memory://")
+        self.processes = max(1, processes)
+        self.db_url = db_url
+        self._mp = multiprocessing.get_context("spawn")
+        self._procs: Dict[int, multiprocessing.Process] = {}
+        self._started: Dict[int, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        # without a shared wakeup dir the capture processes would only see jobs on the fallback poll
+        if not job_notifier.socket_dir:
+            wake_dir = os.path.abspath("./data/wakeup")
+            os.environ["JOB_WAKEUP_SOCKET_DIR"] = wake_dir  # inherited by the spawned children
+            job_notifier.socket_dir = wake_dir
+
+    def _spawn(self, index: int):
+        p = self._mp.Process(
+            target=capture_process_main, args=(index, self.db_url), name=f"capture-{index}",
+            daemon=False,  # children start their own process pools (image encoding)
+        )
+        p.start()
+        self._procs[index] = p
+        self._started[index] = time.monotonic()
+
+    def start(self):
+        for i in range(self.processes):
+            self._spawn(i)
+        self._task = asyncio.create_task(self._watch())
+        print(f"[supervisor] started {self.processes} capture process(es).")
+
+    async def _watch(self, interval: float = 2.0):
+        while True:
+            await asyncio.sleep(interval)
+            for index, p in list(self._procs.items()):
+                if p.is_alive():
+                    continue
+                uptime = time.monotonic() - self._started[index]
+                print(f"[supervisor] capture-{index} exited with {p.exitcode} after {uptime:.0f}s, restarting")
+                if uptime < 10:
+                    # crash loop (bad config, browser cannot start) → do not spin
+                    await asyncio.sleep(10)
+                self._spawn(index)
+
+    def alive(self) -> int:
+        return sum(1 for p in self._procs.values() if p.is_alive())
+
+    async def stop(self, timeout: float = 20.0):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for p in self._procs.values():
+            if p.is_alive():
+                p.terminate()  # SIGTERM → graceful shutdown in the child
+        deadline = time.monotonic() + timeout
+        for p in self._procs.values():
+            await asyncio.to_thread(p.join, max(0.0, deadline - time.monotonic()))
+            if p.is_alive():
+                print(f"[supervisor] {p.name} did not stop in time, killing")
+                p.kill()
+                await asyncio.to_thread(p.join, 5)
+        self._procs.clear()
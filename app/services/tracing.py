@@ -0,0 +1,49 @@
+import json, logging, os, secrets
+from logging.handlers import WatchedFileHandler
+from typing import Any, Dict, Optional
+from app.config import settings
+from app.services.sharekit.spans import Trace
+
+_span_logger: Optional[logging.Logger] = None
+
+
+def new_trace_id() -> str:
+    """شناسهٔ کوتاه پیگیری که موقع ثبت job ساخته و به کاربر نشان داده می‌شود"""
+    length = max(4, int(getattr(settings, "TRACE_ID_LENGTH", 8)))
+    return secrets.token_hex((length + 1) // 2)[:length]
+
+
+def _get_span_logger() -> Optional[logging.Logger]:
+    """
+    هر span یک خط JSON در TRACE_LOG_PATH (خالی → خاموش).
+    WatchedFileHandler: چند پروسه (supervisor mode) روی یک فایل append می‌کنند و logrotate بیرونی هم کار می‌کند.
+    """
+    global _span_logger
+    if _span_logger is not None:
+        return _span_logger if _span_logger.handlers else None
+    _span_logger = logging.getLogger("u2s.spans")
+    _span_logger.propagate = False
+    _span_logger.setLevel(logging.INFO)
+    path = str(getattr(settings, "TRACE_LOG_PATH", "") or "")
+    if not path:
+        return None
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        handler = WatchedFileHandler(path, encoding="utf-8")
+    except OSError as e:
+        print(f"[tracing] span log disabled: {e!r}")
+        return None
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    _span_logger.addHandler(handler)
+    return _span_logger
+
+
+def _log_span(event: Dict[str, Any]):
+    logger = _get_span_logger()
+    if logger is not None:
+        logger.info(json.dumps(event, ensure_ascii=False, default=str))
+
+
+def start_trace(trace_id: Optional[str] = None, **tags) -> Trace:
+    """Trace یک job با sink لاگ JSON؛ بدون trace_id (jobهای قدیمی) یک شناسهٔ تازه ساخته می‌شود"""
+    return Trace(trace_id or new_trace_id(), sink=_log_span, **tags)
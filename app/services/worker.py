@@ -1,90 +1,542 @@
-import asyncio, time, traceback, json
+import asyncio, time, traceback, os, socket
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
 from aiogram import Bot
-from aiogram.types import BufferedInputFile
-from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile, FSInputFile
+from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError, TelegramRetryAfter, TelegramServerError
 from app.config import settings
-from app.services.db import next_queued_job, complete_job
+from app.services.db import claim_jobs, heartbeat_jobs, requeue_expired_jobs, complete_job, defer_jobs
 from app.services.sharekit.core import ShareKit
+from app.services.sharekit.contexts import get_context_pool
+from app.services.sharekit.spool import discard_item
+from app.services.sharekit.deadline import DeadlineExceeded
 from app.services.alerts import AdminAlerter
+from app.services.notify import job_notifier
+from app.services.result_cache import result_cache, capture_key
+from app.services.parse import capture_options
+from app.services.domains import domain_guard, domain_of, BUSY, OPEN
+from app.services.tracing import Trace, start_trace
+from app.services.metrics import (
+    CAPTURE_LATENCY, DELIVERY_LATENCY, JOB_LATENCY, JOB_PICKUP, JOBS, WORKERS, WORKERS_BUSY,
+)
 
-async def job_worker(worker_id: int, bot: Bot):
-    kit = ShareKit(settings)
-    alerter = AdminAlerter(bot, settings)
-    print(f"[worker:{worker_id}] started.")
+class JobFeed:
+    """
+    Process-wide job source for all job_worker coroutines.
+    Claims up to JOB_CLAIM_BATCH jobs per DB transaction (never more than there
+    are idle workers), hands them out locally, and keeps their leases alive
+    with a heartbeat until release() is called. Queued jobs with the same
+    capture_key ride along as "followers" of the job they coalesce with.
+    """
+
+    def __init__(self, owner: Optional[str] = None):
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.batch = max(1, int(getattr(settings, "JOB_CLAIM_BATCH", 4)))
+        self.lease_sec = max(10, int(getattr(settings, "JOB_LEASE_SEC", 120)))
+        self.max_followers = max(0, int(getattr(settings, "COALESCE_MAX_FOLLOWERS", 50)))
+        self.held: Set[int] = set()
+        self._buf: deque = deque()
+        self._lock = asyncio.Lock()
+        self._waiting = 0
+        self._hb_task: Optional[asyncio.Task] = None
+
+    async def next(self) -> Optional[dict]:
+        if self._buf:
+            return self._buf.popleft()
+        self._waiting += 1
+        try:
+            async with self._lock:
+                if self._buf:
+                    return self._buf.popleft()
+                jobs = await claim_jobs(
+                    self.owner, min(self.batch, self._waiting), self.lease_sec, self.max_followers
+                )
+                for job in jobs:
+                    self.held.add(job["id"])
+                    self.held.update(f["id"] for f in job.get("followers", []))
+                self._buf.extend(jobs)
+                self._ensure_heartbeat()
+                return self._buf.popleft() if self._buf else None
+        finally:
+            self._waiting -= 1
+
+    def release(self, job_id: int):
+        self.held.discard(job_id)
+
+    async def close(self):
+        """heartbeat را متوقف می‌کند؛ باید قبل از close_db صدا زده شود"""
+        task, self._hb_task = self._hb_task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def _ensure_heartbeat(self):
+        if self._hb_task is None or self._hb_task.done():
+            self._hb_task = asyncio.create_task(self._heartbeat_loop())
 
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.lease_sec / 3)
+            if not self.held:
+                continue
+            try:
+                await heartbeat_jobs(self.owner, list(self.held), self.lease_sec)
+            except Exception as e:
+                print(f"[feed:{self.owner}] heartbeat failed: {e!r}")
+
+
+_feed: Optional[JobFeed] = None
+
+
+def get_job_feed() -> JobFeed:
+    global _feed
+    if _feed is None:
+        _feed = JobFeed()
+    return _feed
+
+
+async def shutdown_job_feed():
+    global _feed
+    if _feed is not None:
+        await _feed.close()
+        _feed = None
+
+
+async def lease_reaper(bot: Optional[Bot] = None):
+    """کارهایی که lease آن‌ها منقضی شده (crash/restart) را دوباره در صف می‌گذارد"""
+    interval = max(1, int(getattr(settings, "JOB_REAPER_INTERVAL_SEC", 30)))
+    max_attempts = max(1, int(getattr(settings, "JOB_MAX_ATTEMPTS", 3)))
+    alerter = AdminAlerter(bot, settings) if bot else None
     while True:
-        job = next_queued_job()
-        if not job:
-            await asyncio.sleep(2)
-            continue
+        try:
+            requeued, failed = await requeue_expired_jobs(max_attempts)
+            if requeued:
+                print(f"[reaper] requeued {requeued} expired job(s)")
+                job_notifier.notify(requeued)
+            if failed:
+                print(f"[reaper] gave up on {failed} job(s) after {max_attempts} attempts")
+                if alerter:
+                    try:
+                        await alerter.send_warn("JobsAbandoned", f"{failed} job(s) failed after {max_attempts} lease expiries")
+                    except Exception:
+                        pass
+        except Exception as e:
+            print(f"[reaper] failed: {e!r}")
+        await asyncio.sleep(interval)
+
+
+# capture key → future of the delivered file_ids, for captures running in this process
+_inflight: Dict[str, asyncio.Future] = {}
 
-        job_id = job["id"]
-        user_id = job["user_id"]
-        url = job["url"]
-        t0 = time.time()
-        print(f"[worker:{worker_id}] picked job #{job_id} for user {user_id}: {url}")
 
+async def _send_retrying(call):
+    """
+    call() را اجرا می‌کند و همان ارسال را تکرار می‌کند (حداکثر SEND_RETRY_MAX بار)، نه کل job را:
+    با TelegramRetryAfter به اندازهٔ retry_after صبر می‌کند، با خطای گذرای شبکه/سرور تلگرام با backoff.
+    """
+    retries = max(0, int(getattr(settings, "SEND_RETRY_MAX", 3)))
+    max_wait = int(getattr(settings, "SEND_RETRY_MAX_WAIT_SEC", 60))
+    for attempt in range(retries + 1):
         try:
-            # خواندن پارامترهای کاربر از params_json
+            return await call()
+        except TelegramRetryAfter as e:
+            if attempt >= retries or e.retry_after > max_wait:
+                raise
+            await asyncio.sleep(e.retry_after)
+        except (TelegramNetworkError, TelegramServerError):
+            if attempt >= retries:
+                raise
+            await asyncio.sleep(min(2 ** attempt, max_wait))
+
+
+async def _send_cached(bot: Bot, user_id: int, parts: list) -> bool:
+    """ارسال دوباره با file_id تلگرام (بدون مرورگر و بدون آپلود مجدد)"""
+    for part in parts:
+        await _send_retrying(lambda: bot.send_document(
+            user_id,
+            part["file_id"],
+            caption=part.get("caption"),
+            disable_content_type_detection=True,
+        ))
+    return True
+
+
+async def _read_ahead(items: AsyncIterator[dict], depth: int = 1) -> AsyncIterator[dict]:
+    """
+    capture_iter را در یک task جدا جلو می‌برد تا رندر part بعدی همزمان با آپلود part فعلی انجام شود؛
+    صف محدود است پس حداکثر depth+1 part در حافظه می‌ماند.
+    """
+    q: asyncio.Queue = asyncio.Queue(maxsize=max(1, depth))
+    end = object()
+
+    async def produce():
+        try:
+            async for item in items:
+                await q.put(item)
+            await q.put(end)
+        except Exception as e:
+            await q.put(e)
+        finally:
+            await items.aclose()
+
+    task = asyncio.create_task(produce())
+    try:
+        while True:
+            item = await q.get()
+            if item is end:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        if not task.done():
+            task.cancel()
             try:
-                opts = json.loads(job.get("params_json") or "{}")
-            except Exception:
-                opts = {}
-
-            device = "desktop" if opts.get("desktop") else "mobile"
-            force_slice = bool(opts.get("slice", False))
-            full_page = bool(opts.get("full", False))
-            pdf = bool(opts.get("pdf", False))
-            delay_ms = int(opts.get("delay_ms")) if str(opts.get("delay_ms", "")).isdigit() else None
-
-            # فراخوانی ShareKit.capture با فلگ‌های واقعی
-            items = await kit.capture(
-                url,
-                device=device,
-                full_page=full_page,
-                force_slice=force_slice,
-                pdf=pdf,
-                delay_ms=delay_ms,
-            )
+                await task
+            except asyncio.CancelledError:
+                pass
+        # partهایی که رندر شدند ولی مصرف نشدند (خطا/قطع) → فایل spool پاک شود
+        while not q.empty():
+            item = q.get_nowait()
+            if isinstance(item, dict):
+                discard_item(item)
 
-            sent_any = False
-            total = len(items)
-            for idx, it in enumerate(items, start=1):
-                data = it["data"]
-                filename = it.get("file_name") or ("page.pdf" if pdf else f"screenshot_{job_id}_{idx:02d}.png")
-                try:
-                    await bot.send_document(
+
+async def _watch_outcome(items: AsyncIterator[dict], outcome: Dict[str, bool]) -> AsyncIterator[dict]:
+    """capture_iter را عبور می‌دهد و ok/خطای خود capture (نه آپلود) را برای domain guard ثبت می‌کند"""
+    try:
+        async for item in items:
+            yield item
+        outcome["ok"] = True
+    except Exception:
+        outcome["ok"] = False
+        raise
+    finally:
+        await items.aclose()
+
+
+async def _iter_list(items: list) -> AsyncIterator[dict]:
+    for it in items:
+        yield it
+
+
+async def _upload(bot: Bot, alerter: AdminAlerter, worker_id: int, job: dict, items, pdf: bool, trace: Trace,
+                  keep: Optional[list] = None, cleanup: bool = True):
+    """
+    آپلود bytes برای یک کاربر، part به part به محض آماده شدن؛ (sent_any, file_id parts یا None) برمی‌گرداند.
+    items: لیست یا async iterator (capture_iter). اگر keep داده شود partها برای followerها نگه داشته می‌شوند،
+    وگرنه (با cleanup) فایل spool هر part بعد از ارسال پاک می‌شود.
+    """
+    job_id, user_id = job["id"], job["user_id"]
+    sent_any = False
+    delivered = []
+    total = 0
+    stream = items if hasattr(items, "__aiter__") else _iter_list(items)
+    try:
+        async for it in stream:
+            idx = it.get("part") or total + 1
+            total = max(total, it.get("total") or idx)
+            if keep is not None:
+                keep.append(it)
+            filename = it.get("file_name") or ("page.pdf" if pdf else f"screenshot_{job_id}_{idx:02d}.png")
+            caption = f"Part {idx}/{total}" if total > 1 else None
+            # spooled parts stream from disk, small ones go from memory
+            document = FSInputFile(it["path"], filename) if "path" in it else BufferedInputFile(it["data"], filename)
+            try:
+                with trace.span("send", job_id=job_id, part=idx):
+                    msg = await _send_retrying(lambda: bot.send_document(
                         user_id,
-                        BufferedInputFile(data, filename),
-                        caption=(f"Part {idx}/{total}" if total > 1 else None),
+                        document,
+                        caption=caption,
                         disable_content_type_detection=True,
+                    ))
+                sent_any = True
+                if msg.document:
+                    delivered.append({"file_id": msg.document.file_id, "file_name": filename, "caption": caption})
+            except TelegramBadRequest as e:
+                print(f"[worker:{worker_id}] send_document failed for job {job_id}: {e!r}")
+                try:
+                    await alerter.send_error("SendDocumentFailed", str(e), url=job["url"], user_id=user_id,
+                                             trace_id=_trace_id(job, trace), worker=str(worker_id))
+                except Exception:
+                    pass
+            except Exception as e:
+                # بعد از تلاش‌های دوباره فقط همین part از دست می‌رود؛ خطا به _read_ahead نمی‌رسد،
+                # پس capture (و partهای بعدی و followerها) ادامه پیدا می‌کند
+                print(f"[worker:{worker_id}] send_document failed for job {job_id} part {idx}: {e!r}")
+            finally:
+                if cleanup and keep is None:
+                    discard_item(it)
+            del document, it
+    finally:
+        await stream.aclose()
+    return sent_any, (delivered if total and len(delivered) == total else None)
+
+
+def _trace_id(job: dict, trace: Trace) -> str:
+    """کد پیگیری خود کاربر (follower ها کد خودشان را دارند، capture با trace اصلی ثبت می‌شود)"""
+    return job.get("trace_id") or trace.trace_id
+
+
+def _metrics(stats: Dict[str, Any], trace: Trace, job: dict) -> Dict[str, Any]:
+    """آمار capture + مدت هر مرحله (ms) برای jobs.metrics_json"""
+    m = dict(stats, trace_id=_trace_id(job, trace), stages_ms=trace.stage_ms(), total_ms=trace.elapsed_ms())
+    if m["trace_id"] != trace.trace_id:
+        m["capture_trace_id"] = trace.trace_id
+    return m
+
+
+async def _complete(feed: JobFeed, job: dict, ok: bool, outcome: str, trace: Trace, stats: Dict[str, Any],
+                    error: Optional[str] = None) -> bool:
+    """complete_job با metrics_json، و ثبت نتیجه/زمان کل job برای /metrics"""
+    done = await complete_job(job["id"], ok=ok, error=error, worker_id=feed.owner, metrics=_metrics(stats, trace, job))
+    # job که قبلاً بسته شده (یا lease آن از دست رفته) دوباره شمرده نمی‌شود
+    if done:
+        JOBS.inc(outcome=outcome)
+        if job.get("created_at"):
+            JOB_LATENCY.observe(max(0.0, time.time() - job["created_at"]), outcome=outcome)
+    return done
+
+
+async def _notify_partial(bot: Bot, job: dict, stats: Dict[str, Any]):
+    """وقتی deadline فقط به بخشی از صفحه رسید، کاربر بداند که بقیه ارسال نمی‌شود"""
+    if not stats.get("partial"):
+        return
+    try:
+        await bot.send_message(
+            job["user_id"],
+            "⏱ صفحه در زمان مجاز کامل رندر نشد؛ فقط بخش‌های بالا ارسال شد."
+        )
+    except Exception:
+        pass
+
+
+async def _deliver_cached(bot: Bot, feed: JobFeed, worker_id: int, jobs: List[dict], parts: list,
+                          trace: Trace) -> List[dict]:
+    """
+    ارسال file_idها به همهٔ jobها؛ jobهایی که ارسالشان شکست خورد برگردانده می‌شوند.
+    job تحویل‌شده همان لحظه از jobs (همان لیست pending) حذف می‌شود، تا اگر خطای دیگری
+    (RetryAfter، شبکه) وسط حلقه بالا رفت، handler بیرونی آن را دوباره failed نکند.
+    """
+    for job in list(jobs):
+        try:
+            with trace.span("send_cached", job_id=job["id"], parts=len(parts)):
+                await _send_cached(bot, job["user_id"], parts)
+        except TelegramBadRequest as e:
+            # file_id دیگر معتبر نیست → برای این کاربر دوباره capture/آپلود می‌شود
+            print(f"[worker:{worker_id}] cached send failed for job {job['id']}: {e!r}")
+            continue
+        except Exception as e:
+            # خطای ارسال برای همین کاربر؛ بقیهٔ jobها ادامه می‌دهند
+            print(f"[worker:{worker_id}] cached send failed for job {job['id']}: {e!r}")
+            jobs.remove(job)
+            await _complete(feed, job, False, "send_failed", trace, {"cached": True}, error=f"send failed: {e!r}"[:300])
+            continue
+        jobs.remove(job)
+        await _complete(feed, job, True, "cached", trace, {"cached": True})
+    return jobs
+
+
+async def _run_group(worker_id: int, bot: Bot, kit: ShareKit, alerter: AdminAlerter, feed: JobFeed, group: List[dict]):
+    """
+    یک capture برای همهٔ jobهای هم‌کلید (coalesced) و تحویل جداگانه به هر کاربر.
+    group[0] = job اصلی، بقیه followerها با همان capture_key.
+    """
+    lead = group[0]
+    url = lead["url"]
+    t0 = time.time()
+    opts = capture_options(lead.get("params_json"))
+    pdf = opts["pdf"]
+    key = lead.get("capture_key") or capture_key(url, opts)
+    pending = list(group)
+    stats: Dict[str, Any] = {}      # آمار capture (blocking، readiness، render plan) → jobs.metrics_json
+    # spanهای هر مرحله با کد پیگیری job اصلی → لاگ JSON و metrics_json
+    trace = start_trace(lead.get("trace_id"), job_id=lead["id"], worker=f"{feed.owner}/{worker_id}")
+    if lead.get("started_at") and lead.get("created_at"):
+        trace.add("queue_wait", (lead["started_at"] - lead["created_at"]) * 1000)
+        for job in group:
+            # فقط اولین claim؛ job برگشتی (defer یا lease منقضی) زمان انتظارش قبلاً ثبت شده
+            if job.get("available_at") or job.get("attempts"):
+                continue
+            JOB_PICKUP.observe(max(0, (job.get("started_at") or 0) - (job.get("created_at") or 0)))
+    tid = trace.trace_id
+    print(f"[worker:{worker_id}] [{tid}] picked job #{lead['id']} (+{len(group) - 1} coalesced) for user {lead['user_id']}: {url}")
+
+    try:
+        # 🔹 cache hit یا همین capture در حال اجرا در همین پروسه → ارسال با file_id
+        parts = result_cache.get(key)
+        if parts is None and key in _inflight:
+            with trace.span("inflight_wait"):
+                parts = await asyncio.shield(_inflight[key])
+        if parts:
+            pending = await _deliver_cached(bot, feed, worker_id, pending, parts, trace)
+            if not pending:
+                print(f"[worker:{worker_id}] [{tid}] job #{lead['id']} served from cache in {time.time()-t0:.1f}s")
+                return
+
+        # 🔹 سقف هم‌زمانی هر دامنه و circuit breaker: worker پشت سایت کند/مرده نمی‌ماند
+        domain = domain_of(url)
+        verdict = domain_guard.try_acquire(domain)
+        if verdict == BUSY:
+            delay = max(1, int(getattr(settings, "DOMAIN_DEFER_SEC", 15)))
+            await defer_jobs(feed.owner, [j["id"] for j in pending], delay)
+            asyncio.get_running_loop().call_later(delay, job_notifier.notify, 1)
+            print(f"[worker:{worker_id}] [{tid}] job #{lead['id']} deferred {delay}s: {domain} at its concurrency cap")
+            return
+        if verdict == OPEN:
+            print(f"[worker:{worker_id}] [{tid}] job #{lead['id']} rejected: circuit open for {domain}")
+            for job in pending:
+                try:
+                    await bot.send_message(
+                        job["user_id"],
+                        "⛔️ این سایت در حال حاضر پاسخ نمی‌دهد. چند دقیقه دیگر دوباره امتحان کنید.\n"
+                        f"کد پیگیری: {_trace_id(job, trace)}"
                     )
-                    sent_any = True
-                except TelegramBadRequest as e:
-                    print(f"[worker:{worker_id}] send_document failed for job {job_id}: {e!r}")
+                except Exception:
+                    pass
+                await _complete(feed, job, False, "circuit_open", trace, stats, error=f"circuit open for {domain}")
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        owns_inflight = key not in _inflight
+        if owns_inflight:
+            _inflight[key] = fut
+        parts = None
+        items: Optional[list] = None
+        outcome: Dict[str, bool] = {}
+        try:
+            # یک capture برای کل گروه؛ partها همزمان با رندر بقیهٔ صفحه به کاربر اول آپلود می‌شوند
+            job = pending[0]
+            items = [] if len(pending) > 1 else None
+            sent_any, parts = await _upload(
+                bot, alerter, worker_id, job,
+                _read_ahead(_watch_outcome(kit.capture_iter(url, stats=stats, trace=trace, **opts), outcome)),
+                pdf, trace, keep=items
+            )
+            if sent_any:
+                await _notify_partial(bot, job, stats)
+            if parts:
+                # فقط نتیجهٔ کامل cache می‌شود؛ bytes دیگر لازم نیست
+                result_cache.put(key, parts)
+                for it in items or ():
+                    discard_item(it)
+                items = None
+            mode = "pdf" if pdf else stats.get("mode", "-")
+            if stats.get("elapsed_ms") is not None:
+                CAPTURE_LATENCY.observe(stats["elapsed_ms"] / 1000, device=opts["device"], mode=mode)
+            DELIVERY_LATENCY.observe(trace.stage_ms().get("send", 0) / 1000, device=opts["device"], mode=mode)
+            await _complete(feed, job, sent_any, "done" if sent_any else "send_failed", trace, stats,
+                            error=None if sent_any else "send failed")
+            pending.pop(0)
+
+            while pending:
+                job = pending[0]
+                sent_any = False
+                send_error = None
+                if parts:
                     try:
-                        await alerter.send_error("SendDocumentFailed", str(e), url=url, user_id=user_id)
-                    except Exception:
+                        with trace.span("send_cached", job_id=job["id"], parts=len(parts)):
+                            await _send_cached(bot, job["user_id"], parts)
+                        sent_any = True
+                    except TelegramBadRequest:
                         pass
+                    except Exception as e:
+                        # فقط همین follower ناموفق می‌شود؛ capture سالم است و بقیه ادامه می‌دهند
+                        print(f"[worker:{worker_id}] [{tid}] send to job #{job['id']} failed: {e!r}")
+                        send_error = e
+                if not sent_any and items and send_error is None:
+                    sent_any, _ = await _upload(bot, alerter, worker_id, job, items, pdf, trace, cleanup=False)
+                    if sent_any:
+                        await _notify_partial(bot, job, stats)
+                await _complete(feed, job, sent_any, "done" if sent_any else "send_failed", trace, stats,
+                                error=None if sent_any else "send failed")
+                pending.pop(0)
+        finally:
+            for it in items or ():
+                discard_item(it)
+            if owns_inflight:
+                _inflight.pop(key, None)
+                fut.set_result(parts)
+            if domain_guard.release(domain, outcome.get("ok")):
+                print(f"[worker:{worker_id}] circuit opened for {domain}")
+                try:
+                    await alerter.send_warn("DomainCircuitOpen", f"{domain}: too many failed captures, failing fast for a while",
+                                            url=url, trace_id=tid)
+                except Exception:
+                    pass
 
-            # ❗ complete_job همگام (sync) است → نباید await شود
-            complete_job(job_id, ok=sent_any, error=None if sent_any else "send failed")
-            print(f"[worker:{worker_id}] job #{job_id} done in {time.time()-t0:.1f}s")
+        stages = sorted(trace.stage_ms().items(), key=lambda kv: -kv[1])[:4]
+        print(
+            f"[worker:{worker_id}] [{tid}] job #{lead['id']} done for {len(group)} user(s) in {time.time()-t0:.1f}s "
+            f"({', '.join(f'{name} {ms}ms' for name, ms in stages)}; "
+            f"blocked {stats.get('blocked', 0)}/{stats.get('requests', 0) + stats.get('blocked', 0)} requests, "
+            f"{stats.get('bytes_loaded', 0) // 1024} KiB loaded, ready after {stats.get('ready_ms', '-')} ms, "
+            f"dsf {stats.get('dsf', '-')}, {stats.get('raster_px_saved', 0) / 1e6:.1f} MP raster saved)"
+        )
 
-        except Exception as e:
-            tb = traceback.format_exc()
-            print(f"[worker:{worker_id}] job #{job_id} FAILED: {e}\n{tb}")
+    except DeadlineExceeded as e:
+        # سایت کند است، نه خطای برنامه → بدون traceback و هشدار ادمین (circuit breaker حسابش را دارد)
+        print(f"[worker:{worker_id}] [{tid}] job #{lead['id']} timed out during {e.stage} after {time.time()-t0:.1f}s "
+              f"{trace.stage_ms()}")
+        for job in pending:
             try:
                 await bot.send_message(
-                    user_id,
-                    f"❌ خطا در گرفتن اسکرین‌شات:\n`{str(e)[:300]}`",
-                    parse_mode="Markdown"
+                    job["user_id"],
+                    "⏱ این صفحه در زمان مجاز بارگذاری نشد. کمی بعد دوباره امتحان کنید.\n"
+                    f"کد پیگیری: {_trace_id(job, trace)}"
                 )
             except Exception:
                 pass
+            await _complete(feed, job, False, "timeout", trace, stats, error=str(e))
+
+    except Exception as e:
+        tb = traceback.format_exc()
+        print(f"[worker:{worker_id}] [{tid}] job #{lead['id']} FAILED: {e}\n{tb}")
+        try:
+            await alerter.send_error("WorkerCaptureFailed", str(e), url=url, user_id=lead["user_id"], trace_id=tid,
+                                     worker=f"{feed.owner}/{worker_id}", job_age=time.time() - (lead.get("created_at") or t0))
+        except Exception:
+            pass
+        for job in pending:
             try:
-                await alerter.send_error("WorkerCaptureFailed", str(e), url=url, user_id=user_id, traceback=tb)
+                await bot.send_message(
+                    job["user_id"],
+                    f"❌ خطا در گرفتن اسکرین‌شات:\n`{str(e)[:300]}`\nکد پیگیری: `{_trace_id(job, trace)}`",
+                    parse_mode="Markdown"
+                )
             except Exception:
                 pass
-            # ❗ این‌جا هم بدون await
-            complete_job(job_id, ok=False, error=str(e))
+            await _complete(feed, job, False, "failed", trace, stats, error=str(e))
+
+
+async def job_worker(worker_id: int, bot: Bot, feed: Optional[JobFeed] = None):
+    kit = ShareKit(settings, contexts=get_context_pool(settings))
+    alerter = AdminAlerter(bot, settings)
+    feed = feed or get_job_feed()
+    poll_fallback = float(getattr(settings, "JOB_POLL_FALLBACK_SEC", 30))
+    print(f"[worker:{worker_id}] started.")
+    WORKERS.inc()
+
+    try:
+        while True:
+            job = await feed.next()
+            if not job:
+                # بیدار شدن با enqueue؛ polling فقط به‌عنوان fallback کند
+                await job_notifier.wait(timeout=poll_fallback)
+                continue
+
+            group = [job] + job.pop("followers", [])
+            WORKERS_BUSY.inc()
+            try:
+                await _run_group(worker_id, bot, kit, alerter, feed, group)
+            except Exception as e:
+                print(f"[worker:{worker_id}] job #{job['id']} crashed: {e!r}")
+            finally:
+                WORKERS_BUSY.dec()
+                for j in group:
+                    feed.release(j["id"])
+    finally:
+        WORKERS.dec()
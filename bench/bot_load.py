@@ -0,0 +1,428 @@
+"""
+End-to-end load harness for the bot: synthetic Telegram updates →
+Dispatcher (shot router) → queue → job_worker → send_document, against a
+local mock Bot API session. Nothing talks to Telegram.
+
+    python -m bench.bot_load --users 2000 --workers 20
+    python -m bench.bot_load --users 300 --capture real          # real Chromium on bench fixtures
+    python -m bench.bot_load --users 2000 --retry-after-rate 0.02 --flood-every 10 --flood-duration 2
+
+The capture step is either stubbed (synthetic PNG parts after --capture-ms)
+or the real ShareKit against bench/fixtures.py. Reports enqueue latency
+(handler round trip), queue wait (enqueue → capture start), end-to-end
+delivery latency and throughput as JSON.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.base import BaseSession
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import Chat, Document, Message, Update, User
+from aiogram.types import BufferedInputFile, FSInputFile
+
+from app.config import settings
+from app.bot import build_dispatcher
+from app.middlewares.telegram_metrics import TelegramErrorMetrics
+from app.routers import shot
+from app.services import worker as worker_mod
+from app.services.db import init_db, close_db, get_queue_depth, upsert_user
+from app.services.notify import job_notifier
+from app.services.domains import domain_guard
+from app.services.sharekit.core import ShareKit
+from app.services.sharekit.contexts import get_context_pool, shutdown_context_pool
+from app.services.sharekit.pool import shutdown_browser_pool
+from app.services.sharekit.imaging import shutdown_image_pool
+from bench.capture_bench import BENCH_OVERRIDES, percentile
+from bench.fixtures import FixtureServer, png
+
+PART_RE = re.compile(r"Part (\d+)/(\d+)")
+FAILURE_PREFIXES = ("❌", "⏱ این صفحه", "⛔")
+
+
+class LoadStats:
+    """Timestamps per simulated user, filled by the mock session and the capture wrapper."""
+
+    def __init__(self):
+        self.enqueue_ms: List[float] = []
+        self.sent_at: Dict[int, float] = {}         # update handed to the dispatcher
+        self.enqueued_at: Dict[int, float] = {}     # handler (enqueue + reply) returned
+        self.url_of: Dict[int, str] = {}
+        self.capture_start: Dict[str, float] = {}
+        self.docs: Dict[int, int] = defaultdict(int)
+        self.done_at: Dict[int, float] = {}
+        self.failed: Dict[int, str] = {}
+        self.calls: Counter = Counter()
+        self.retry_after = 0
+        self.retry_after_at: Counter = Counter()    # chat_id → RetryAfters injected into its sends
+        self.handler_errors: Counter = Counter()
+        self.uploaded_bytes = 0
+        self.all_done = asyncio.Event()
+        self.expected = 0
+
+    def finish(self, chat_id: int, failure: Optional[str] = None):
+        if chat_id in self.done_at or chat_id not in self.sent_at:
+            return
+        self.done_at[chat_id] = time.perf_counter()
+        if failure:
+            self.failed[chat_id] = failure
+        if len(self.done_at) >= self.expected:
+            self.all_done.set()
+
+
+class MockTelegramSession(BaseSession):
+    """
+    Bot API stand-in: answers every method locally, records uploads, and can
+    inject TelegramRetryAfter either at random (rate) or in periodic flood
+    windows (every `flood_every` seconds for `flood_duration` seconds).
+    """
+
+    def __init__(self, stats: LoadStats, upload_ms: float = 0, retry_after_rate: float = 0.0,
+                 retry_after_sec: int = 1, flood_every: float = 0, flood_duration: float = 0, seed: int = 0):
+        super().__init__()
+        self.stats = stats
+        self.upload_ms = upload_ms
+        self.retry_after_rate = retry_after_rate
+        self.retry_after_sec = retry_after_sec
+        self.flood_every = flood_every
+        self.flood_duration = flood_duration
+        self._t0 = time.perf_counter()
+        self._rng = random.Random(seed)
+        self._ids = itertools.count(1)
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536,
+                             raise_for_status=True) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    def _flooding(self) -> bool:
+        if self.flood_every <= 0:
+            return False
+        return (time.perf_counter() - self._t0) % self.flood_every < self.flood_duration
+
+    def _message(self, chat_id: int, **fields) -> Message:
+        return Message(
+            message_id=next(self._ids),
+            date=datetime.now(timezone.utc),
+            chat=Chat(id=chat_id, type="private"),
+            **fields,
+        )
+
+    async def make_request(self, bot: Bot, method, timeout: Optional[int] = None):
+        name = type(method).__name__
+        self.stats.calls[name] += 1
+        chat_id = getattr(method, "chat_id", None)
+        if name in ("SendDocument", "SendMessage") and (
+            self._flooding() or (self.retry_after_rate and self._rng.random() < self.retry_after_rate)
+        ):
+            self.stats.retry_after += 1
+            if chat_id is not None:
+                self.stats.retry_after_at[chat_id] += 1
+            raise TelegramRetryAfter(
+                method=method, message=f"Too Many Requests: retry after {self.retry_after_sec}",
+                retry_after=self.retry_after_sec,
+            )
+
+        if name == "GetMe":
+            return User(id=1, is_bot=True, first_name="bench", username="bench_bot")
+        if name == "SendDocument":
+            doc = method.document
+            if isinstance(doc, BufferedInputFile):
+                size = len(doc.data)
+            elif isinstance(doc, FSInputFile):
+                size = os.path.getsize(doc.path)
+            else:
+                size = 0        # cached send by file_id
+            self.stats.uploaded_bytes += size
+            if self.upload_ms:
+                await asyncio.sleep(self.upload_ms / 1000 * (1 + size / 1_000_000))
+            self.stats.docs[chat_id] += 1
+            m = PART_RE.search(method.caption or "")
+            total = int(m.group(2)) if m else 1
+            if self.stats.docs[chat_id] >= total:
+                self.stats.finish(chat_id)
+            n = next(self._ids)
+            return self._message(chat_id, document=Document(
+                file_id=f"mock-file-{n}", file_unique_id=f"u{n}",
+                file_name=getattr(doc, "filename", None), file_size=size or None,
+            ))
+        if name == "SendMessage":
+            text = method.text or ""
+            if text.startswith(FAILURE_PREFIXES):
+                self.stats.finish(chat_id, failure=text.splitlines()[0][:80])
+            return self._message(chat_id, text=text)
+        return True
+
+
+class StubKit:
+    """Stands in for ShareKit: `parts` synthetic PNGs spread over `capture_ms`, no browser."""
+
+    capture_ms = 500
+    parts = 3
+    stats: LoadStats = None
+
+    def __init__(self, s, contexts=None):
+        self.s = s
+
+    async def capture_iter(self, url: str, *, stats: Optional[Dict[str, Any]] = None, trace=None, **opts):
+        self.stats.capture_start.setdefault(url, time.perf_counter())
+        t0 = time.perf_counter()
+        try:
+            for i in range(1, self.parts + 1):
+                await asyncio.sleep(self.capture_ms / 1000 / self.parts)
+                yield {"data": png(i, 256, 256), "file_name": f"screenshot_{i:02d}.png",
+                       "mime": "image/png", "part": i, "total": self.parts}
+        finally:
+            if stats is not None:
+                stats.update(mode="slice", parts=self.parts, elapsed_ms=int((time.perf_counter() - t0) * 1000))
+
+
+class TimedKit(ShareKit):
+    """Real ShareKit that also records when each URL's capture started."""
+
+    stats: LoadStats = None
+
+    async def capture_iter(self, url: str, **kwargs):
+        self.stats.capture_start.setdefault(url, time.perf_counter())
+        async for item in super().capture_iter(url, **kwargs):
+            yield item
+
+
+def apply_overrides(overrides: Dict[str, Any]):
+    """
+    Set harness values on the shared settings object, and on the singletons
+    that already read settings when app.services was imported above.
+    """
+    for k, v in overrides.items():
+        setattr(settings, k, v)
+    domain_guard.max_concurrency = max(0, int(settings.DOMAIN_MAX_CONCURRENCY))
+    job_notifier.max_pending = max(1, int(settings.WORKER_COUNT))
+    # in-process wakeups only: never poke workers of a real bot running on this host
+    job_notifier.socket_dir = ""
+
+
+def _update(bot: Bot, update_id: int, user_id: int, text: str) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            "text": text,
+        },
+    }, context={"bot": bot})
+
+
+async def run(args) -> Dict[str, Any]:
+    stats = LoadStats()
+    stats.expected = args.users
+
+    # harness-wide overrides on the shared settings object the app modules read
+    overrides = {
+        "SKIP_CHANNEL_CHECK": True,
+        "ADMIN_ALERTS_ENABLED": False,
+        "TRACE_LOG_PATH": "",
+        "WORKER_COUNT": args.workers,
+        "JOB_CLAIM_BATCH": args.claim_batch,
+    }
+    if args.capture == "real":
+        # fixtures are all on 127.0.0.1, so the per-domain cap would serialize everything
+        overrides.update(BENCH_OVERRIDES, DOMAIN_MAX_CONCURRENCY=0)
+    apply_overrides(overrides)
+
+    tmpdir = tempfile.mkdtemp(prefix="u2s-load-")
+    db_url = args.db or f"sqlite:///{os.path.join(tmpdir, 'load.db')}"
+    init_db(db_url)
+
+    session = MockTelegramSession(
+        stats, upload_ms=args.upload_ms, retry_after_rate=args.retry_after_rate,
+        retry_after_sec=args.retry_after_sec, flood_every=args.flood_every,
+        flood_duration=args.flood_duration, seed=args.seed,
+    )
+    session.middleware(TelegramErrorMetrics())
+    bot = Bot(token="123456:LOAD-TEST", session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    dp: Dispatcher = build_dispatcher()
+    dp.include_router(shot.router)
+
+    srv = None
+    if args.capture == "real":
+        srv = FixtureServer().start()
+        TimedKit.stats = stats
+        worker_mod.ShareKit = TimedKit
+        await get_context_pool(settings).start()
+    else:
+        StubKit.stats, StubKit.capture_ms, StubKit.parts = stats, args.capture_ms, args.parts
+        worker_mod.ShareKit = StubKit
+
+    job_notifier.listen()
+    workers = [asyncio.create_task(worker_mod.job_worker(i, bot)) for i in range(args.workers)]
+
+    user_ids = list(range(10_000_001, 10_000_001 + args.users))
+    for uid in user_ids:
+        await upsert_user({"id": uid, "first_name": f"user{uid}"}, channel_member=True)
+
+    def url_for(i: int, uid: int) -> str:
+        key = i % args.distinct_urls if args.distinct_urls else i
+        if srv is not None:
+            return f"{srv.url(args.scenario)}?k={key}"
+        # spread over hosts so the per-domain cap behaves like real traffic
+        return f"https://site{key % args.domains}.example/page/{key}"
+
+    sem = asyncio.Semaphore(args.feed_concurrency)
+    ids = itertools.count(1)
+
+    async def feed(i: int, uid: int):
+        url = url_for(i, uid)
+        async with sem:
+            stats.url_of[uid] = url
+            t0 = stats.sent_at[uid] = time.perf_counter()
+            try:
+                await dp.feed_update(bot, _update(bot, next(ids), uid, url))
+            except Exception as e:
+                # polling would log and drop it too; the job may already be queued (e.g. RetryAfter on the reply)
+                stats.handler_errors[type(e).__name__] += 1
+            t1 = time.perf_counter()
+        stats.enqueue_ms.append((t1 - t0) * 1000)
+        stats.enqueued_at[uid] = t1
+
+    t_start = time.perf_counter()
+    feeders = []
+    for i, uid in enumerate(user_ids):
+        feeders.append(asyncio.create_task(feed(i, uid)))
+        if args.rate > 0:
+            await asyncio.sleep(1 / args.rate)
+    await asyncio.gather(*feeders)
+    t_fed = time.perf_counter()
+
+    # done when every user got a final message, or when the queue is drained: a final
+    # message lost to an injected RetryAfter is not retried by the worker, so that user never "finishes"
+    timed_out = True
+    deadline = t_fed + args.timeout
+    while time.perf_counter() < deadline:
+        if stats.all_done.is_set() or await get_queue_depth() == 0:
+            timed_out = False
+            break
+        try:
+            await asyncio.wait_for(stats.all_done.wait(), 0.5)
+        except asyncio.TimeoutError:
+            pass
+    t_end = time.perf_counter()
+
+    for t in workers:
+        t.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+    await worker_mod.shutdown_job_feed()
+    job_notifier.close()
+    if srv is not None:
+        await shutdown_context_pool()
+        await shutdown_browser_pool()
+        shutdown_image_pool()
+        srv.stop()
+    await bot.session.close()
+    close_db()
+    shutil.rmtree(tmpdir, ignore_errors=True)
+
+    # a fast worker may start capturing before the handler's reply returns → clamp at 0
+    queue_wait = [
+        max(0.0, stats.capture_start[stats.url_of[u]] - stats.enqueued_at[u]) * 1000
+        for u in user_ids if u in stats.enqueued_at and stats.url_of.get(u) in stats.capture_start
+    ]
+    e2e = [(stats.done_at[u] - stats.sent_at[u]) * 1000 for u in stats.done_at if u not in stats.failed]
+    delivered = len(stats.done_at) - len(stats.failed)
+    # users that were hit by an injected RetryAfter and did not get their screenshots
+    retry_after_failures = sum(1 for u in stats.retry_after_at if u in stats.failed or u not in stats.done_at)
+    span = max(1e-9, (max(stats.done_at.values()) if stats.done_at else t_end) - t_start)
+
+    def dist(values: List[float]) -> Dict[str, float]:
+        return {"p50_ms": round(percentile(values, 0.5), 1), "p95_ms": round(percentile(values, 0.95), 1),
+                "max_ms": round(max(values), 1) if values else 0.0}
+
+    return {
+        "config": {k: v for k, v in vars(args).items()},
+        "users": args.users,
+        "delivered": delivered,
+        "failed": len(stats.failed),
+        "no_final_message": args.users - len(stats.done_at),
+        "timed_out": timed_out,
+        "failure_samples": Counter(stats.failed.values()).most_common(5),
+        "enqueue": dist(stats.enqueue_ms),
+        "enqueue_rate_per_sec": round(args.users / max(1e-9, t_fed - t_start), 1),
+        "queue_wait": dist(queue_wait),
+        "end_to_end": dist(e2e),
+        "jobs_per_sec": round(delivered / span, 2),
+        "documents_per_sec": round(stats.calls["SendDocument"] / span, 2),
+        "uploaded_mb": round(stats.uploaded_bytes / (1024 * 1024), 1),
+        "retry_after_injected": stats.retry_after,
+        "retry_after_users": len(stats.retry_after_at),
+        "retry_after_failures": retry_after_failures,
+        "handler_errors": dict(stats.handler_errors),
+        "api_calls": dict(stats.calls),
+        "wall_sec": round(t_end - t_start, 2),
+    }
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Bot load harness with a mock Telegram Bot API (no network).")
+    p.add_argument("--users", type=int, default=1000, help="simulated users, one URL request each")
+    p.add_argument("--workers", type=int, default=int(getattr(settings, "WORKER_COUNT", 5)))
+    p.add_argument("--claim-batch", type=int, default=int(getattr(settings, "JOB_CLAIM_BATCH", 4)))
+    p.add_argument("--db", default="", help="queue DATABASE_URL, e.g. memory:// (default: fresh sqlite file in a temp dir)")
+    p.add_argument("--rate", type=float, default=0, help="updates per second (0 = as fast as possible)")
+    p.add_argument("--feed-concurrency", type=int, default=200, help="updates handled at once by the dispatcher")
+    p.add_argument("--distinct-urls", type=int, default=0, help="0 = one URL per user; N = reuse N URLs (coalescing/cache)")
+    p.add_argument("--domains", type=int, default=100, help="hosts the stub URLs are spread over")
+    p.add_argument("--capture", choices=("stub", "real"), default="stub")
+    p.add_argument("--capture-ms", type=float, default=500, help="stub capture duration")
+    p.add_argument("--parts", type=int, default=3, help="stub parts per capture")
+    p.add_argument("--scenario", default="short", help="fixture page for --capture real")
+    p.add_argument("--upload-ms", type=float, default=30, help="mock upload time per document (+ per MB)")
+    p.add_argument("--retry-after-rate", type=float, default=0.0, help="probability of RetryAfter per send")
+    p.add_argument("--retry-after-sec", type=int, default=1)
+    p.add_argument("--flood-every", type=float, default=0, help="start a RetryAfter flood window every N seconds")
+    p.add_argument("--flood-duration", type=float, default=0, help="length of each flood window in seconds")
+    p.add_argument("--timeout", type=float, default=600, help="give up waiting for deliveries after this")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", default="", help="write the JSON report here instead of stdout")
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    print(
+        f"[load] {report['delivered']}/{report['users']} delivered, {report['failed']} failed, "
+        f"{report['no_final_message']} without a final message, "
+        f"{report['retry_after_failures']}/{report['retry_after_users']} RetryAfter-hit users not delivered, "
+        f"{report['jobs_per_sec']} jobs/s, e2e p95 {report['end_to_end']['p95_ms']} ms, "
+        f"queue wait p95 {report['queue_wait']['p95_ms']} ms",
+        file=sys.stderr,
+    )
+    return 1 if report["timed_out"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""
+Offline benchmark of ShareKit.capture against the synthetic pages in
+bench/fixtures.py.
+
+    python -m bench.capture_bench --out bench/results.json
+    python -m bench.capture_bench --baseline bench/baseline.json --threshold 0.15
+
+For every scenario × mode × concurrency level it runs --repeat captures
+(`concurrency` at a time) and records p50/p95 latency, pages per minute,
+peak RSS of this process tree (Python + Chromium) and output bytes.
+With --baseline it compares p95 and pages/min per case and exits 1 when
+any case is worse than the threshold, so CI can gate on it.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.services.sharekit.core import ShareKit
+from app.services.sharekit.contexts import get_context_pool, shutdown_context_pool
+from app.services.sharekit.pool import shutdown_browser_pool
+from app.services.sharekit.imaging import shutdown_image_pool
+from app.services.sharekit.procmem import tree_rss_bytes
+from bench.fixtures import PAGES, FixtureServer
+
+MODES: Dict[str, Dict[str, Any]] = {
+    "mobile-full": {"device": "mobile", "full_page": True},
+    "mobile-slice": {"device": "mobile", "force_slice": True},
+    "desktop-full": {"device": "desktop", "full_page": True},
+    "desktop-slice": {"device": "desktop", "force_slice": True},
+    "pdf": {"device": "mobile", "pdf": True},
+}
+
+# fixtures live on 127.0.0.1; artifacts stay in memory so output bytes are measured directly
+BENCH_OVERRIDES = {
+    "BLOCK_PRIVATE_NETWORK": False,
+    "SPOOL_THRESHOLD_BYTES": 0,
+    "BROWSER_HEALTHCHECK_SEC": 0,
+}
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    k = (len(s) - 1) * p
+    lo, hi = int(k), min(int(k) + 1, len(s) - 1)
+    return s[lo] + (s[hi] - s[lo]) * (k - lo)
+
+
+class RssSampler:
+    """Peak RSS of this process and its children (Chromium), sampled in the background."""
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.peak = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            self.peak = max(self.peak, tree_rss_bytes(os.getpid()))
+            await asyncio.sleep(self.interval)
+
+    def __enter__(self):
+        self.peak = tree_rss_bytes(os.getpid())
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+
+async def run_case(kit: ShareKit, url: str, mode: str, concurrency: int, repeat: int) -> Dict[str, Any]:
+    opts = MODES[mode]
+    latencies: List[float] = []
+    out_bytes: List[int] = []
+    parts: List[int] = []
+    errors: List[str] = []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                items = await kit.capture(url, **opts)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}"[:200])
+                return
+            latencies.append((time.perf_counter() - t0) * 1000)
+            out_bytes.append(sum(len(it["data"]) if "data" in it else int(it.get("size", 0)) for it in items))
+            parts.append(len(items))
+
+    with RssSampler() as rss:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(repeat)))
+        wall = time.perf_counter() - t0
+
+    return {
+        "runs": repeat,
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "p50_ms": round(percentile(latencies, 0.50), 1),
+        "p95_ms": round(percentile(latencies, 0.95), 1),
+        "pages_per_min": round(len(latencies) / wall * 60, 2) if wall > 0 else 0.0,
+        "peak_rss_mb": round(rss.peak / (1024 * 1024), 1),
+        "output_bytes_avg": int(sum(out_bytes) / len(out_bytes)) if out_bytes else 0,
+        "parts_avg": round(sum(parts) / len(parts), 2) if parts else 0,
+    }
+
+
+def case_key(r: Dict[str, Any]) -> str:
+    return f"{r['scenario']}/{r['mode']}/c{r['concurrency']}"
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], threshold: float) -> List[str]:
+    """Cases whose p95 grew or whose throughput dropped by more than `threshold` (0.15 = 15%)."""
+    base = {case_key(r): r for r in baseline}
+    regressions = []
+    for r in results:
+        b = base.get(case_key(r))
+        if not b:
+            continue
+        if r["errors"] > b.get("errors", 0):
+            regressions.append(f"{case_key(r)}: errors {b.get('errors', 0)} → {r['errors']}")
+        if b.get("p95_ms") and r["p95_ms"] > b["p95_ms"] * (1 + threshold):
+            regressions.append(f"{case_key(r)}: p95 {b['p95_ms']} → {r['p95_ms']} ms")
+        if b.get("pages_per_min") and r["pages_per_min"] < b["pages_per_min"] * (1 - threshold):
+            regressions.append(f"{case_key(r)}: pages/min {b['pages_per_min']} → {r['pages_per_min']}")
+    return regressions
+
+
+async def main(args) -> int:
+    s = settings.model_copy(update=BENCH_OVERRIDES)
+    scenarios = args.scenarios.split(",") if args.scenarios else list(PAGES)
+    modes = args.modes.split(",") if args.modes else list(MODES)
+    levels = [int(c) for c in args.concurrency.split(",")]
+    for name in scenarios:
+        if name not in PAGES:
+            raise SystemExit(f"unknown scenario {name!r} (have: {', '.join(PAGES)})")
+    for mode in modes:
+        if mode not in MODES:
+            raise SystemExit(f"unknown mode {mode!r} (have: {', '.join(MODES)})")
+
+    results: List[Dict[str, Any]] = []
+    with FixtureServer() as srv:
+        contexts = get_context_pool(s)
+        await contexts.start()
+        kit = ShareKit(s, contexts=contexts)
+        try:
+            # one throwaway capture so browser/context/image-pool start-up is not in the first case
+            await kit.capture(srv.url("short"), device="mobile")
+            for name in scenarios:
+                for mode in modes:
+                    for c in levels:
+                        r = {"scenario": name, "mode": mode, "concurrency": c}
+                        r.update(await run_case(kit, srv.url(name), mode, c, max(args.repeat, c)))
+                        results.append(r)
+                        print(
+                            f"[bench] {case_key(r):<28} p50 {r['p50_ms']:>8} ms  p95 {r['p95_ms']:>8} ms  "
+                            f"{r['pages_per_min']:>7} pages/min  rss {r['peak_rss_mb']} MB  "
+                            f"{r['output_bytes_avg'] // 1024} KiB  errors {r['errors']}",
+                            file=sys.stderr,
+                        )
+        finally:
+            await shutdown_context_pool()
+            await shutdown_browser_pool()
+            shutdown_image_pool()
+
+    report = {
+        "meta": {
+            "ts": int(time.time()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "repeat": args.repeat,
+            "image_format": getattr(s, "DEFAULT_IMAGE_FORMAT", "png"),
+            "browser_pool_size": getattr(s, "BROWSER_POOL_SIZE", None),
+        },
+        "results": results,
+    }
+
+    code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline.get("results", []), args.threshold)
+        report["regressions"] = regressions
+        for line in regressions:
+            print(f"[bench] REGRESSION {line}", file=sys.stderr)
+        code = 1 if regressions else 0
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return code
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Offline ShareKit.capture benchmark (local fixture server, no network).")
+    p.add_argument("--scenarios", default="", help=f"comma list, default all: {','.join(PAGES)}")
+    p.add_argument("--modes", default="", help=f"comma list, default all: {','.join(MODES)}")
+    p.add_argument("--concurrency", default="1,4", help="comma list of parallel captures per case")
+    p.add_argument("--repeat", type=int, default=5, help="captures per case (at least the concurrency level)")
+    p.add_argument("--out", default="", help="write the JSON report here instead of stdout")
+    p.add_argument("--baseline", default="", help="earlier JSON report to compare against")
+    p.add_argument("--threshold", type=float, default=0.15, help="allowed relative slowdown before failing")
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,193 @@
+"""
+Synthetic pages for the capture benchmark, served from 127.0.0.1 by a stdlib
+HTTP server in a background thread. Everything a page needs (images, "API"
+calls) comes from the same server, so a run never touches the network.
+"""
+import json
+import struct
+import threading
+import time
+import zlib
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Tuple
+from urllib.parse import parse_qs, urlparse
+
+LOREM = (
+    "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt "
+    "ut labore et dolore magna aliqua. Ut enim ad minim veniam, quis nostrud exercitation ullamco. "
+)
+
+PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<style>
+  body {{ font: 16px/1.5 sans-serif; margin: 0; padding: 16px; color: #222; }}
+  section {{ margin: 0 0 24px; padding: 16px; border-radius: 8px; background: #f4f6f8; }}
+  img {{ display: block; width: 100%; height: 240px; object-fit: cover; margin: 8px 0; }}
+</style></head>
+<body>{body}</body></html>"""
+
+
+@lru_cache(maxsize=256)
+def png(seed: int, w: int = 64, h: int = 64) -> bytes:
+    """A solid-colour RGB PNG built with zlib only (no Pillow needed to serve fixtures)."""
+    r, g, b = (seed * 67) % 256, (seed * 131) % 256, (seed * 197) % 256
+    raw = b"".join(b"\x00" + bytes((r, g, b)) * w for _ in range(h))
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw, 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+def _sections(n: int, start: int = 0) -> str:
+    return "".join(
+        f"<section><h2>Section {i + 1}</h2><p>{LOREM * (2 + i % 4)}</p></section>" for i in range(start, start + n)
+    )
+
+
+def page_short(q) -> str:
+    return PAGE.format(title="short", body=_sections(2))
+
+
+def page_long(q) -> str:
+    # ~60 sections ≈ 25-30k CSS px on mobile
+    return PAGE.format(title="long", body=_sections(int(q.get("sections", 60))))
+
+
+def page_lazy(q) -> str:
+    n = int(q.get("images", 120))
+    delay = int(q.get("img_delay_ms", 40))
+    imgs = "".join(
+        f'<section><p>{LOREM}</p><img loading="lazy" src="/img/{i}.png?delay_ms={delay}" alt=""></section>'
+        for i in range(n)
+    )
+    return PAGE.format(title="lazy", body=imgs)
+
+
+def page_script(q) -> str:
+    # builds the DOM from JS, burns CPU on the main thread and keeps mutating for a while
+    body = """<div id="app"></div><script>
+      const t0 = performance.now();
+      while (performance.now() - t0 < 300) { Math.sqrt(Math.random()); }
+      const app = document.getElementById("app");
+      for (let i = 0; i < 4000; i++) {
+        const d = document.createElement("div");
+        d.textContent = "row " + i + " " + "x".repeat(i % 40);
+        d.style.padding = (i % 5) + "px";
+        app.appendChild(d);
+      }
+      let ticks = 0;
+      const iv = setInterval(() => {
+        app.children[ticks % app.children.length].style.color = ticks % 2 ? "#c00" : "#00c";
+        if (++ticks > 30) clearInterval(iv);
+      }, 50);
+    </script>"""
+    return PAGE.format(title="script", body=body)
+
+
+def page_slow(q) -> str:
+    # the HTML itself is delayed by the handler (see SLOW_MS); sub-resources are slow as well
+    imgs = "".join(f'<img src="/img/{i}.png?delay_ms=800" alt="">' for i in range(6))
+    return PAGE.format(title="slow", body=_sections(6) + imgs)
+
+
+def page_infinite(q) -> str:
+    # appends a new chunk from /more whenever the user scrolls near the bottom, forever
+    body = _sections(6) + """<div id="more"></div><script>
+      let page = 0, loading = false;
+      window.addEventListener("scroll", async () => {
+        if (loading || innerHeight + scrollY < document.body.scrollHeight - 800) return;
+        loading = true;
+        const r = await fetch("/more?page=" + (++page));
+        document.getElementById("more").insertAdjacentHTML("beforeend", await r.text());
+        loading = false;
+      });
+    </script>"""
+    return PAGE.format(title="infinite", body=body)
+
+
+PAGES: Dict[str, Callable] = {
+    "short": page_short,
+    "long": page_long,
+    "lazy": page_lazy,
+    "script": page_script,
+    "slow": page_slow,
+    "infinite": page_infinite,
+}
+SLOW_MS = 1500
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, ctype: str, cache: bool = False):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "max-age=3600" if cache else "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        u = urlparse(self.path)
+        q = {k: v[-1] for k, v in parse_qs(u.query).items()}
+        name = u.path.strip("/")
+        if name.startswith("img/") and name.endswith(".png"):
+            time.sleep(int(q.get("delay_ms", 0)) / 1000)
+            try:
+                seed = int(name[4:-4])
+            except ValueError:
+                seed = 0
+            return self._send(200, png(seed), "image/png", cache=True)
+        if name == "more":
+            n = int(q.get("page", 1))
+            return self._send(200, _sections(3, start=n * 3).encode(), "text/html; charset=utf-8")
+        if name == "api/ping":
+            return self._send(200, json.dumps({"ok": True}).encode(), "application/json")
+        page = PAGES.get(name)
+        if page is None:
+            return self._send(404, b"not found", "text/plain")
+        if name == "slow":
+            time.sleep(int(q.get("delay_ms", SLOW_MS)) / 1000)
+        return self._send(200, page(q).encode(), "text/html; charset=utf-8")
+
+
+class FixtureServer:
+    """`with FixtureServer() as srv: srv.url("long")` — listens on an ephemeral port."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="bench-fixtures", daemon=True)
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.httpd.server_address[:2]
+
+    def url(self, page: str) -> str:
+        host, port = self.address
+        return f"http://{host}:{port}/{page}"
+
+    def start(self) -> "FixtureServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
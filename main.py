@@ -1,10 +1,18 @@
 import asyncio, os
 
-from app.services.db import init_db
+from app.services.db import init_db, close_db
 from app.config import settings
 from app.bot import build_bot, build_dispatcher
-from app.routers import start, shot
-from app.services.worker import job_worker   # 🔹 اضافه شد
+from app.routers import start, shot, admin
+from app.services.worker import job_worker, lease_reaper, shutdown_job_feed   # 🔹 اضافه شد
+from app.services.sharekit.pool import shutdown_browser_pool
+from app.services.notify import job_notifier
+from app.services.sharekit.contexts import get_context_pool, shutdown_context_pool
+from app.services.sharekit.imaging import shutdown_image_pool
+from app.services.sharekit.spool import purge_spool
+from app.services.supervisor import WorkerSupervisor
+from app.services.metrics import start_metrics_server, queue_monitor
+from app.services.alerts import AdminAlerter
 from aiogram import Bot
 from aiogram.types import BotCommand, BotCommandScopeDefault, \
                            BotCommandScopeAllPrivateChats, \
@@ -28,8 +36,8 @@ async def reset_and_set_commands(bot: Bot):
     await bot.set_my_commands(COMMANDS)
 
 async def main():
-    # Init DB
-    init_db("sqlite:///./data/users.db")
+    # Init DB (sqlite:/// | postgresql:// | memory:// → app/services/queue)
+    init_db(settings.DATABASE_URL)
 
     bot = build_bot()
     dp = build_dispatcher()
@@ -37,18 +45,58 @@ async def main():
     await reset_and_set_commands(bot)
 
     dp.include_router(start.router)
+    dp.include_router(admin.router)
     dp.include_router(shot.router)
        
     me = await bot.get_me()
     print(f"✅ Bot {me.username} is running and listening for updates...")
 
-    # 🔹 استارت Workerها (پیش‌فرض 5 از .env)
-    worker_count = int(getattr(settings, "WORKER_COUNT", 5))
-    for i in range(worker_count):
-        asyncio.create_task(job_worker(i, bot))
+    # 🔹 فایل‌های spool جامانده از اجرای قبلی (crash) پاک شوند
+    purge_spool(settings)
+
+    supervisor = None
+    tasks = []
+    worker_processes = int(getattr(settings, "WORKER_PROCESSES", 0))
+    if worker_processes > 0:
+        # 🔹 حالت supervisor: capture در N پروسهٔ جدا (هر کدام مرورگر و loop خودش)، این پروسه فقط polling
+        supervisor = WorkerSupervisor(worker_processes, settings.DATABASE_URL)
+        supervisor.start()
+    else:
+        # 🔹 مرورگرها و contextهای گرم فقط یک‌بار موقع بوت بالا می‌آیند و بین Workerها مشترک‌اند
+        await get_context_pool(settings).start()
+
+        # 🔹 بیدارباش بین‌پروسه‌ای (اگر JOB_WAKEUP_SOCKET_DIR تنظیم شده باشد)
+        job_notifier.listen()
+
+        # 🔹 استارت Workerها (پیش‌فرض 5 از .env)
+        worker_count = int(getattr(settings, "WORKER_COUNT", 5))
+        for i in range(worker_count):
+            tasks.append(asyncio.create_task(job_worker(i, bot)))
+    # 🔹 برگرداندن jobهای گیرکرده (lease منقضی) به صف
+    tasks.append(asyncio.create_task(lease_reaper(bot)))
+
+    # 🔹 /metrics برای Prometheus + پایش عمق/سن صف با هشدار به ادمین
+    metrics_runner = await start_metrics_server()
+    tasks.append(asyncio.create_task(queue_monitor(AdminAlerter(bot, settings))))
 
     # Polling
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        if supervisor is not None:
+            await supervisor.stop()
+        # 🔹 اول Workerها متوقف شوند، بعد مرورگرها بسته شوند؛ job نیمه‌کاره running می‌ماند و بعد از lease به صف برمی‌گردد
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await shutdown_job_feed()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        job_notifier.close()
+        await shutdown_context_pool()
+        await shutdown_browser_pool()
+        shutdown_image_pool()
+        close_db()
 
 if __name__ == "__main__":
     asyncio.run(main())
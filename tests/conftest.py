@@ -0,0 +1,4 @@
+import os
+
+# app.config requires a token; tests never talk to Telegram
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
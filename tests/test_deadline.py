@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+from app.services.sharekit import deadline as dl
+from app.services.sharekit.core import RENDER_RESERVE
+from app.services.sharekit.deadline import Deadline, DeadlineExceeded
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # patch only the module's view of time so the event loop keeps its real clock
+    now = [500.0]
+
+    class FakeTime:
+        @staticmethod
+        def monotonic():
+            return now[0]
+
+    monkeypatch.setattr(dl, "time", FakeTime)
+    return now
+
+
+def test_render_reserve_is_held_back_from_earlier_stages(clock):
+    d = Deadline(20_000)
+    reserve = int(d.total_ms * RENDER_RESERVE)
+    assert RENDER_RESERVE == 0.3 and reserve == 6000
+    assert d.budget(None, reserve) == 14_000
+    assert d.budget(30_000, reserve) == 14_000       # the stage cap never eats into the reserve
+    assert d.budget(5_000, reserve) == 5_000
+
+    clock[0] += 12
+    assert d.budget(None, reserve) == 2_000
+    clock[0] += 2
+    assert d.budget(None, reserve) == 0              # pre-render stages are out of time...
+    assert d.budget() == 6_000                       # ...but the render still has its reserve
+    assert not d.expired
+
+
+def test_remaining_ms_clamps_at_zero(clock):
+    d = Deadline(1_000)
+    assert d.remaining_ms() == 1_000
+    clock[0] += 0.375
+    assert d.remaining_ms() == 625
+    clock[0] += 5
+    assert d.remaining_ms() == 0
+    assert d.expired
+    assert d.budget(100) == 0
+    assert d.budget(None, 500) == 0
+
+
+@pytest.mark.parametrize("total", [0, -1, None])
+def test_no_deadline_when_total_not_positive(clock, total):
+    d = Deadline(total)
+    clock[0] += 10_000
+    assert not d.expired
+    assert d.budget(2_500) == 2_500
+    d.check("goto")
+
+
+def test_paused_time_is_not_counted(clock):
+    d = Deadline(1_000)
+    clock[0] += 0.25
+    with d.paused():
+        clock[0] += 10
+        assert d.remaining_ms() == 750
+        with d.paused():                              # nested pauses count once
+            clock[0] += 10
+    assert d.remaining_ms() == 750
+    clock[0] += 0.5
+    assert d.remaining_ms() == 250
+
+
+def test_check_raises_with_stage(clock):
+    d = Deadline(1_000)
+    d.check("goto")
+    clock[0] += 1
+    with pytest.raises(DeadlineExceeded) as exc:
+        d.check("readiness")
+    assert exc.value.stage == "readiness"
+    assert "readiness" in str(exc.value)
+
+
+def test_run_returns_result_within_budget():
+    async def work():
+        await asyncio.sleep(0)
+        return 42
+
+    assert asyncio.run(Deadline(5_000).run(work(), "render")) == 42
+
+
+def test_run_times_out_with_stage():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    with pytest.raises(DeadlineExceeded) as exc:
+        asyncio.run(Deadline(5_000).run(slow(), "pre_scroll", cap_ms=20))
+    assert exc.value.stage == "pre_scroll"
+    assert cancelled == [True]
+
+
+def test_run_without_budget_raises_without_starting(clock):
+    started = []
+
+    async def work():
+        started.append(True)
+
+    d = Deadline(1_000)
+    coro = work()
+    with pytest.raises(DeadlineExceeded) as exc:
+        asyncio.run(d.run(coro, "goto", reserve_ms=1_000))
+    assert exc.value.stage == "goto"
+    assert started == []
+    assert coro.cr_frame is None                      # closed, so no "never awaited" warning
@@ -0,0 +1,122 @@
+import pytest
+
+from app.services import domains
+from app.services.domains import BUSY, OK, OPEN, DomainGuard, domain_of
+
+D = "example.com"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(domains.time, "monotonic", lambda: now[0])
+    return now
+
+
+def trip(guard: DomainGuard, n: int):
+    tripped = []
+    for _ in range(n):
+        assert guard.try_acquire(D) == OK
+        tripped.append(guard.release(D, False))
+    return tripped
+
+
+@pytest.mark.parametrize("url,domain", [
+    ("https://www.Example.com/a", "example.com"),
+    ("http://sub.example.com:8080/", "sub.example.com"),
+    ("not a url", ""),
+])
+def test_domain_of(url, domain):
+    assert domain_of(url) == domain
+
+
+def test_busy_at_concurrency_cap(clock):
+    guard = DomainGuard(max_concurrency=2, threshold=5, window_sec=60)
+    assert guard.try_acquire(D) == OK
+    assert guard.try_acquire(D) == OK
+    assert guard.try_acquire(D) == BUSY
+    assert guard.try_acquire("other.example") == OK      # the cap is per domain
+    guard.release(D, True)
+    assert guard.try_acquire(D) == OK
+    assert guard.stats()["domains_active"] == 2
+
+
+def test_no_cap_when_zero(clock):
+    guard = DomainGuard(max_concurrency=0, threshold=5, window_sec=60)
+    assert all(guard.try_acquire(D) == OK for _ in range(20))
+
+
+def test_aborted_capture_frees_slot_without_counting_failure(clock):
+    guard = DomainGuard(max_concurrency=1, threshold=1, window_sec=60)
+    assert guard.try_acquire(D) == OK
+    assert guard.release(D, None) is False
+    assert guard.try_acquire(D) == OK
+
+
+def test_opens_after_threshold_failures(clock):
+    guard = DomainGuard(max_concurrency=0, threshold=3, window_sec=60)
+    assert trip(guard, 3) == [False, False, True]
+    assert guard.try_acquire(D) == OPEN
+    assert guard.stats() == {"domains_active": 0, "domains_open": 1, "circuit_trips": 1}
+
+    clock[0] += 59
+    assert guard.try_acquire(D) == OPEN
+
+
+def test_failures_outside_window_do_not_count(clock):
+    guard = DomainGuard(max_concurrency=0, threshold=3, window_sec=60)
+    trip(guard, 2)
+    clock[0] += 61
+    assert trip(guard, 2) == [False, False]
+    assert guard.try_acquire(D) == OK
+
+
+def test_single_probe_after_cooldown(clock):
+    guard = DomainGuard(max_concurrency=0, threshold=2, window_sec=60)
+    trip(guard, 2)
+    clock[0] += 60
+    assert guard.try_acquire(D) == OK           # the probe
+    assert guard.try_acquire(D) == BUSY         # everyone else waits for its verdict
+    assert guard.try_acquire(D) == BUSY
+
+
+def test_failed_probe_reopens_circuit(clock):
+    guard = DomainGuard(max_concurrency=0, threshold=2, window_sec=60)
+    trip(guard, 2)
+    clock[0] += 60
+    assert guard.try_acquire(D) == OK
+    assert guard.release(D, False) is True
+    assert guard.try_acquire(D) == OPEN
+    assert guard.stats()["circuit_trips"] == 2
+
+    clock[0] += 60
+    assert guard.try_acquire(D) == OK           # next probe after another cooldown
+
+
+def test_successful_probe_resets_domain(clock):
+    guard = DomainGuard(max_concurrency=0, threshold=2, window_sec=60)
+    trip(guard, 2)
+    clock[0] += 60
+    assert guard.try_acquire(D) == OK
+    assert guard.release(D, True) is False
+    assert guard.stats() == {"domains_active": 0, "domains_open": 0, "circuit_trips": 1}
+    assert guard.try_acquire(D) == OK
+    assert guard.try_acquire(D) == OK
+    # failure history was cleared: it takes a full threshold again to open
+    assert guard.release(D, False) is False
+    assert guard.try_acquire(D) == OK
+
+
+def test_success_clears_failure_count(clock):
+    guard = DomainGuard(max_concurrency=0, threshold=3, window_sec=60)
+    trip(guard, 2)
+    assert guard.try_acquire(D) == OK
+    guard.release(D, True)
+    assert trip(guard, 2) == [False, False]
+    assert guard.try_acquire(D) == OK
+
+
+def test_breaker_off_when_threshold_zero(clock):
+    guard = DomainGuard(max_concurrency=0, threshold=0, window_sec=60)
+    assert not any(trip(guard, 50))
+    assert guard.try_acquire(D) == OK
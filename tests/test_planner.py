@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.sharekit.planner import MAX_TILE_DEVICE_PX, plan_render
+
+# same as the desktop / mobile profiles in sharekit/contexts.py
+DESKTOP = ({"width": 1920, "height": 1080}, 2)
+MOBILE = ({"width": 430, "height": 844}, 4)
+
+
+def make_settings(**overrides):
+    # defaults of app/config.py
+    values = dict(
+        FULLPAGE_MAX_HEIGHT_PX=15000,
+        SLICE_OVERLAP_PX=80,
+        MAX_SCREENS_PER_JOB=10,
+        MAX_IMAGE_BYTES=9_500_000,
+        RENDER_MAX_PIXELS=100_000_000,
+    )
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+@pytest.mark.parametrize("height", [1080, 5000, 7700, 10000, 10800])
+def test_default_budget_keeps_desktop_slices_sharp(height):
+    # the old fixed profile rendered up to 10 viewport slices at 2x; the default budget must not undercut it
+    viewport, dsf = DESKTOP
+    plan = plan_render(height, viewport, dsf, make_settings(), full_page=None, force_slice=True)
+    assert plan.dsf == 2
+    assert plan.pixels >= plan.baseline_pixels
+
+
+def test_default_budget_keeps_mobile_full_page_within_tile_limit_sharp():
+    viewport, dsf = MOBILE
+    height = MAX_TILE_DEVICE_PX // dsf
+    plan = plan_render(height, viewport, dsf, make_settings(MAX_IMAGE_BYTES=0), full_page=True, force_slice=False)
+    assert plan.full_page and plan.dsf == 4
+
+
+@pytest.mark.parametrize("profile", [DESKTOP, MOBILE])
+@pytest.mark.parametrize("height", [3000, 12000, 20000, 50000, 200000])
+@pytest.mark.parametrize("full_page,force_slice", [(None, False), (True, False), (None, True)])
+@pytest.mark.parametrize("budget", [20_000_000, 60_000_000, 100_000_000])
+def test_plan_never_exceeds_pixel_budget(profile, height, full_page, force_slice, budget):
+    viewport, dsf = profile
+    s = make_settings(RENDER_MAX_PIXELS=budget)
+    plan = plan_render(height, viewport, dsf, s, full_page=full_page, force_slice=force_slice)
+    assert plan.pixels <= budget
+    assert plan.parts <= s.MAX_SCREENS_PER_JOB
+
+
+def test_long_desktop_page_is_cut_to_the_budget():
+    viewport, dsf = DESKTOP
+    plan = plan_render(50000, viewport, dsf, make_settings(RENDER_MAX_PIXELS=60_000_000),
+                       full_page=None, force_slice=False)
+    assert not plan.full_page
+    assert plan.dsf == 1
+    assert plan.parts == 10
+    assert plan.pixels <= 60_000_000
@@ -0,0 +1,129 @@
+"""
+One suite for every queue backend. Postgres runs when TEST_POSTGRES_URL
+points at a throwaway database (e.g. `docker run -e POSTGRES_PASSWORD=x -p 5432:5432 postgres`)
+and psycopg2 is installed; otherwise it is skipped.
+"""
+import os
+
+import pytest
+
+from app.services.queue import create_backend
+
+POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL", "")
+
+
+def _postgres():
+    if not POSTGRES_URL:
+        pytest.skip("TEST_POSTGRES_URL not set")
+    pytest.importorskip("psycopg2")
+    backend = create_backend(POSTGRES_URL)
+    backend.init()
+    backend._tx(lambda cur: cur.execute("TRUNCATE shot_jobs, shot_users RESTART IDENTITY"))
+    return backend
+
+
+@pytest.fixture(params=["sqlite", "memory", "postgres"])
+def db(request, tmp_path):
+    if request.param == "sqlite":
+        backend = create_backend(f"sqlite:///{tmp_path / 'queue.db'}")
+        backend.init()
+    elif request.param == "memory":
+        backend = create_backend("memory://")
+        backend.init()
+    else:
+        backend = _postgres()
+    yield backend
+    backend.close()
+
+
+def test_enqueue_position_and_depth(db):
+    results = [db.enqueue(1, f"https://example.com/{i}") for i in range(3)]
+    assert [r.position for r in results] == [1, 2, 3]
+    assert [r.depth for r in results] == [1, 2, 3]
+    assert db.queue_depth() == 3
+    assert db.oldest_queued_at() is not None
+
+    (job,) = db.claim("w1", limit=1, lease_sec=60)
+    assert job["id"] == results[0].job_id
+    assert db.queue_depth() == 3        # running jobs still count
+    assert db.complete(job["id"], True, worker_id="w1")
+    assert db.queue_depth() == 2
+    assert db.queue_position(results[0].job_id) == 0
+    assert db.queue_position(results[1].job_id) == 1
+    assert db.queue_position(results[2].job_id) == 2
+
+
+def test_enqueue_without_user_row(db):
+    # /start (upsert_user) is not a precondition for queueing
+    assert db.enqueue(424242, "https://example.com/").position == 1
+
+
+def test_claim_in_order_with_batch_limit(db):
+    ids = [db.enqueue(1, f"https://example.com/{i}").job_id for i in range(5)]
+    first = db.claim("w1", limit=2, lease_sec=60)
+    second = db.claim("w2", limit=10, lease_sec=60)
+    assert [j["id"] for j in first] == ids[:2]
+    assert [j["id"] for j in second] == ids[2:]
+    assert all(j["status"] == "running" and j["worker_id"] == "w1" for j in first)
+    assert db.claim("w3", limit=10, lease_sec=60) == []
+
+
+def test_claim_coalesces_followers(db):
+    a1 = db.enqueue(1, "https://a.example/", capture_key="A").job_id
+    b = db.enqueue(2, "https://b.example/", capture_key="B").job_id
+    a2 = db.enqueue(3, "https://a.example/", capture_key="A").job_id
+    a3 = db.enqueue(4, "https://a.example/", capture_key="A").job_id
+    a4 = db.enqueue(5, "https://a.example/", capture_key="A").job_id
+
+    (lead,) = db.claim("w1", limit=1, lease_sec=60, max_followers=2)
+    assert lead["id"] == a1
+    assert [f["id"] for f in lead["followers"]] == [a2, a3]
+    assert all(f["status"] == "running" and f["worker_id"] == "w1" for f in lead["followers"])
+
+    leaders = db.claim("w2", limit=10, lease_sec=60, max_followers=2)
+    assert [j["id"] for j in leaders] == [b, a4]
+    assert all(j["followers"] == [] for j in leaders)
+
+
+def test_complete_is_owner_guarded_and_final(db):
+    job_id = db.enqueue(1, "https://example.com/").job_id
+    assert not db.complete(job_id, True, worker_id="w1")      # still queued
+    db.claim("w1", limit=1, lease_sec=60)
+    assert not db.complete(job_id, True, worker_id="w2")      # someone else's lease
+    assert db.complete(job_id, True, worker_id="w1", metrics_json="{}")
+    assert not db.complete(job_id, False, error="late", worker_id="w1")   # already done
+    assert db.queue_depth() == 0
+
+
+def test_defer_requeues_without_spending_attempts(db):
+    job_id = db.enqueue(1, "https://example.com/").job_id
+    db.claim("w1", limit=1, lease_sec=60)
+    assert db.defer("w2", [job_id], 60) == 0
+    assert db.defer("w1", [job_id], 60) == 1
+    assert db.queue_depth() == 1
+    assert db.claim("w1", limit=1, lease_sec=60) == []        # not available yet
+
+    other = db.enqueue(2, "https://example.org/").job_id
+    (job,) = db.claim("w1", limit=5, lease_sec=60)
+    assert job["id"] == other
+
+
+def test_requeue_expired_then_fail(db):
+    job_id = db.enqueue(1, "https://example.com/").job_id
+    db.claim("w1", limit=1, lease_sec=-5)
+    assert db.requeue_expired(max_attempts=2) == (1, 0)
+    (job,) = db.claim("w2", limit=1, lease_sec=-5)
+    assert job["id"] == job_id and job["attempts"] == 1
+    assert db.requeue_expired(max_attempts=2) == (0, 1)
+    assert db.queue_depth() == 0
+    assert db.claim("w3", limit=1, lease_sec=60) == []
+
+
+def test_heartbeat_extends_only_own_lease(db):
+    job_id = db.enqueue(1, "https://example.com/").job_id
+    db.claim("w1", limit=1, lease_sec=-5)
+    assert db.heartbeat("w2", [job_id], 60) == 0
+    assert db.heartbeat("w1", [job_id], 60) == 1
+    assert db.requeue_expired(max_attempts=3) == (0, 0)
+    assert db.complete(job_id, True, worker_id="w1")
+    assert db.heartbeat("w1", [job_id], 60) == 0
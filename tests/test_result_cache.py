@@ -0,0 +1,91 @@
+import pytest
+
+from app.services import result_cache as rc
+from app.services.parse import capture_options, parse_shot_args
+from app.services.result_cache import ResultCache, capture_key, normalize_url
+
+PARTS = [{"file_id": "AAA", "file_name": "screenshot_01.png", "caption": None}]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(rc.time, "time", lambda: now[0])
+    return now
+
+
+def key(text: str) -> str:
+    url = text.split()[0]
+    return capture_key(url, capture_options(parse_shot_args(text)))
+
+
+@pytest.mark.parametrize("a,b", [
+    ("HTTPS://Example.COM/a?x=1", "https://example.com/a?x=1"),
+    ("https://example.com:443/", "https://example.com/"),
+    ("http://example.com:80/a", "http://example.com/a"),
+    ("https://example.com", "https://example.com/"),
+    ("https://example.com/a#top", "https://example.com/a"),
+    ("  https://example.com/a  ", "https://example.com/a"),
+])
+def test_normalize_url_equivalent_forms(a, b):
+    assert normalize_url(a) == normalize_url(b)
+
+
+@pytest.mark.parametrize("a,b", [
+    ("https://example.com/a", "https://example.com/A"),          # path is case-sensitive
+    ("https://example.com/?x=1", "https://example.com/?x=2"),
+    ("https://example.com/", "http://example.com/"),
+    ("https://example.com:8443/", "https://example.com/"),
+    ("https://a.example.com/", "https://b.example.com/"),
+])
+def test_normalize_url_distinct_pages(a, b):
+    assert normalize_url(a) != normalize_url(b)
+
+
+def test_key_ignores_flag_order_and_defaults():
+    assert key("https://example.com --desktop --full") == key("https://example.com --full --desktop")
+    assert key("https://example.com") == key("https://example.com --mobile")
+    assert key("https://example.com --slow") == key("https://example.com --delay=7000")
+
+
+@pytest.mark.parametrize("flags", ["--desktop", "--full", "--slice", "--pdf", "--delay=2000"])
+def test_key_changes_with_every_output_option(flags):
+    assert key(f"https://example.com {flags}") != key("https://example.com")
+
+
+def test_key_from_dict_and_json_params_match():
+    params = {"desktop": True, "pdf": True}
+    assert capture_key("https://example.com", capture_options(params)) == \
+        capture_key("https://example.com", capture_options('{"pdf": true, "desktop": true}'))
+
+
+def test_ttl_expiry(clock):
+    cache = ResultCache(ttl_sec=60, max_entries=10)
+    cache.put("k", PARTS)
+    clock[0] += 59
+    assert cache.get("k") == PARTS
+    clock[0] += 2
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_lru_bound_evicts_least_recently_used(clock):
+    cache = ResultCache(ttl_sec=60, max_entries=2)
+    cache.put("a", PARTS)
+    cache.put("b", PARTS)
+    assert cache.get("a") == PARTS        # a is now most recent
+    cache.put("c", PARTS)
+    assert cache.get("b") is None
+    assert cache.get("a") == PARTS and cache.get("c") == PARTS
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disabled_and_empty_results_are_not_cached():
+    assert ResultCache(ttl_sec=0).get("k") is None
+    off = ResultCache(ttl_sec=0)
+    off.put("k", PARTS)
+    assert off.stats()["entries"] == 0
+    cache = ResultCache()
+    cache.put("k", [])
+    assert cache.get("k") is None